@@ -0,0 +1,91 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from common.metrics import cache_lookup
+from subscriptions.models import Subscription
+
+
+# What authentication, permissions and request.user.subscription need; nothing
+# else (no password hash, no profile) goes into the shared cache
+USER_FIELDS = ('id', 'is_active', 'is_staff', 'is_superuser')
+SUBSCRIPTION_FIELDS = ('id', 'user_id', 'plan', 'status', 'current_period_end')
+
+
+def user_cache_key(user_id) -> str:
+    return f'auth-user:{user_id}'
+
+
+def invalidate_user(user_id) -> None:
+    cache.delete(user_cache_key(user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that caches the resolved user, with its subscription
+    joined in, for AUTH_USER_CACHE_SECONDS. Warm requests cost no query for
+    authentication or for request.user.subscription.
+    Only USER_FIELDS and SUBSCRIPTION_FIELDS are cached; the user is rebuilt
+    from them with the other fields deferred (loaded on access, and left out
+    of save()). With CHECK_REVOKE_TOKEN the password's digest is cached too.
+    User and Subscription saves/deletes invalidate the entry (accounts.signals);
+    other worker processes only see that with a shared cache (REDIS_URL).
+    The subscription is a snapshot: quota enforcement must keep reading the
+    database (subscriptions.quota), not request.user.subscription.
+    """
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
+            return super().get_user(validated_token)
+
+        key = user_cache_key(user_id)
+        snapshot = cache.get(key)
+        cache_lookup('auth_user', snapshot is not None)
+        if snapshot is None:
+            user = (
+                self.user_model.objects
+                .select_related('subscription')
+                .filter(**{api_settings.USER_ID_FIELD: user_id})
+                .first()
+            )
+            if user is None:
+                raise AuthenticationFailed(_('User not found'), code='user_not_found')
+            snapshot = _snapshot(user)
+            cache.set(key, snapshot, getattr(settings, 'AUTH_USER_CACHE_SECONDS', 30))
+        user = self._restore(snapshot)
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != snapshot['password_digest']:
+                raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+
+        return user
+
+    def _restore(self, snapshot):
+        user = _from_values(self.user_model, snapshot['user'])
+        if snapshot['subscription'] is not None:
+            user.subscription = _from_values(Subscription, snapshot['subscription'])
+        return user
+
+
+def _snapshot(user) -> dict:
+    subscription = getattr(user, 'subscription', None)  # None if the user has none (yet)
+    return {
+        'user': {f: getattr(user, f) for f in USER_FIELDS},
+        'subscription': {f: getattr(subscription, f) for f in SUBSCRIPTION_FIELDS} if subscription else None,
+        'password_digest': get_md5_hash_password(user.password) if api_settings.CHECK_REVOKE_TOKEN else None,
+    }
+
+
+def _from_values(model, values: dict):
+    # from_db wants the loaded values in the model's field order; the rest are deferred
+    names = [f.attname for f in model._meta.concrete_fields if f.attname in values]
+    return model.from_db(DEFAULT_DB_ALIAS, names, [values[n] for n in names])
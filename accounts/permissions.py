@@ -6,6 +6,7 @@ class IsOwnerOrStaff(BasePermission):
     - Staff can access any object.
     - For User objects: only the user themself or superuser can access.
     - For other models with a `user` FK: only the owner or staff can access.
+    - For owner-scoped viewsets (view.owner_path): only the owner or staff.
     """
 
     def has_permission(self, request, view):
@@ -25,5 +26,14 @@ class IsOwnerOrStaff(BasePermission):
         if hasattr(obj, 'user_id'):
             return obj.user_id == user.id
 
+        # Case 3: owner-scoped viewsets declare the FK path to the owner
+        # (e.g., 'customer__owner' for Event; see customers.views.OwnerScopedMixin)
+        owner_path = getattr(view, 'owner_path', None)
+        if owner_path:
+            *hops, last = owner_path.split('__')
+            for hop in hops:
+                obj = getattr(obj, hop, None)
+            return getattr(obj, f'{last}_id', None) == user.id
+
         # Default deny if no clear ownership link
         return False
@@ -0,0 +1,9 @@
+from drf_spectacular.contrib.rest_framework_simplejwt import SimpleJWTScheme
+
+
+class CachedJWTScheme(SimpleJWTScheme):
+    """
+    OpenAPI security scheme for CachedJWTAuthentication: the same bearer
+    JWT as simplejwt's JWTAuthentication.
+    """
+    target_class = 'accounts.authentication.CachedJWTAuthentication'
@@ -1,8 +1,9 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
 
-from subscriptions.models import Subscription
+from subscriptions.models import StorageUsage, Subscription
+from .authentication import invalidate_user
 
 User = get_user_model()
 
@@ -10,3 +11,18 @@ User = get_user_model()
 def ensure_free_subscription(sender, instance, created, **kwargs):
     if created:
         Subscription.objects.get_or_create(user=instance)
+        StorageUsage.objects.get_or_create(user=instance)
+
+
+# Cached JWT users (accounts.authentication): drop the snapshot on any change,
+# including deactivation (is_active=False is a save).
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def invalidate_cached_subscription(sender, instance, **kwargs):
+    invalidate_user(instance.user_id)
@@ -1,3 +1,90 @@
+import io
+from contextlib import redirect_stderr
+
+from django.core.cache import cache
 from django.test import TestCase
+from drf_spectacular.generators import SchemaGenerator
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.tokens import AccessToken
+
+from subscriptions.models import Plan, Subscription
+from .authentication import CachedJWTAuthentication, user_cache_key
+from .models import User
+
+
+class SchemaTests(TestCase):
+    def test_cached_jwt_is_documented_as_bearer_auth(self):
+        with redirect_stderr(io.StringIO()):  # warnings about other views
+            schema = SchemaGenerator().get_schema(request=None, public=True)
+        self.assertEqual(schema['components']['securitySchemes']['jwtAuth']['scheme'], 'bearer')
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('owner@example.com', 'pass12345', name='Owner')
+        self.token = AccessToken.for_user(self.user)
+        self.auth = CachedJWTAuthentication()
+
+    def cached(self):
+        return cache.get(user_cache_key(self.user.pk))
+
+    def test_warm_lookups_cost_no_query(self):
+        with self.assertNumQueries(1):
+            self.auth.get_user(self.token)
+        with self.assertNumQueries(0):
+            user = self.auth.get_user(self.token)
+            self.assertEqual(user.subscription.plan, Plan.FREE)
+
+    def test_entry_holds_no_password_or_profile(self):
+        self.auth.get_user(self.token)
+        entry = repr(self.cached())
+        self.assertNotIn(self.user.password, entry)
+        self.assertNotIn('owner@example.com', entry)
+
+        user = self.auth.get_user(self.token)
+        self.assertEqual((user.pk, user.is_active, user.is_staff), (self.user.pk, True, False))
+        self.assertIn('password', user.get_deferred_fields())
+
+    def test_password_change_evicts_the_entry(self):
+        self.auth.get_user(self.token)
+        self.user.set_password('new-pass12345')
+        self.user.save()
+        self.assertIsNone(self.cached())
+
+    def test_me_reads_and_updates_the_full_user(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        self.auth.get_user(self.token)  # warm the cache
+        self.assertEqual(client.get('/api/accounts/me/').data['email'], 'owner@example.com')
+
+        self.assertEqual(client.patch('/api/accounts/me/', {'name': 'Renamed'}).status_code, 200)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.name, 'Renamed')
+        self.assertTrue(self.user.check_password('pass12345'))
+
+    def test_user_changes_evict_the_entry(self):
+        self.auth.get_user(self.token)
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsNone(self.cached())
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.get_user(self.token)
+
+        self.user.delete()
+        self.assertIsNone(self.cached())
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.get_user(self.token)
+
+    def test_subscription_changes_evict_the_entry(self):
+        self.auth.get_user(self.token)
+        sub = Subscription.objects.get(user=self.user)
+        sub.plan = Plan.PRO
+        sub.stripe_customer_id, sub.stripe_subscription_id = 'cus_1', 'sub_1'
+        sub.save()
+        self.assertIsNone(self.cached())
+        self.assertEqual(self.auth.get_user(self.token).subscription.plan, Plan.PRO)
 
-# Create your tests here.
+        sub.delete()
+        self.assertIsNone(self.cached())
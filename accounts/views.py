@@ -4,7 +4,6 @@ from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
 from django_filters.rest_framework import DjangoFilterBackend
 from django.contrib.auth import get_user_model
-from rest_framework_simplejwt.authentication import JWTAuthentication
 
 from .serializers import (
     UserListSerializer,
@@ -12,6 +11,7 @@ from .serializers import (
     UserCreateSerializer,
     UserUpdateSerializer,
 )
+from .authentication import CachedJWTAuthentication
 from .permissions import IsOwnerOrStaff
 
 User = get_user_model()
@@ -33,7 +33,7 @@ class UserViewSet(viewsets.ModelViewSet):
     - Superusers can see all users.
     - Regular users can only see themselves.
     """
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsOwnerOrStaff]
 
     queryset = User.objects.select_related('subscription')
@@ -82,7 +82,8 @@ class UserViewSet(viewsets.ModelViewSet):
         GET  /api/accounts/me/    -> current user's details
         PATCH /api/accounts/me/   -> update current user's details
         """
-        user = request.user
+        # request.user only carries the cached auth fields; load the full row
+        user = self.queryset.get(pk=request.user.pk)
         if request.method.lower() == 'get':
             serializer = UserDetailSerializer(user)
             return Response(serializer.data)
@@ -0,0 +1,118 @@
+"""
+Helpers for async (ASGI-native) API views.
+
+- storage_call() runs a blocking storage operation on a dedicated thread
+  pool, with at most STORAGE_ASYNC_CONCURRENCY calls in flight per process
+  (keep it <= STORAGE_MAX_POOL_CONNECTIONS). The event loop never blocks on
+  storage latency.
+- async_api_view wraps an `async def view(request)` taking a DRF Request:
+  authentication and permissions from REST_FRAMEWORK settings, APIException
+  -> JSON error, and a (body, status) return value -> JSON response.
+  Authentication may hit the DB, so it runs through sync_to_async.
+DB work inside views must go through sync_to_async (thread-sensitive) too.
+"""
+import asyncio
+import functools
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+
+_executor = None
+_executor_lock = threading.Lock()
+_semaphores = weakref.WeakKeyDictionary()  # event loop -> asyncio.Semaphore
+
+
+def _concurrency() -> int:
+    return getattr(settings, 'STORAGE_ASYNC_CONCURRENCY', 32)
+
+
+def _storage_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=_concurrency(), thread_name_prefix='storage')
+    return _executor
+
+
+def _semaphore() -> asyncio.Semaphore:
+    # One per event loop: ASGI servers run one loop per process, but sync
+    # callers (WSGI, tests) get a fresh loop per request.
+    loop = asyncio.get_running_loop()
+    sem = _semaphores.get(loop)
+    if sem is None:
+        sem = _semaphores[loop] = asyncio.Semaphore(_concurrency())
+    return sem
+
+
+async def storage_call(func, *args, **kwargs):
+    """
+    Await a blocking storage call (e.g. get_storage().head) off the event loop.
+    """
+    async with _semaphore():
+        return await sync_to_async(func, thread_sensitive=False, executor=_storage_executor())(*args, **kwargs)
+
+
+@receiver(setting_changed)
+def _reset_on_setting_change(setting, **kwargs):
+    global _executor
+    if setting == 'STORAGE_ASYNC_CONCURRENCY':
+        with _executor_lock:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            _executor = None
+            _semaphores.clear()
+
+
+def async_api_view(permission_classes=None):
+    def decorator(view):
+        @csrf_exempt
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            authenticators = [auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+            parsers = [parser() for parser in api_settings.DEFAULT_PARSER_CLASSES]
+            req = Request(request, parsers=parsers, authenticators=authenticators)
+            try:
+                await sync_to_async(_check_permissions)(
+                    req, permission_classes or api_settings.DEFAULT_PERMISSION_CLASSES,
+                )
+                body, status = await view(req, *args, **kwargs)
+            except exceptions.APIException as exc:
+                return _error_response(req, exc)
+            return JsonResponse(body, status=status, encoder=JSONEncoder, safe=False)
+        return wrapper
+    return decorator
+
+
+def _check_permissions(request, permission_classes):
+    request.user  # authenticate now, on a thread where the ORM is allowed
+    for permission in (cls() for cls in permission_classes):
+        if not permission.has_permission(request, None):
+            if request.authenticators and not request.successful_authenticator:
+                raise exceptions.NotAuthenticated()
+            raise exceptions.PermissionDenied(getattr(permission, 'message', None))
+
+
+def _error_response(request, exc):
+    body = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+    response = JsonResponse(body, status=exc.status_code, encoder=JSONEncoder, safe=False)
+    if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+        authenticators = request.authenticators
+        header = authenticators[0].authenticate_header(request) if authenticators else None
+        if header:
+            response['WWW-Authenticate'] = header
+        else:
+            response.status_code = 403
+    return response
@@ -0,0 +1,37 @@
+"""
+Burst detection over 64-bit perceptual hashes (common.imaging.dhash).
+
+Frames are compared with their `window` predecessors in capture order; a
+pair within `threshold` differing bits links every frame between them into
+one burst. All distances are computed at once with NumPy (XOR + popcount over
+the hash array), so thousands of photos cluster in milliseconds. NumPy is
+imported on first use only.
+"""
+BURST_THRESHOLD = 10  # bits of 64
+BURST_WINDOW = 3
+
+
+def burst_labels(hashes, *, threshold: int = BURST_THRESHOLD, window: int = BURST_WINDOW) -> list:
+    """
+    Label each position of `hashes` (signed 64-bit ints in capture order;
+    None for photos not hashed yet, which only join a burst that spans them)
+    with its burst: 0, 1, 2, ... ascending.
+    """
+    import numpy as np
+
+    n = len(hashes)
+    if not n:
+        return []
+    known = np.fromiter((h is not None for h in hashes), dtype=bool, count=n)
+    values = np.fromiter((h or 0 for h in hashes), dtype=np.int64, count=n).view(np.uint64)
+
+    # joins[i] > 0: some linked pair (a, b) has a < i <= b, so i continues a's burst
+    joins = np.zeros(n + 1, dtype=np.int64)
+    for gap in range(1, min(window, n - 1) + 1):
+        close = np.bitwise_count(values[:-gap] ^ values[gap:]) <= threshold
+        starts = np.flatnonzero(close & known[:-gap] & known[gap:])
+        joins += np.bincount(starts + 1, minlength=n + 1)
+        joins -= np.bincount(starts + gap + 1, minlength=n + 1)
+    continued = np.cumsum(joins[:n]) > 0
+    return (np.cumsum(~continued) - 1).tolist()
+
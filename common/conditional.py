@@ -0,0 +1,59 @@
+"""
+Conditional GET (ETag / Last-Modified) from cheap validators.
+
+Views compute validators from a few indexed columns (e.g. Event.updated_at,
+photos_count, selected_count) instead of hashing the serialized body, so a
+revalidation costs one small query and returns 304 without serializing.
+"""
+import hashlib
+
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+from .metrics import cache_lookup
+from .signed_urls import get_url_cache
+
+
+def make_etag(*parts) -> str:
+    """
+    Weak ETag over the validator parts (they describe the body, not its bytes).
+    """
+    digest = hashlib.md5(repr(parts).encode(), usedforsecurity=False).hexdigest()
+    return f'W/"{digest}"'
+
+
+def url_window():
+    """
+    Presigned URLs in a body change once per signing window; include this in
+    validators of responses that embed them. None for public buckets.
+    """
+    if getattr(settings, 'AWS_QUERYSTRING_AUTH', False):
+        return get_url_cache().window_start()
+    return None
+
+
+def conditional_get(request, *, parts, last_modified, build):
+    """
+    Return 304 if the client's If-None-Match / If-Modified-Since still match
+    the validators; otherwise call build() and stamp ETag / Last-Modified on
+    its response. `parts` should identify the representation (the full path,
+    including query string, is added here). `last_modified` is a datetime or None.
+    """
+    window = url_window()
+    etag = make_etag(request.get_full_path(), getattr(request.user, 'pk', None), window, *parts)
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    if window and timestamp is not None:
+        timestamp = max(timestamp, window)
+
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    cache_lookup('conditional_get', response is not None and response.status_code == 304)
+    if response is None:
+        response = build()
+    if 200 <= response.status_code < 300 or response.status_code == 304:
+        response['ETag'] = etag
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+        patch_vary_headers(response, ['Authorization'])
+    return response
+
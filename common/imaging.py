@@ -0,0 +1,94 @@
+"""
+Image resizing for derivatives, run in worker processes.
+
+This module imports nothing from Django so ProcessPoolExecutor workers start
+fast and stay small; everything here works on bytes in, bytes out.
+
+JPEG "draft" mode makes libjpeg decode at 1/2, 1/4 or 1/8 scale straight
+from the DCT coefficients, so a 24 MP original headed for a 2048 px
+derivative is never decoded at full size. Smaller sizes are then resized
+from the next larger derivative rather than from the original.
+
+render_photo() also returns a 64-bit perceptual hash (dHash) taken from the
+smallest derivative, for near-duplicate detection (common.bursts).
+"""
+import math
+from io import BytesIO
+
+from PIL import Image, ImageFilter, ImageOps
+
+
+# What Pillow raises for bodies it can't decode (UnidentifiedImageError is an OSError)
+DECODE_ERRORS = (OSError, SyntaxError, ValueError, Image.DecompressionBombError)
+
+def render_derivatives(data: bytes, sizes, *, quality: int = 82, draft: bool = True) -> list:
+    """
+    Render JPEG derivatives of an image whose long edge is at most each of
+    `sizes` (px). Sizes larger than the original are skipped, except that
+    the smallest is always produced.
+    Returns [(size, jpeg_bytes, width, height)] in ascending size order.
+    """
+    return render_photo(data, sizes, quality=quality, draft=draft)[0]
+
+
+def render_photo(data: bytes, sizes, *, quality: int = 82, draft: bool = True) -> tuple:
+    """
+    render_derivatives() plus the image's perceptual hash:
+    returns (derivatives, dhash).
+    """
+    sizes = sorted(set(sizes), reverse=True)
+    with Image.open(BytesIO(data)) as img:
+        if draft and img.format == 'JPEG':
+            # draft() keeps both edges >= the requested box; EXIF rotation
+            # comes later but doesn't change which edge is the long one
+            ratio = sizes[0] / max(img.size)
+            if ratio < 1:
+                img.draft('RGB', (math.ceil(img.width * ratio), math.ceil(img.height * ratio)))
+        img = ImageOps.exif_transpose(img)
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+
+        out = []
+        current = img
+        long_edge = max(img.size)
+        for size in sizes:
+            if size > long_edge and size != sizes[-1]:
+                continue
+            if max(current.size) > size:
+                current = current.copy()
+                current.thumbnail((size, size), Image.Resampling.LANCZOS, reducing_gap=2.0)
+            buf = BytesIO()
+            current.save(buf, format='JPEG', quality=quality, optimize=False, progressive=True)
+            out.append((size, buf.getvalue(), *current.size))
+        phash = dhash(current)
+    return out[::-1], phash
+
+
+def dhash(img) -> int:
+    """
+    64-bit difference hash: the image shrunk to 9x8 grey pixels, one bit per
+    horizontally adjacent pair (is the left one brighter?). Near-identical
+    frames differ in a few bits. Returned as a signed 64-bit int, so it fits
+    a BigIntegerField.
+    """
+    small = img.convert('L').resize((9, 8), Image.Resampling.BOX)
+    px = small.tobytes()
+    value = 0
+    for y in range(8):
+        row = px[y * 9:(y + 1) * 9]
+        for x in range(8):
+            value = (value << 1) | (row[x] > row[x + 1])
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def sample_jpeg(width: int, height: int, seed: int = 0, quality: int = 92) -> bytes:
+    """
+    Camera-like test JPEG: smooth gradients plus sensor-ish noise, so it
+    compresses (and decodes) roughly like a real photo. For benchmarks and seeds.
+    """
+    noise = Image.effect_noise((width, height), 24 + seed % 16)
+    gradient = Image.linear_gradient('L').resize((width, height))
+    img = Image.merge('RGB', (noise, gradient, noise.filter(ImageFilter.GaussianBlur(3))))
+    buf = BytesIO()
+    img.save(buf, format='JPEG', quality=quality)
+    return buf.getvalue()
@@ -0,0 +1,213 @@
+"""
+Per-request SQL and storage instrumentation.
+
+RequestInstrumentationMiddleware counts, for each request, the SQL queries
+and their total time (a connection.execute_wrapper), the storage calls and
+their time (BaseStorage._timed reports here) and the view that served it.
+The numbers go out as a Server-Timing header and one log line
+(logger 'common.instrumentation', key=value pairs; the same values as a dict
+in the record's `request_stats` attribute, for JSON formatters). Queries
+slower than INSTRUMENTATION_SLOW_QUERY_MS are logged with their SQL and the
+project line that ran them.
+
+The current request's RequestStats lives in a context variable, so it
+follows sync_to_async / asyncio tasks; plain thread pools must wrap their
+function with in_request(). Body streamed after the view returns (ZIP
+downloads) is not counted.
+
+Settings:
+    INSTRUMENTATION_ENABLED         off by default; when off the middleware
+                                    removes itself and no SQL wrapper is
+                                    installed, leaving one context-variable
+                                    read per storage call
+    INSTRUMENTATION_SLOW_QUERY_MS   log slower queries (0 = never)
+"""
+import logging
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('request_stats', default=None)
+_install_lock = threading.Lock()
+_installed = False
+
+
+class RequestStats:
+    def __init__(self, slow_query_ms: float = 0):
+        self.slow_query_ms = slow_query_ms
+        self.queries = 0
+        self.sql_ms = 0.0
+        self.slow_queries = 0
+        self.storage_calls = 0
+        self.storage_ms = 0.0
+        self._lock = threading.Lock()  # storage calls may come from several threads
+
+    def add_query(self, ms: float) -> bool:
+        """Count a query; True if it was a slow one."""
+        slow = bool(self.slow_query_ms) and ms >= self.slow_query_ms
+        with self._lock:
+            self.queries += 1
+            self.sql_ms += ms
+            self.slow_queries += slow
+        return slow
+
+    def add_storage(self, ms: float):
+        with self._lock:
+            self.storage_calls += 1
+            self.storage_ms += ms
+
+
+def record_storage(ms: float):
+    stats = _current.get()
+    if stats is not None:
+        stats.add_storage(ms)
+
+
+def in_request(func):
+    """
+    Wrap `func` so calls made on other threads (ThreadPoolExecutor) count
+    towards the current request. Returns `func` itself when nothing is tracked.
+    """
+    stats = _current.get()
+    if stats is None:
+        return func
+
+    def run(*args, **kwargs):
+        token = _current.set(stats)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _current.reset(token)
+    return run
+
+
+@contextmanager
+def track(slow_query_ms: float = None):
+    """
+    Collect SQL and storage numbers for the block into a RequestStats.
+    """
+    _install()
+    for conn in connections.all(initialized_only=True):
+        _attach(conn)
+    if slow_query_ms is None:
+        slow_query_ms = getattr(settings, 'INSTRUMENTATION_SLOW_QUERY_MS', 0)
+    stats = RequestStats(slow_query_ms)
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+def _install():
+    # Connections opened from now on (in any thread) get the SQL wrapper
+    global _installed
+    if not _installed:
+        with _install_lock:
+            if not _installed:
+                connection_created.connect(_on_connection_created, dispatch_uid='common.instrumentation')
+                _installed = True
+
+
+def _on_connection_created(sender, connection, **kwargs):
+    _attach(connection)
+
+
+def _attach(conn):
+    if _record_query not in conn.execute_wrappers:
+        conn.execute_wrappers.append(_record_query)
+
+
+def _record_query(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        ms = (time.perf_counter() - start) * 1000
+        if stats.add_query(ms):
+            logger.warning('slow query (%.1f ms) at %s: %s', ms, _call_site(), sql)
+
+
+def _call_site() -> str:
+    """The innermost frame in project code (not Django, DRF or this module)."""
+    base = str(settings.BASE_DIR)
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(base) and 'site-packages' not in filename and filename != __file__:
+            return f'{Path(filename).relative_to(base)}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return 'unknown'
+
+
+class RequestInstrumentationMiddleware:
+    """
+    Server-Timing header and a log line per request (see the module docstring).
+    Put it first in MIDDLEWARE so `app` covers the whole stack.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'INSTRUMENTATION_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        start = time.perf_counter()
+        with track() as stats:
+            response = self.get_response(request)
+        return self.finish(request, response, stats, start)
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        with track() as stats:
+            response = await self.get_response(request)
+        return self.finish(request, response, stats, start)
+
+    def finish(self, request, response, stats, start):
+        total_ms = (time.perf_counter() - start) * 1000
+        timing = (
+            f'sql;dur={stats.sql_ms:.1f};desc="{stats.queries} queries", '
+            f'storage;dur={stats.storage_ms:.1f};desc="{stats.storage_calls} calls", '
+            f'app;dur={total_ms:.1f}'
+        )
+        if response.has_header('Server-Timing'):
+            timing = f"{response['Server-Timing']}, {timing}"
+        response['Server-Timing'] = timing
+
+        match = getattr(request, 'resolver_match', None)
+        values = {
+            'view': (match.view_name or match._func_path) if match else None,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total_ms, 1),
+            'sql_queries': stats.queries,
+            'sql_ms': round(stats.sql_ms, 1),
+            'slow_queries': stats.slow_queries,
+            'storage_calls': stats.storage_calls,
+            'storage_ms': round(stats.storage_ms, 1),
+        }
+        logger.info(' '.join(f'{k}={v}' for k, v in values.items()), extra={'request_stats': values})
+        return response
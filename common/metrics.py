@@ -0,0 +1,116 @@
+"""
+Prometheus metrics, served in the text format at /metrics (common.views).
+
+- photopick_http_request_duration_seconds{route, method}  histogram
+- photopick_http_requests_total{route, method, status}
+- photopick_storage_operation_duration_seconds{op}         histogram
+- photopick_storage_operations_total{op, outcome}          ok / not_found / error
+- photopick_quota_lock_wait_seconds{counter}               histogram, quota row updates, lock
+  wait included: subscription (Subscription.try_reserve) / storage_usage
+  (StorageUsage.try_add) / subscription_lock (Subscription.lock_for_user)
+- photopick_photos_registered_total{result}                new / duplicate / over_quota
+- photopick_cache_requests_total{cache, result}            hit / miss, per cache:
+  auth_user, share_link, signed_url, conditional_get (a 304)
+
+`route` is the URL name (e.g. 'events-detail'), never the raw path. Hit
+ratios are left to the query, e.g.
+    sum by (cache) (rate(photopick_cache_requests_total{result="hit"}[5m]))
+      / sum by (cache) (rate(photopick_cache_requests_total[5m]))
+
+Several worker processes (gunicorn): point the PROMETHEUS_MULTIPROC_DIR
+environment variable at an empty directory, wiped before the workers start.
+Every process then keeps its values in mmap'd files there, and /metrics
+adds them up across processes at scrape time. Without it, values are
+per process. Dead workers' gauge files must be dropped, in gunicorn.conf.py:
+
+    from prometheus_client import multiprocess
+
+    def child_exit(server, worker):
+        multiprocess.mark_process_dead(worker.pid)
+
+Settings:
+    METRICS_ENABLED   record request metrics (MetricsMiddleware), default on
+    METRICS_TOKEN     /metrics requires "Authorization: Bearer <token>"; when
+                      unset, /metrics answers 404 unless DEBUG is on
+"""
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from prometheus_client import Counter, Histogram
+
+
+REQUEST_LATENCY = Histogram(
+    'photopick_http_request_duration_seconds', 'Request latency, by route', ['route', 'method'],
+)
+REQUESTS = Counter(
+    'photopick_http_requests', 'Requests, by route and status', ['route', 'method', 'status'],
+)
+STORAGE_LATENCY = Histogram(
+    'photopick_storage_operation_duration_seconds', 'Storage call latency, by operation', ['op'],
+)
+STORAGE_OPS = Counter(
+    'photopick_storage_operations', 'Storage calls, by operation and outcome', ['op', 'outcome'],
+)
+QUOTA_LOCK_WAIT = Histogram(
+    'photopick_quota_lock_wait_seconds', 'Time of the conditional quota UPDATE, row lock wait included, by counter',
+    ['counter'],
+    buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10),
+)
+PHOTOS_REGISTERED = Counter(
+    'photopick_photos_registered', 'Registered photos, by result', ['result'],
+)
+CACHE_REQUESTS = Counter(
+    'photopick_cache_requests', 'Cache lookups, by cache and result', ['cache', 'result'],
+)
+
+
+def observe_storage(op: str, seconds: float, outcome: str):
+    STORAGE_LATENCY.labels(op).observe(seconds)
+    STORAGE_OPS.labels(op, outcome).inc()
+
+
+def cache_lookup(cache: str, hit: bool):
+    CACHE_REQUESTS.labels(cache, 'hit' if hit else 'miss').inc()
+
+
+def count_registered(result: str, n: int = 1):
+    if n:
+        PHOTOS_REGISTERED.labels(result).inc(n)
+
+
+class MetricsMiddleware:
+    """
+    Request latency and count per route. Put it first in MIDDLEWARE.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICS_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        start = time.perf_counter()
+        response = self.get_response(request)
+        self.observe(request, response, start)
+        return response
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        self.observe(request, response, start)
+        return response
+
+    def observe(self, request, response, start):
+        match = getattr(request, 'resolver_match', None)
+        route = (match.view_name or match._func_path) if match else 'unmatched'
+        REQUEST_LATENCY.labels(route, request.method).observe(time.perf_counter() - start)
+        REQUESTS.labels(route, request.method, str(response.status_code)).inc()
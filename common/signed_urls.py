@@ -0,0 +1,136 @@
+"""
+Presigned GET URLs for private buckets, cached per validity window.
+
+URLs are signed with X-Amz-Date pinned to the start of the current window
+and valid for two windows, so:
+- the same key yields the exact same URL for a whole window (browsers and
+  CDNs can cache thumbnails), in every worker process;
+- a URL handed out at any point of its window stays valid for at least one
+  more window.
+Entries are not evicted when their window ends: an entry from a past window
+is never served, but replaced on its next lookup, and entries not looked up
+again only leave the in-process LRU once it is full. Shared entries (Django
+cache) are keyed by window and time out one window length after being set.
+
+Settings:
+    SIGNED_URL_WINDOW_SECONDS     window length (default 6h, at most 3.5 days:
+                                  URLs live 2 windows, SigV4 allows 7 days)
+    SIGNED_URL_CACHE_SIZE         max entries in the in-process LRU
+    SIGNED_URL_USE_DJANGO_CACHE   also share URLs through the Django cache backend
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from .metrics import cache_lookup
+from .storage import get_storage
+
+
+MAX_PRESIGN_EXPIRES = 7 * 24 * 3600  # SigV4 limit
+
+
+class SignedUrlCache:
+    def __init__(self, *, window: int = 6 * 3600, maxsize: int = 50000, use_django_cache: bool = False):
+        if not 0 < 2 * window <= MAX_PRESIGN_EXPIRES:
+            raise ValueError(f'Signed URL window must be 1 to {MAX_PRESIGN_EXPIRES // 2} seconds, got {window}')
+        self.window = window
+        self.maxsize = maxsize
+        self.use_django_cache = use_django_cache
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (url, window_start)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _window_start(self, now: float) -> int:
+        return int(now // self.window * self.window)
+
+    def window_start(self) -> int:
+        """Unix time the current URLs were signed at (changes once per window)."""
+        return self._window_start(time.time())
+
+    def url(self, key: str, now: float = None) -> str:
+        """
+        Presigned GET URL for `key`, stable for the current window.
+        """
+        start = self._window_start(time.time() if now is None else now)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[1] == start:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                cache_lookup('signed_url', True)
+                return entry[0]
+            self.misses += 1
+
+        url = None
+        if self.use_django_cache:
+            cache_key = f'signed-url:{start}:{key}'
+            url = cache.get(cache_key)
+        cache_lookup('signed_url', url is not None)
+        if url is None:
+            url = get_storage().presign_get(
+                key, 2 * self.window, now=datetime.fromtimestamp(start, timezone.utc),
+            )
+            if self.use_django_cache:
+                cache.set(cache_key, url, timeout=self.window)
+
+        with self._lock:
+            self._entries[key] = (url, start)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return url
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+
+_signer = None
+_signer_lock = threading.Lock()
+
+
+def get_url_cache() -> SignedUrlCache:
+    global _signer
+    if _signer is None:
+        with _signer_lock:
+            if _signer is None:
+                _signer = SignedUrlCache(
+                    window=getattr(settings, 'SIGNED_URL_WINDOW_SECONDS', 6 * 3600),
+                    maxsize=getattr(settings, 'SIGNED_URL_CACHE_SIZE', 50000),
+                    use_django_cache=getattr(settings, 'SIGNED_URL_USE_DJANGO_CACHE', False),
+                )
+    return _signer
+
+
+def signed_url(key: str) -> str:
+    return get_url_cache().url(key) if key else ''
+
+
+@receiver(setting_changed)
+def _reset_on_setting_change(setting, **kwargs):
+    global _signer
+    if setting.startswith(('SIGNED_URL_', 'STORAGE_', 'WASABI_')):
+        with _signer_lock:
+            _signer = None
@@ -0,0 +1,25 @@
+"""
+Shared test fixtures.
+"""
+import tempfile
+
+from django.test import override_settings
+
+from accounts.models import User
+
+
+class LocalStorageTestMixin:
+    """
+    For TestCase subclasses: storage is a LocalStorage in a fresh temporary
+    directory (self.storage_root) and self.user is an owner account.
+    """
+
+    def setUp(self):
+        super().setUp()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.storage_root = tmp.name
+        overrides = override_settings(STORAGE_BACKEND='local', STORAGE_LOCAL_ROOT=tmp.name)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.user = User.objects.create_user('owner@example.com', 'pass12345', name='Owner')
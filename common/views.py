@@ -1,3 +1,30 @@
-from django.shortcuts import render
+import hmac
+import os
 
-# Create your views here.
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, generate_latest
+from prometheus_client.multiprocess import MultiProcessCollector
+
+
+def metrics(request):
+    """
+    GET /metrics -> Prometheus text format (see common.metrics). Summed over
+    all worker processes when PROMETHEUS_MULTIPROC_DIR is set. Needs
+    METRICS_TOKEN as a bearer token; without one configured it is only
+    served with DEBUG on.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if not token:
+        if not settings.DEBUG:
+            raise Http404
+    elif not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponse(status=401)
+
+    path = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if path:
+        registry = CollectorRegistry()
+        MultiProcessCollector(registry, path=path)
+    else:
+        registry = REGISTRY
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,72 @@
+"""
+ASGI-native photo registration (same contract as PhotoRegisterView and
+PhotoBatchRegisterView).
+
+While storage HEADs are in flight the worker keeps serving other requests:
+storage calls are awaited concurrently (common.aio.storage_call, bounded by
+STORAGE_ASYNC_CONCURRENCY per process) and DB work runs through
+sync_to_async, so a request parks instead of pinning a thread. Under WSGI the
+sync views remain the better fit.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+
+from .serializers import MAX_BYTES
+from .services import delete_objects_later
+from .views import OVERSIZED, BatchRegistration, _register_prepare, _register_result, _register_save
+from accounts.permissions import IsOwnerOrStaff
+from common.aio import async_api_view, storage_call
+from common.storage import get_storage
+
+
+@async_api_view(permission_classes=[IsOwnerOrStaff])
+async def photo_register(request):
+    """
+    POST /api/photos/register/async/
+    """
+    ser, session = await sync_to_async(_register_prepare)(request)
+    data = ser.validated_data
+    if session is not None:
+        size, thumb_size, etag = data['size_bytes'], data.get('thumb_size_bytes') or 0, None
+    else:
+        size, thumb_size, etag, error = await _head_photo(data)
+        if error:
+            if error == OVERSIZED:
+                await sync_to_async(delete_objects_later)([data['image_key']])
+            return {"detail": error}, 400
+
+    photo = await sync_to_async(_register_save)(ser, size, thumb_size, session, etag)
+    return _register_result(photo)
+
+
+@async_api_view(permission_classes=[IsOwnerOrStaff])
+async def photo_register_batch(request):
+    """
+    POST /api/photos/register/batch/async/
+    """
+    batch = BatchRegistration(request.data, request.user)
+    if batch.error:
+        return {"detail": batch.error}, 400
+    await sync_to_async(batch.prepare)()
+    heads = await asyncio.gather(*(_head_photo(data) for _, data, _ in batch.unchecked))
+    return await sync_to_async(batch.finish)(heads)
+
+
+async def _head_photo(data):
+    """
+    Async views._head_photo(): the image and thumbnail HEADs run concurrently.
+    Returns (size, thumb_size, etag, error).
+    """
+    storage = get_storage()
+    calls = [storage_call(storage.head, data['image_key'])]
+    if data.get('thumbnail_key'):
+        calls.append(storage_call(storage.head, data['thumbnail_key']))
+    image, *thumb = await asyncio.gather(*calls, return_exceptions=True)
+
+    if isinstance(image, Exception):
+        return 0, 0, None, f"Image object not found or not accessible: {image}"
+    if image.size > MAX_BYTES:
+        return 0, 0, None, OVERSIZED
+    thumb_size = thumb[0].size if thumb and not isinstance(thumb[0], Exception) else 0
+    return image.size, thumb_size, image.etag, None
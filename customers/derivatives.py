@@ -0,0 +1,181 @@
+"""
+Server-side derivatives (resized JPEGs) of uploaded photos.
+
+generate_derivatives() fetches each original once, renders every size in
+PHOTO_DERIVATIVE_SIZES in a process pool (common.imaging, JPEG draft-mode
+decoding), writes the results through storage and records them as
+PhotoDerivative rows. Photos without a client thumbnail get the smallest
+derivative as thumbnail_key, and every photo gets its perceptual hash
+(Photo.phash, for burst clustering). Runs from the 'photos.derivatives' job.
+
+Storage I/O runs on threads, decoding/encoding on PHOTO_DERIVATIVE_PROCESSES
+processes (default: one per core); at most two chunks of originals are held
+in memory at once.
+"""
+import logging
+import os
+import threading
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import get_context
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import Event, Photo, PhotoDerivative
+from .services import delete_objects_later
+from common.imaging import DECODE_ERRORS, render_photo
+from common.storage import NotFound, get_storage
+from subscriptions.models import StorageUsage
+
+
+logger = logging.getLogger(__name__)
+
+PHASH_BATCH_SIZE = 500  # photos per UPDATE when saving perceptual hashes
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def derivative_sizes() -> tuple:
+    return tuple(getattr(settings, 'PHOTO_DERIVATIVE_SIZES', (320, 1024, 2048)))
+
+
+def derivative_key(photo, size: int) -> str:
+    return f'{photo.event_id}/derivatives/{photo.pk.hex}/{size}.jpg'
+
+
+def process_count() -> int:
+    return getattr(settings, 'PHOTO_DERIVATIVE_PROCESSES', None) or os.cpu_count() or 1
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """
+    The process-wide render pool. Workers are spawned (not forked), so they
+    don't inherit DB connections or the parent's threads.
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(max_workers=process_count(), mp_context=get_context('spawn'))
+    return _pool
+
+
+def generate_derivatives(photo_ids, *, chunk_size: int = None) -> int:
+    """
+    Render and store derivatives for the given photos (idempotent: existing
+    derivatives are overwritten). Missing or undecodable originals are
+    skipped (and logged).
+    Returns the number of photos processed.
+    """
+    photos = list(Photo.objects.filter(pk__in=photo_ids).only('pk', 'event_id', 'image_key', 'thumbnail_key'))
+    if not photos:
+        return 0
+
+    storage = get_storage()
+    sizes = derivative_sizes()
+    pool = get_pool()
+    chunk_size = chunk_size or process_count() * 2
+    quality = getattr(settings, 'PHOTO_DERIVATIVE_QUALITY', 82)
+    done = 0
+
+    with ThreadPoolExecutor(max_workers=getattr(settings, 'PHOTO_REGISTER_HEAD_WORKERS', 16)) as io:
+        def fetch(photo):
+            try:
+                return storage.get(photo.image_key)
+            except NotFound:
+                logger.warning('derivatives: original %s of photo %s is missing', photo.image_key, photo.pk)
+                return None
+
+        def store(photo, rendered):
+            rows = []
+            for size, data, width, height in rendered:
+                key = derivative_key(photo, size)
+                storage.put(key, data, content_type='image/jpeg')
+                rows.append(PhotoDerivative(
+                    photo_id=photo.pk, size=size, key=key, size_bytes=len(data), width=width, height=height,
+                ))
+            return rows
+
+        chunks = [photos[i:i + chunk_size] for i in range(0, len(photos), chunk_size)]
+        # Originals of the next chunk download while this one renders
+        pending = [io.submit(fetch, p) for p in chunks[0]]
+        for n, chunk in enumerate(chunks):
+            bodies = [f.result() for f in pending]
+            pending = [io.submit(fetch, p) for p in chunks[n + 1]] if n + 1 < len(chunks) else []
+
+            renders = [
+                (photo, pool.submit(render_photo, data, sizes, quality=quality))
+                for photo, data in zip(chunk, bodies) if data is not None
+            ]
+            del bodies
+            uploads, hashes = [], {}
+            for photo, render in renders:
+                try:
+                    rendered, hashes[photo.pk] = render.result()
+                except DECODE_ERRORS as e:
+                    # One undecodable original mustn't fail (and retry) the whole job
+                    logger.warning('derivatives: original %s of photo %s cannot be decoded: %s', photo.image_key, photo.pk, e)
+                    continue
+                uploads.append((photo, io.submit(store, photo, rendered)))
+            rows = {photo.pk: upload.result() for photo, upload in uploads}
+            _record(chunk, rows, hashes)
+            done += len(rows)
+    return done
+
+
+def _record(photos, rows: dict, hashes: dict) -> None:
+    """
+    Save derivative rows and perceptual hashes, fill in missing thumbnails,
+    move the owners' and events' stored bytes and bump the events' updated_at
+    (listings embed thumbnail URLs; see common.conditional).
+    """
+    if not rows:
+        return
+    now = timezone.now()
+    with transaction.atomic():
+        # Locking the photos orders this against delete_photo_atomic()
+        alive = dict(
+            Photo.objects.select_for_update(of=('self',)).filter(pk__in=list(rows))
+            .values_list('pk', 'event__customer__owner_id')
+        )
+        # Photos deleted while rendering left these objects behind
+        delete_objects_later([row.key for pk, photo_rows in rows.items() if pk not in alive for row in photo_rows])
+        replaced = Counter()  # bytes of derivatives about to be overwritten
+        for photo_id, size, size_bytes in PhotoDerivative.objects.filter(photo_id__in=list(alive)).values_list(
+            'photo_id', 'size', 'size_bytes',
+        ):
+            if any(row.size == size for row in rows[photo_id]):
+                replaced[photo_id] += size_bytes
+        PhotoDerivative.objects.bulk_create(
+            [row for pk, photo_rows in rows.items() if pk in alive for row in photo_rows],
+            update_conflicts=True,
+            unique_fields=['photo', 'size'],
+            update_fields=['key', 'size_bytes', 'width', 'height', 'updated_at'],
+        )
+        Photo.objects.bulk_update(
+            [Photo(pk=pk, phash=hashes[pk]) for pk in alive], ['phash'], batch_size=PHASH_BATCH_SIZE,
+        )
+        for photo in photos:
+            if photo.pk in alive and not photo.thumbnail_key and rows[photo.pk]:
+                smallest = rows[photo.pk][0]
+                Photo.objects.filter(pk=photo.pk, thumbnail_key__isnull=True).update(
+                    thumbnail_key=smallest.key, thumb_size_bytes=smallest.size_bytes, updated_at=now,
+                )
+
+        by_owner, by_event = Counter(), Counter()
+        for photo in photos:
+            if photo.pk in alive:
+                delta = sum(row.size_bytes for row in rows[photo.pk]) - replaced[photo.pk]
+                by_owner[alive[photo.pk]] += delta
+                by_event[photo.event_id] += delta
+        for owner_id, delta in by_owner.items():
+            StorageUsage.adjust(owner_id, derivative=delta)
+        for event_id, delta in by_event.items():
+            Event.objects.filter(pk=event_id).update(
+                storage_bytes=Greatest(F('storage_bytes') + delta, Value(0)), updated_at=now,
+            )
@@ -0,0 +1,130 @@
+"""
+Garbage collection of storage objects no database row refers to.
+
+Cascading deletes (Event, Customer, ...) remove Photo rows but not their
+objects. collect_orphans() walks the bucket listing and the referenced keys
+(Photo.image_key / thumbnail_key, PhotoDerivative.key) side by side, both
+sorted by byte order (S3 listing order; ORDER BY ... COLLATE "C" in
+PostgreSQL), so neither side is ever held in memory: a sorted merge.
+Orphans older than the grace period are deleted DELETE_BATCH_SIZE at a time,
+after re-checking each batch against the database (a key may have been
+registered after the merge passed it).
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Photo, PhotoDerivative
+from .services import upload_session_ttl
+from common.storage import DELETE_BATCH_SIZE, get_storage
+
+
+DB_FETCH_SIZE = 5000
+
+
+def gc_grace() -> timedelta:
+    """
+    Objects younger than this are never collected. Always longer than an
+    upload session, so uploaded-but-not-yet-registered objects are safe.
+    """
+    grace = timedelta(seconds=getattr(settings, 'STORAGE_GC_GRACE_SECONDS', 2 * 24 * 3600))
+    return max(grace, 2 * upload_session_ttl())
+
+
+def referenced_keys(prefix: str = ''):
+    """
+    Every key the database refers to under `prefix`, ascending in byte order
+    (duplicates possible), streamed with a server-side cursor.
+    """
+    qn = connection.ops.quote_name
+    photos, derivatives = qn(Photo._meta.db_table), qn(PhotoDerivative._meta.db_table)
+    collate = ' COLLATE "C"' if connection.vendor == 'postgresql' else ''  # SQLite sorts by bytes already
+    sql = f"""
+        SELECT k FROM (
+            SELECT {qn('image_key')} AS k FROM {photos}
+            UNION ALL
+            SELECT {qn('thumbnail_key')} FROM {photos} WHERE {qn('thumbnail_key')} IS NOT NULL
+            UNION ALL
+            SELECT {qn('key')} FROM {derivatives}
+        ) refs
+        WHERE k LIKE %s ESCAPE '!'
+        ORDER BY k{collate}
+    """
+    pattern = prefix.replace('!', '!!').replace('%', '!%').replace('_', '!_') + '%'
+    with connection.chunked_cursor() as cursor:
+        cursor.execute(sql, [pattern])
+        while rows := cursor.fetchmany(DB_FETCH_SIZE):
+            for (key,) in rows:
+                yield key
+
+
+def find_orphans(objects, keys):
+    """
+    Sorted merge: yield the objects (ascending by key) whose key is not in
+    `keys` (ascending, duplicates allowed).
+    """
+    keys = iter(keys)
+    current = next(keys, None)
+    for obj in objects:
+        while current is not None and current < obj.key:
+            current = next(keys, None)
+        if current != obj.key:
+            yield obj
+
+
+def _still_unreferenced(keys) -> list:
+    used = set(PhotoDerivative.objects.filter(key__in=keys).values_list('key', flat=True))
+    for image_key, thumbnail_key in Photo.objects.filter(
+        Q(image_key__in=keys) | Q(thumbnail_key__in=keys)
+    ).values_list('image_key', 'thumbnail_key'):
+        used.update((image_key, thumbnail_key))
+    return [key for key in keys if key not in used]
+
+
+def collect_orphans(*, prefix: str = '', grace: timedelta = None, dry_run: bool = False, sample: int = 0) -> dict:
+    """
+    Delete (or with dry_run, only count) orphaned objects under `prefix`
+    older than `grace` (default gc_grace()). Returns a report:
+    scanned/scanned_bytes, young (orphans inside the grace period),
+    orphans/orphan_bytes, deleted, failed and up to `sample` orphan keys.
+    """
+    storage = get_storage()
+    cutoff = (timezone.now() - (grace or gc_grace())).timestamp()
+    report = {
+        'scanned': 0, 'scanned_bytes': 0, 'young': 0, 'orphans': 0, 'orphan_bytes': 0,
+        'deleted': 0, 'failed': 0, 'sample': [],
+    }
+
+    def counted(objects):
+        for obj in objects:
+            report['scanned'] += 1
+            report['scanned_bytes'] += obj.size
+            yield obj
+
+    def flush(batch):
+        keys = _still_unreferenced([obj.key for obj in batch])
+        failed = storage.delete_many(keys) if keys else []
+        report['deleted'] += len(keys) - len(failed)
+        report['failed'] += len(failed)
+
+    batch = []
+    for obj in find_orphans(counted(storage.list(prefix)), referenced_keys(prefix)):
+        if obj.last_modified is not None and obj.last_modified > cutoff:
+            report['young'] += 1
+            continue
+        report['orphans'] += 1
+        report['orphan_bytes'] += obj.size
+        if len(report['sample']) < sample:
+            report['sample'].append(obj.key)
+        if dry_run:
+            continue
+        batch.append(obj)
+        if len(batch) == DELETE_BATCH_SIZE:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+    return report
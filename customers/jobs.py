@@ -0,0 +1,71 @@
+"""
+Background work for customers (see jobs.queue).
+"""
+from django.db.models import Q
+
+from .derivatives import generate_derivatives
+from .models import Photo, PhotoDerivative
+from .services import correct_photo_size, delete_photo_atomic, expire_upload_sessions, record_photo_etag
+from common.storage import DELETE_BATCH_SIZE, NotFound, get_storage
+from jobs.queue import register
+
+
+@register('storage.delete_objects', max_attempts=8, backoff=30)
+def delete_objects(payload):
+    """
+    Delete storage objects no photo or derivative refers to (anymore): the
+    originals, thumbnails and derivatives of deleted photos. Keys still used -
+    e.g. registered twice - are kept. Objects go DELETE_BATCH_SIZE per
+    request; if any fail the job raises and is retried.
+    """
+    keys = set(filter(None, payload.get('keys', [])))
+    in_use = set()
+    for image_key, thumbnail_key in Photo.objects.filter(
+        Q(image_key__in=keys) | Q(thumbnail_key__in=keys)
+    ).values_list('image_key', 'thumbnail_key'):
+        in_use.update((image_key, thumbnail_key))
+    in_use.update(PhotoDerivative.objects.filter(key__in=keys).values_list('key', flat=True))
+
+    storage, doomed, failed = get_storage(), sorted(keys - in_use), []
+    for start in range(0, len(doomed), DELETE_BATCH_SIZE):
+        failed += storage.delete_many(doomed[start:start + DELETE_BATCH_SIZE])
+    if failed:
+        raise RuntimeError(f'Could not delete {len(failed)} object(s), e.g. {failed[0]!r}')
+
+
+@register('photos.derivatives', max_attempts=3, backoff=120)
+def derivatives(payload):
+    """
+    Render and store the server-side sizes of newly registered photos.
+    """
+    generate_derivatives(payload.get('ids', []))
+
+
+@register('photos.verify_uploads', max_attempts=5, backoff=60)
+def verify_uploads(payload):
+    """
+    Check photos registered through an upload session (which skipped the
+    HEAD at registration): photos whose object never arrived are deleted
+    (giving their quota slot back), and so are duplicates of content the
+    event already has; ETags and sizes are recorded from storage.
+    """
+    storage = get_storage()
+    for photo in Photo.objects.filter(pk__in=payload.get('ids', [])).select_related('event__customer'):
+        try:
+            info = storage.head(photo.image_key)
+        except NotFound:
+            delete_photo_atomic(photo=photo)
+            continue
+        if info.etag and info.etag != photo.etag and not record_photo_etag(photo, info.etag):
+            continue
+        if info.size != photo.size_bytes:
+            correct_photo_size(photo, info.size)
+
+
+@register('uploads.expire_sessions', max_attempts=5, backoff=60)
+def expire_sessions(payload):
+    """
+    Give back the unused slots of an owner's expired upload sessions. Queued
+    by open_upload_session(), due when the session expires.
+    """
+    expire_upload_sessions(owner_id=payload.get('owner_id'))
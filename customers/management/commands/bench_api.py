@@ -0,0 +1,218 @@
+import json
+import platform
+import statistics
+import tempfile
+import time
+import uuid
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from common.storage import get_storage
+from customers.models import Event, Photo, ShareLink
+from customers.seed import seed, seed_email, unseed
+from subscriptions.models import Subscription
+from vpk_photopick.urls import router
+
+
+User = get_user_model()
+
+PERCENTILES = (50, 90, 95, 99)
+
+# GET endpoints outside the router, measured as well: (url name, kwarg source)
+EXTRA_ENDPOINTS = (
+    ('storage-usage', None),
+    ('share-gallery', 'token'),
+    ('share-photos', 'token'),
+    ('share-download', 'token'),
+)
+
+# Query strings for endpoints that are meant to be called with one
+QUERY = {
+    'photos-list': lambda ids: f"?event={ids['events']}",
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway data set (see seed_data) and measure latency percentiles and SQL "
+        "query counts of every GET endpoint the API router exposes (list, detail and extra "
+        "actions), plus storage usage and the public share gallery. Runs in-process against "
+        "the local storage stand-in, so it works offline. --output writes the results as JSON; "
+        "--compare prints the change against an earlier run's JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', type=int, default=10, help='Customers of the benchmark user.')
+        parser.add_argument('--events', type=int, default=5, help='Events per customer.')
+        parser.add_argument('--photos', type=int, default=200, help='Photos per event.')
+        parser.add_argument('--selected', type=float, default=0.1)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--requests', type=int, default=50, help='Timed requests per endpoint.')
+        parser.add_argument('--warmup', type=int, default=5, help='Untimed requests per endpoint first.')
+        parser.add_argument('--only', default='', help='Comma-separated URL names to measure (default: all).')
+        parser.add_argument('--output', default=None, help='Write the results to this JSON file.')
+        parser.add_argument('--compare', default=None, help='Earlier --output file to compare against.')
+
+    def handle(self, *args, **opts):
+        if opts['requests'] < 2:
+            raise CommandError('--requests must be at least 2.')
+        baseline = None
+        if opts['compare']:
+            try:
+                with open(opts['compare']) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Cannot read {opts['compare']}: {e}")
+
+        prefix = f'bench-api-{uuid.uuid4().hex[:8]}'
+        params = {k: opts[k] for k in ('customers', 'events', 'photos', 'selected', 'seed')}
+        with tempfile.TemporaryDirectory() as root, override_settings(
+            STORAGE_BACKEND='local',
+            STORAGE_LOCAL_ROOT=root,
+            STORAGE_LOCAL_LATENCY_MS=0,
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+        ):
+            start = time.perf_counter()
+            seed(users=1, prefix=prefix, objects=True, **params)
+            self.stdout.write(
+                f"Seeded {opts['customers']} customer(s) x {opts['events']} event(s) x {opts['photos']} "
+                f"photo(s) in {time.perf_counter() - start:.1f}s"
+            )
+            try:
+                results = self.bench(User.objects.get(email=seed_email(prefix, 0)), opts)
+            finally:
+                unseed(prefix)
+
+        report = {
+            'meta': {
+                'time': timezone.now().isoformat(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'requests': opts['requests'],
+                'warmup': opts['warmup'],
+                'seed': params,
+            },
+            'endpoints': results,
+        }
+        if opts['output']:
+            with open(opts['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Wrote {opts['output']}")
+        if baseline:
+            self.compare(baseline, report)
+
+    def bench(self, user, opts) -> dict:
+        only = {name.strip() for name in opts['only'].split(',') if name.strip()}
+        client = Client(headers={'Authorization': f'Bearer {AccessToken.for_user(user)}'})
+        storage = get_storage()
+        results = {}
+        self.stdout.write(
+            f"{'endpoint':<28} {'status':>6} {'kB':>7} {'queries':>7} {'storage':>7} "
+            + ' '.join(f'{"p" + str(p):>7}' for p in PERCENTILES) + f" {'max':>7}  (ms)"
+        )
+        for name, url in self.endpoints(user):
+            if only and name not in only:
+                continue
+            for _ in range(opts['warmup']):
+                _get(client, url)
+
+            # Counted separately, so counting doesn't skew the timings
+            storage.reset_stats()
+            queries = []
+            with connection.execute_wrapper(lambda execute, sql, *args: queries.append(sql) or execute(sql, *args)):
+                status, size = _get(client, url)
+            storage_calls = sum(s['count'] for s in storage.stats().values())
+
+            timings = []
+            for _ in range(opts['requests']):
+                t0 = time.perf_counter()
+                _get(client, url)
+                timings.append((time.perf_counter() - t0) * 1000)
+
+            cuts = statistics.quantiles(timings, n=100, method='inclusive')
+            results[name] = {
+                'url': url,
+                'status': status,
+                'bytes': size,
+                'queries': len(queries),
+                'storage_calls': storage_calls,
+                **{f'p{p}_ms': round(cuts[p - 1], 3) for p in PERCENTILES},
+                'max_ms': round(max(timings), 3),
+                'mean_ms': round(statistics.fmean(timings), 3),
+            }
+            r = results[name]
+            self.stdout.write(
+                f"{name:<28} {status:>6} {size / 1e3:>7.1f} {r['queries']:>7} {storage_calls:>7} "
+                + ' '.join(f"{r[f'p{p}_ms']:>7.1f}" for p in PERCENTILES) + f" {r['max_ms']:>7.1f}"
+            )
+        return results
+
+    def endpoints(self, user):
+        """
+        (url name, path) for every GET route of the router, plus EXTRA_ENDPOINTS,
+        pointed at the first of the user's seeded objects.
+        """
+        event = Event.objects.filter(customer__owner=user).order_by('created_at', 'pk').first()
+        ids = {
+            'accounts': user.pk,
+            'subscriptions': Subscription.objects.get(user=user).pk,
+            'customers': event.customer_id,
+            'events': event.pk,
+            'photos': Photo.objects.filter(event=event).order_by('created_at', 'pk').values_list('pk', flat=True)[0],
+            'share-links': ShareLink.objects.filter(event=event).values_list('pk', flat=True)[0],
+        }
+        token = ShareLink.objects.get(pk=ids['share-links']).token
+
+        for _prefix, viewset, basename in router.registry:
+            routes = [('list', False), ('detail', True)]
+            routes += [(action.url_name, action.detail) for action in viewset.get_extra_actions()
+                       if 'get' in action.mapping]
+            for url_name, detail in routes:
+                name = f'{basename}-{url_name}'
+                url = reverse(name, kwargs={'pk': ids[basename]} if detail else None)
+                yield name, url + QUERY.get(name, lambda ids: '')(ids)
+
+        for name, kwarg in EXTRA_ENDPOINTS:
+            yield name, reverse(name, kwargs={'token': token} if kwarg else None)
+
+    def compare(self, baseline, report):
+        self.stdout.write(f"\nAgainst {baseline['meta']['time']} (p50 / p95 ms, queries):")
+        old = baseline['endpoints']
+        for name, new in report['endpoints'].items():
+            if name not in old:
+                self.stdout.write(f'{name:<28} (new)')
+                continue
+            was = old[name]
+            self.stdout.write(
+                f"{name:<28} "
+                f"p50 {was['p50_ms']:7.1f} -> {new['p50_ms']:7.1f} {_change(was['p50_ms'], new['p50_ms'])}  "
+                f"p95 {was['p95_ms']:7.1f} -> {new['p95_ms']:7.1f} {_change(was['p95_ms'], new['p95_ms'])}  "
+                f"queries {was['queries']} -> {new['queries']}"
+            )
+        missing = sorted(old.keys() - report['endpoints'].keys())
+        if missing:
+            self.stdout.write(f"Not measured this run: {', '.join(missing)}")
+
+
+def _get(client, url) -> tuple:
+    """GET `url` and read the whole body (streamed ones too); returns (status, bytes)."""
+    res = client.get(url)
+    if res.streaming:
+        size = sum(len(chunk) for chunk in res.streaming_content)
+    else:
+        size = len(res.content)
+    res.close()
+    return res.status_code, size
+
+
+def _change(old: float, new: float) -> str:
+    return f'{(new - old) / old * 100:+6.1f}%' if old else '     n/a'
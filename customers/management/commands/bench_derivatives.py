@@ -0,0 +1,56 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from multiprocessing import get_context
+
+from django.core.management.base import BaseCommand
+
+from common.imaging import render_derivatives, sample_jpeg
+from customers.derivatives import derivative_sizes
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure derivative rendering throughput (images/s and images/s per core) of "
+        "common.imaging.render_derivatives in a process pool, with and without JPEG draft mode. "
+        "CPU only: no storage or database access."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--images', type=int, default=24)
+        parser.add_argument('--width', type=int, default=6000)
+        parser.add_argument('--height', type=int, default=4000)
+        parser.add_argument('--processes', default='',
+                            help='Comma-separated pool sizes to try (default: 1 and one per core).')
+
+    def handle(self, *args, **opts):
+        cores = os.cpu_count() or 1
+        processes = sorted({int(p) for p in opts['processes'].split(',') if p.strip()} or {1, cores})
+        sizes = derivative_sizes()
+        ctx = get_context('spawn')
+
+        with ProcessPoolExecutor(max_workers=cores, mp_context=ctx) as pool:
+            # a handful of distinct originals, reused round-robin
+            samples = list(pool.map(
+                sample_jpeg, [opts['width']] * 4, [opts['height']] * 4, range(4),
+            ))
+        images = [samples[i % len(samples)] for i in range(opts['images'])]
+        mb = sum(map(len, images)) / len(images) / 1e6
+        self.stdout.write(
+            f"{opts['images']} x {opts['width']}x{opts['height']} JPEG (~{mb:.1f} MB) -> {sizes} px, {cores} core(s)"
+        )
+
+        for n in processes:
+            with ProcessPoolExecutor(max_workers=n, mp_context=ctx) as pool:
+                list(pool.map(partial(render_derivatives, sizes=sizes), images[:n]))  # warm up the workers
+                for draft in (True, False):
+                    start = time.perf_counter()
+                    out = list(pool.map(partial(render_derivatives, sizes=sizes, draft=draft), images))
+                    elapsed = time.perf_counter() - start
+                    written = sum(len(d) for rendered in out for _, d, _, _ in rendered) / len(out) / 1e3
+                    rate = len(images) / elapsed
+                    self.stdout.write(
+                        f"{n:>3} process(es), draft {'on ' if draft else 'off'}: "
+                        f"{rate:7.2f} images/s  {rate / n:6.2f} images/s/core  {written:7.1f} kB written/image"
+                    )
@@ -0,0 +1,163 @@
+import asyncio
+import statistics
+import tempfile
+import threading
+import time
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import AsyncClient, Client, override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from common.storage import get_storage
+from customers.models import Customer, Event, Photo
+from subscriptions.models import PLAN_UPLOAD_LIMITS, Plan, Subscription
+
+
+User = get_user_model()
+
+ENDPOINTS = {
+    'single': ('/api/photos/register/', '/api/photos/register/async/'),
+    'batch': ('/api/photos/register/batch/', '/api/photos/register/batch/async/'),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare photo registration throughput of the sync (WSGI) views, served by "
+        "--workers threads, against the async (ASGI) views, served by one event loop "
+        "with --concurrency requests in flight. Storage is the local stand-in with "
+        "--latency-ms added to every call. Creates and removes a throwaway user."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--endpoint', choices=sorted(ENDPOINTS), default='single')
+        parser.add_argument('--requests', type=int, default=400)
+        parser.add_argument('--batch', type=int, default=10, help='Photos per request for --endpoint batch.')
+        parser.add_argument('--workers', type=int, default=4, help='WSGI worker threads.')
+        parser.add_argument('--concurrency', type=int, default=64, help='ASGI requests in flight.')
+        parser.add_argument('--latency-ms', type=int, default=50)
+        parser.add_argument(
+            '--storage-concurrency', type=int, default=None,
+            help='Override STORAGE_ASYNC_CONCURRENCY (the sync batch view uses PHOTO_REGISTER_HEAD_WORKERS per request).',
+        )
+
+    def handle(self, *args, **opts):
+        per_request = opts['batch'] if opts['endpoint'] == 'batch' else 1
+        if opts['requests'] * per_request > PLAN_UPLOAD_LIMITS[Plan.PRO]:
+            raise CommandError(f'At most {PLAN_UPLOAD_LIMITS[Plan.PRO]} photos per run (the PRO plan limit).')
+
+        with tempfile.TemporaryDirectory() as root, override_settings(
+            STORAGE_BACKEND='local',
+            STORAGE_LOCAL_ROOT=root,
+            STORAGE_LOCAL_LATENCY_MS=opts['latency_ms'],
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+            STORAGE_ASYNC_CONCURRENCY=opts['storage_concurrency'] or settings.STORAGE_ASYNC_CONCURRENCY,
+        ):
+            user = User.objects.create_user(f'bench-register-{uuid.uuid4().hex[:8]}@example.invalid', name='Bench')
+            try:
+                self.bench(user, opts, per_request)
+            finally:
+                user.delete()
+
+    def bench(self, user, opts, per_request):
+        Subscription.objects.filter(user=user).update(
+            plan=Plan.PRO,
+            stripe_customer_id=f'bench_{user.pk.hex}',
+            stripe_subscription_id=f'bench_{user.pk.hex}',
+        )
+        event = Event.objects.create(customer=Customer.objects.create(owner=user, name='Bench'), name='Bench')
+
+        # Objects to register, uploaded without latency
+        storage = get_storage()
+        latency, storage.latency = storage.latency, 0
+        keys = [f'bench/{event.pk}/{i:05d}.jpg' for i in range(opts['requests'] * per_request)]
+        for i, key in enumerate(keys):
+            storage.put(key, b'\xff\xd8' + i.to_bytes(4, 'big') + bytes(2044))  # distinct, or they'd be duplicates
+        storage.latency = latency
+
+        bodies = []
+        for n in range(opts['requests']):
+            items = [{'event_id': str(event.pk), 'image_key': key, 'original_name': key.rsplit('/', 1)[-1]}
+                     for key in keys[n * per_request:(n + 1) * per_request]]
+            bodies.append(items if opts['endpoint'] == 'batch' else items[0])
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(user)}'}
+
+        wsgi_url, asgi_url = ENDPOINTS[opts['endpoint']]
+        self.stdout.write(
+            f"{opts['requests']} x {opts['endpoint']} ({per_request} photo(s) each), "
+            f"storage latency {opts['latency_ms']} ms, "
+            f"async storage concurrency {settings.STORAGE_ASYNC_CONCURRENCY}"
+        )
+        for name, run in (
+            (f"wsgi x{opts['workers']} threads", lambda: self.run_wsgi(wsgi_url, bodies, headers, opts['workers'])),
+            (f"asgi x{opts['concurrency']} in flight", lambda: asyncio.run(
+                self.run_asgi(asgi_url, bodies, headers, opts['concurrency']))),
+        ):
+            Photo.objects.filter(event=event).delete()
+            Subscription.objects.filter(user=user).update(photos_used_cached=0)
+            elapsed, latencies, failed = run()
+            self.report(name, elapsed, latencies, failed, Photo.objects.filter(event=event).count())
+
+    def run_wsgi(self, url, bodies, headers, workers):
+        latencies, failed = [], []
+        lock = threading.Lock()
+        todo = iter(bodies)
+
+        def worker():
+            client, mine, bad = Client(), [], 0
+            try:
+                while True:
+                    with lock:
+                        body = next(todo, None)
+                    if body is None:
+                        break
+                    t0 = time.perf_counter()
+                    res = client.post(url, body, content_type='application/json', headers=headers)
+                    mine.append(time.perf_counter() - t0)
+                    bad += res.status_code != 201
+            finally:
+                connections.close_all()
+                with lock:
+                    latencies.extend(mine)
+                    failed.append(bad)
+
+        threads = [threading.Thread(target=worker) for _ in range(workers)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return time.perf_counter() - start, latencies, sum(failed)
+
+    async def run_asgi(self, url, bodies, headers, concurrency):
+        client, latencies, failed = AsyncClient(), [], 0
+        gate = asyncio.Semaphore(concurrency)
+
+        async def one(body):
+            nonlocal failed
+            async with gate:
+                t0 = time.perf_counter()
+                res = await client.post(url, body, content_type='application/json', headers=headers)
+                latencies.append(time.perf_counter() - t0)
+                failed += res.status_code != 201
+
+        start = time.perf_counter()
+        try:
+            await asyncio.gather(*(one(body) for body in bodies))
+        finally:
+            await sync_to_async(connections.close_all)()
+        return time.perf_counter() - start, latencies, failed
+
+    def report(self, name, elapsed, latencies, failed, photos):
+        latencies.sort()
+        p50 = statistics.median(latencies) * 1000
+        p99 = latencies[max(int(len(latencies) * 0.99) - 1, 0)] * 1000
+        self.stdout.write(
+            f'{name:>24}: {len(latencies) / elapsed:8.1f} req/s  '
+            f'p50 {p50:7.1f} ms  p99 {p99:7.1f} ms  failed {failed}  photos {photos}'
+        )
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from customers.services import expire_upload_sessions
+
+
+class Command(BaseCommand):
+    help = (
+        "Close expired upload sessions and give their unused quota slots back. Sessions are "
+        "expired by an 'uploads.expire_sessions' job anyway; this is a catch-all sweep."
+    )
+
+    def handle(self, *args, **opts):
+        closed = expire_upload_sessions()
+        self.stdout.write(self.style.SUCCESS(f'Closed {closed} expired upload session(s).'))
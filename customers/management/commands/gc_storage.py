@@ -0,0 +1,41 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from customers.gc import collect_orphans, gc_grace
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete storage objects no photo or derivative refers to (e.g. left behind by cascading "
+        "deletes), older than a grace period. Streams the bucket listing and the database keys "
+        "as a sorted merge. Use --dry-run for a report only."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prefix', default='', help='Only look at keys under this prefix (e.g. an event id).')
+        parser.add_argument('--grace-hours', type=float, default=None,
+                            help=f'Skip objects younger than this (default {gc_grace().total_seconds() / 3600:g}).')
+        parser.add_argument('--dry-run', action='store_true', help='Report orphans without deleting them.')
+        parser.add_argument('--show', type=int, default=0, help='List up to N orphan keys.')
+
+    def handle(self, *args, **opts):
+        grace = timedelta(hours=opts['grace_hours']) if opts['grace_hours'] is not None else None
+        report = collect_orphans(prefix=opts['prefix'], grace=grace, dry_run=opts['dry_run'], sample=opts['show'])
+
+        self.stdout.write(
+            f"Scanned {report['scanned']} object(s) ({_mb(report['scanned_bytes'])}); "
+            f"{report['orphans']} orphan(s) ({_mb(report['orphan_bytes'])}), "
+            f"{report['young']} more inside the grace period."
+        )
+        for key in report['sample']:
+            self.stdout.write(f'  {key}')
+        if opts['dry_run']:
+            self.stdout.write('Dry run: nothing deleted.')
+            return
+        style = self.style.ERROR if report['failed'] else self.style.SUCCESS
+        self.stdout.write(style(f"Deleted {report['deleted']} object(s), {report['failed']} failed."))
+
+
+def _mb(n: int) -> str:
+    return f'{n / 1e6:.1f} MB'
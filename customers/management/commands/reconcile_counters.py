@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+
+from customers.services import reconcile_owner_counters
+from subscriptions.models import Subscription
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the denormalized counters Event.photos_count / selected_count / storage_bytes, "
+        "Subscription.photos_used_cached and the StorageUsage byte rollups from the photo and "
+        "derivative rows, owner by owner in chunks, and fix the rows that drifted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500, help='Owners per chunk.')
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without writing.')
+        parser.add_argument('--show', action='store_true', help='List every drifted row.')
+
+    def handle(self, *args, **opts):
+        chunk_size, dry_run = opts['chunk_size'], opts['dry_run']
+        totals = {}  # counter -> [rows, |drift|]
+        owners = 0
+        last = None
+
+        # Keyset walk over owners, so every chunk is an index range scan
+        while True:
+            qs = Subscription.objects.order_by('user_id').values_list('user_id', flat=True)
+            if last is not None:
+                qs = qs.filter(user_id__gt=last)
+            chunk = list(qs[:chunk_size])
+            if not chunk:
+                break
+            last = chunk[-1]
+            owners += len(chunk)
+
+            drift = reconcile_owner_counters(chunk, dry_run=dry_run)
+            for counter, rows in drift.items():
+                total = totals.setdefault(counter, [0, 0])
+                total[0] += len(rows)
+                total[1] += sum(abs(d) for d in rows.values())
+                if opts['show']:
+                    for pk, d in rows.items():
+                        self.stdout.write(f'  {counter} {pk}: {d:+d}')
+
+        verb = 'would fix' if dry_run else 'fixed'
+        self.stdout.write(f'Checked {owners} owner(s).')
+        for counter, (rows, amount) in totals.items():
+            self.stdout.write(f'  {counter}: {rows} row(s) drifted by {amount} in total ({verb})')
+        self.stdout.write(self.style.SUCCESS('Done.'))
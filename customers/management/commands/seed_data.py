@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from customers.seed import seed, unseed
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed synthetic users, customers, events, share links and photos with bulk INSERTs "
+        "(counters consistent, deterministic for a given --seed), e.g. for bench_api. "
+        "Users are <prefix>-00000@example.invalid, ...; --delete removes them again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--customers', type=int, default=5, help='Customers per user.')
+        parser.add_argument('--events', type=int, default=4, help='Events per customer.')
+        parser.add_argument('--photos', type=int, default=250, help='Photos per event.')
+        parser.add_argument('--selected', type=float, default=0.1, help='Share of photos the client selected.')
+        parser.add_argument('--prefix', default='seed')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--password', default=None, help='Password for every seeded user (default: unusable).')
+        parser.add_argument('--objects', action='store_true',
+                            help='Also write each original and thumbnail to storage (small random bodies).')
+        parser.add_argument('--delete', action='store_true', help='Delete the users seeded with --prefix instead.')
+
+    def handle(self, *args, **opts):
+        if opts['delete']:
+            n = unseed(opts['prefix'])
+            self.stdout.write(self.style.SUCCESS(f"Deleted {n} seeded user(s) and everything they owned."))
+            return
+
+        start = time.perf_counter()
+        try:
+            counts = seed(
+                users=opts['users'], customers=opts['customers'], events=opts['events'], photos=opts['photos'],
+                prefix=opts['prefix'], selected=opts['selected'], objects=opts['objects'],
+                password=opts['password'], seed=opts['seed'],
+            )
+        except ValueError as e:
+            raise CommandError(f"{e} Use --delete or another --prefix.")
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            'Seeded ' + ', '.join(f'{n} {model}' for model, n in counts.items()) + f' in {elapsed:.1f}s.'
+        ))
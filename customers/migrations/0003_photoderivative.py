@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-17 01:23
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0002_uploadsession'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PhotoDerivative',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('size', models.PositiveSmallIntegerField()),
+                ('key', models.CharField(max_length=512)),
+                ('size_bytes', models.PositiveBigIntegerField(default=0)),
+                ('width', models.PositiveIntegerField(default=0)),
+                ('height', models.PositiveIntegerField(default=0)),
+                ('photo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='derivatives', to='customers.photo')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('photo', 'size'), name='photoderivative_photo_size_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 01:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0003_photoderivative'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='storage_bytes',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.6 on 2026-10-17 01:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0004_event_storage_bytes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='photo',
+            name='etag',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='photo',
+            constraint=models.UniqueConstraint(condition=models.Q(('etag__isnull', False)), fields=('event', 'etag'), name='photo_event_etag_uniq'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 01:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0005_photo_etag_photo_photo_event_etag_uniq'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='photo',
+            name='phash',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 01:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0006_photo_phash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadsession',
+            name='sizes',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
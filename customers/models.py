@@ -1,12 +1,15 @@
 import uuid
 from datetime import timedelta
 from django.conf import settings
+from django.core.cache import cache
 from django.db import models
+from django.db.models import F
 from django.utils import timezone
 from django.utils.text import slugify
 
 from subscriptions.models import PLAN_UPLOAD_LIMITS, Plan
 from common.models import TimeStampedUUIDModel
+from common.signed_urls import signed_url
 
 
 User = settings.AUTH_USER_MODEL
@@ -30,8 +33,9 @@ class Customer(TimeStampedUUIDModel):
 class Event(TimeStampedUUIDModel):
     """
     One event/function for a customer.
-    UI counters are denormalized for snappy lists; authoritative enforcement
-    of per-user upload limits happens in customers.services.create_photo_atomic().
+    UI counters are denormalized for snappy lists and maintained by
+    customers.services; authoritative enforcement of per-user upload limits
+    happens in customers.services.create_photos_bulk().
     """
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='events')
     name = models.CharField(max_length=255)
@@ -41,6 +45,7 @@ class Event(TimeStampedUUIDModel):
     # read-only counters (denormalized for quick UI)
     photos_count = models.PositiveIntegerField(default=0)
     selected_count = models.PositiveIntegerField(default=0)
+    storage_bytes = models.PositiveBigIntegerField(default=0)  # this event's share of subscriptions.StorageUsage
 
     class Meta:
         unique_together = [('customer', 'name')]
@@ -59,7 +64,7 @@ class Event(TimeStampedUUIDModel):
     def upload_limit(self) -> int:
         """
         Returns the owner's plan limit. Used for display; hard enforcement happens
-        inside the service layer with row locks.
+        inside the service layer (subscriptions.quota).
         """
         sub = getattr(self.customer.owner, 'subscription', None)
         if not sub:
@@ -67,11 +72,23 @@ class Event(TimeStampedUUIDModel):
         return sub.upload_limit
 
 
+def object_url(key) -> str:
+    """
+    Browser-facing URL for a storage key.
+    """
+    if not key:
+        return ''
+    if getattr(settings, 'AWS_QUERYSTRING_AUTH', False):
+        return signed_url(key)
+    base = getattr(settings, 'WASABI_PUBLIC_BASE', '').rstrip('/')  # e.g., https://s3.us-east-1.wasabisys.com/<bucket>
+    return f'{base}/{key}' if base else key
+
+
 class Photo(TimeStampedUUIDModel):
     """
     Single uploaded photo for an event.
-    Authoritative quota enforcement is done in customers.services.create_photo_atomic()
-    (inside a transaction with select_for_update + F() increments).
+    Authoritative quota enforcement is done in customers.services.create_photos_bulk()
+    (a conditional UPDATE on the subscription, see subscriptions.quota).
     """
     event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='photos')
 
@@ -82,6 +99,10 @@ class Photo(TimeStampedUUIDModel):
     original_name = models.CharField(max_length=255, blank=True, null=True)
     size_bytes = models.PositiveBigIntegerField(default=0)
     thumb_size_bytes = models.PositiveBigIntegerField(default=0)
+    # Storage ETag of the original (content fingerprint); one photo per content per event
+    etag = models.CharField(max_length=64, blank=True, null=True)
+    # 64-bit perceptual hash (common.imaging.dhash), set with the derivatives
+    phash = models.BigIntegerField(blank=True, null=True)
 
     # Client selection flag
     is_selected = models.BooleanField(default=False)
@@ -92,20 +113,45 @@ class Photo(TimeStampedUUIDModel):
             models.Index(fields=['event', 'created_at']),
             models.Index(fields=['event', 'is_selected']),
         ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['event', 'etag'], name='photo_event_etag_uniq', condition=models.Q(etag__isnull=False),
+            ),
+        ]
 
-    # Helper to build a public URL if you keep bucket public; else serve signed URLs in a view/serializer.
+    # URL helpers: plain public URLs for a public bucket, otherwise presigned
+    # (and cached per validity window) when AWS_QUERYSTRING_AUTH is True.
     def public_url(self) -> str:
-        base = getattr(settings, 'WASABI_PUBLIC_BASE', '').rstrip('/')  # e.g., https://s3.us-east-1.wasabisys.com/<bucket>
-        return f'{base}/{self.image_key}' if base else self.image_key
+        return object_url(self.image_key)
 
     def thumb_public_url(self) -> str:
-        base = getattr(settings, 'WASABI_PUBLIC_BASE', '').rstrip('/')
-        return f'{base}/{self.thumbnail_key}' if (base and self.thumbnail_key) else (self.thumbnail_key or '')
+        return object_url(self.thumbnail_key)
 
     def __str__(self):
         return f'Photo {self.pk} for {self.event_id}'
 
 
+class PhotoDerivative(TimeStampedUUIDModel):
+    """
+    Server-rendered JPEG of a photo, at most `size` px on the long edge
+    (see customers.derivatives).
+    """
+    photo = models.ForeignKey(Photo, on_delete=models.CASCADE, related_name='derivatives')
+    size = models.PositiveSmallIntegerField()
+    key = models.CharField(max_length=512)
+    size_bytes = models.PositiveBigIntegerField(default=0)
+    width = models.PositiveIntegerField(default=0)
+    height = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['photo', 'size'], name='photoderivative_photo_size_uniq'),
+        ]
+
+    def __str__(self):
+        return f'PhotoDerivative {self.size}px of {self.photo_id}'
+
+
 def generate_token() -> str:
     # 32-char lowercase hex string
     return uuid.uuid4().hex
@@ -124,7 +170,61 @@ class ShareLink(TimeStampedUUIDModel):
             return False
         return True
 
+    @staticmethod
+    def cache_key(token) -> str:
+        # Cached token lookups, see customers.services.get_active_share_link()
+        return f'share-link:{token}'
+
     def refresh(self, hours=24):
+        old_token = self.token
         self.token = uuid.uuid4().hex
         self.expiry = timezone.now() + timedelta(hours=hours)
         self.save(update_fields=['token', 'expiry'])
+        cache.delete(self.cache_key(old_token))
+
+
+class UploadSession(TimeStampedUUIDModel):
+    """
+    A batch of direct-to-storage uploads for one event.
+    Quota slots for all files are reserved up front (Subscription.photos_used_cached)
+    and consumed as photos get registered; whatever is left when the session
+    expires is handed back by customers.services.expire_upload_sessions().
+    Objects are uploaded under `key_prefix` with presigned PUT URLs whose
+    Content-Length is signed, so registration doesn't need to HEAD them;
+    `sizes` keeps the signed length of every key, and registrations must
+    report exactly that size.
+    """
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='upload_sessions')
+    reserved = models.PositiveIntegerField(default=0)
+    used = models.PositiveIntegerField(default=0)
+    expires_at = models.DateTimeField()
+    released_at = models.DateTimeField(blank=True, null=True)
+    sizes = models.JSONField(default=dict, blank=True)  # key -> Content-Length signed for it
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['expires_at'], name='uploadsession_open_idx', condition=models.Q(released_at__isnull=True)),
+        ]
+
+    @property
+    def key_prefix(self) -> str:
+        return f'{self.event_id}/{self.pk.hex}/'
+
+    def is_open(self) -> bool:
+        return self.released_at is None and timezone.now() < self.expires_at
+
+    @classmethod
+    def consume(cls, pk, n: int) -> bool:
+        """
+        Take n of the session's reserved slots in one conditional UPDATE.
+        Fails if the session expired, was released or has fewer than n left.
+        """
+        return bool(
+            cls.objects
+            .filter(pk=pk, released_at__isnull=True, expires_at__gt=timezone.now(), used__lte=F('reserved') - n)
+            .update(used=F('used') + n)
+        )
+
+    def __str__(self):
+        return f'UploadSession {self.pk} ({self.used}/{self.reserved})'
@@ -0,0 +1,136 @@
+"""
+Synthetic data for benchmarks (manage.py seed_data, manage.py bench_api).
+
+seed() builds users -> customers -> events -> photos (plus subscriptions,
+storage rollups and share links) with bulk INSERTs only, and writes every
+denormalized counter (Event.photos_count / selected_count / storage_bytes,
+Subscription.photos_used_cached, StorageUsage) already consistent, so
+`reconcile_counters` finds nothing to fix. The same seed gives the same
+names, sizes, selections and hashes. Photos come in bursts of near-identical
+perceptual hashes, like camera bursts.
+
+With objects=True every original and thumbnail is also written to storage as
+a small random body (sizes in the DB then match the objects), so downloads
+work against the local stand-in.
+"""
+import hashlib
+import random
+import re
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+
+from .models import Customer, Event, Photo, ShareLink
+from common.storage import get_storage
+from subscriptions.models import StorageUsage, Subscription
+
+
+User = get_user_model()
+
+BATCH_SIZE = 2000
+
+
+def seed_email(prefix: str, n: int) -> str:
+    return f'{prefix}-{n:05d}@example.invalid'
+
+
+def seed(*, users: int, customers: int, events: int, photos: int, prefix: str = 'seed',
+         selected: float = 0.1, objects: bool = False, object_bytes: int = 4096,
+         password: str = None, seed: int = 0) -> dict:
+    """
+    Create `users` users, each with `customers` customers of `events` events
+    of `photos` photos. Returns counts of the rows created, by model.
+    Emails are seed_email(prefix, n); raises ValueError if any exists.
+    """
+    rng = random.Random(seed)
+    emails = [seed_email(prefix, n) for n in range(users)]
+    if User.objects.filter(email__in=emails).exists():
+        raise ValueError(f'Users with the prefix {prefix!r} already exist.')
+    password_hash = make_password(password)  # hashed once, not once per user
+    storage = get_storage() if objects else None
+
+    with transaction.atomic():
+        owners = User.objects.bulk_create([
+            User(email=email, name=f'Seed user {n}', studio_name=f'Studio {n}', password=password_hash)
+            for n, email in enumerate(emails)
+        ], batch_size=BATCH_SIZE)
+        clients = Customer.objects.bulk_create([
+            Customer(owner=owner, name=f'Customer {c}', phone=f'+91{rng.randrange(10 ** 9, 10 ** 10)}')
+            for owner in owners for c in range(customers)
+        ], batch_size=BATCH_SIZE)
+        all_events = Event.objects.bulk_create([
+            Event(customer=customer, name=f'Event {e}', slug=f'event-{e}-{uuid.uuid4().hex[:8]}')
+            for customer in clients for e in range(events)
+        ], batch_size=BATCH_SIZE)
+        ShareLink.objects.bulk_create([ShareLink(event=event) for event in all_events], batch_size=BATCH_SIZE)
+
+        used = dict.fromkeys((owner.pk for owner in owners), 0)
+        stored = {owner.pk: [0, 0] for owner in owners}  # photo bytes, thumbnail bytes
+        total = 0
+        for event in all_events:
+            rows = _photos(rng, event, photos, selected, object_bytes if objects else None)
+            if objects:
+                for photo in rows:
+                    storage.put(photo.image_key, rng.randbytes(photo.size_bytes), content_type='image/jpeg')
+                    storage.put(photo.thumbnail_key, rng.randbytes(photo.thumb_size_bytes), content_type='image/jpeg')
+            Photo.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+
+            event.photos_count = len(rows)
+            event.selected_count = sum(p.is_selected for p in rows)
+            event.storage_bytes = sum(p.size_bytes + p.thumb_size_bytes for p in rows)
+            owner_id = event.customer.owner_id
+            used[owner_id] += len(rows)
+            stored[owner_id][0] += sum(p.size_bytes for p in rows)
+            stored[owner_id][1] += sum(p.thumb_size_bytes for p in rows)
+            total += len(rows)
+        Event.objects.bulk_update(all_events, ['photos_count', 'selected_count', 'storage_bytes'], batch_size=BATCH_SIZE)
+
+        # bulk_create skips the post_save signal that creates these for new users
+        Subscription.objects.bulk_create(
+            [Subscription(user_id=pk, photos_used_cached=n) for pk, n in used.items()], batch_size=BATCH_SIZE,
+        )
+        StorageUsage.objects.bulk_create([
+            StorageUsage(user_id=pk, photo_bytes=photo_bytes, thumbnail_bytes=thumbnail_bytes)
+            for pk, (photo_bytes, thumbnail_bytes) in stored.items()
+        ], batch_size=BATCH_SIZE)
+
+    return {
+        'users': len(owners), 'customers': len(clients), 'events': len(all_events),
+        'share_links': len(all_events), 'photos': total,
+    }
+
+
+def _photos(rng, event, n, selected, object_bytes) -> list:
+    rows, bits = [], 0
+    for i in range(n):
+        if i == 0 or rng.random() < 0.2:  # a new burst
+            bits = rng.getrandbits(64)
+        else:
+            bits ^= 1 << rng.randrange(64)
+        key = f'{event.pk}/seed/{i:05d}'
+        size = object_bytes or rng.randrange(2_000_000, 12_000_000)
+        rows.append(Photo(
+            event=event,
+            image_key=f'{key}.jpg',
+            thumbnail_key=f'{key}_t.jpg',
+            original_name=f'IMG_{i:05d}.JPG',
+            size_bytes=size,
+            thumb_size_bytes=max(object_bytes // 8, 1) if object_bytes else rng.randrange(30_000, 90_000),
+            etag=hashlib.md5(key.encode()).hexdigest(),
+            phash=bits - (1 << 64) if bits >= 1 << 63 else bits,  # signed, like common.imaging.dhash
+            is_selected=rng.random() < selected,
+        ))
+    return rows
+
+
+def unseed(prefix: str = 'seed') -> int:
+    """
+    Delete the users seed() created with this prefix (everything else
+    cascades). Storage objects are left for gc_storage. Returns users deleted.
+    """
+    users = User.objects.filter(email__regex=rf'^{re.escape(prefix)}-[0-9]{{5}}@example\.invalid$')
+    count = users.count()
+    users.delete()
+    return count
@@ -1,12 +1,18 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 
-from .models import Customer, Event, Photo, ShareLink
+from .models import Customer, Event, Photo, ShareLink, object_url
 from customers.models import Event
+from .services import create_photo_atomic
+from subscriptions.quota import QuotaExceeded
 
 
 User = get_user_model()
 
+MAX_BYTES = 20 * 1024 * 1024
+MAX_SESSION_FILES = 5000
+MAX_SELECTION_ITEMS = 5000  # photo ids per list in one selection request
+
 
 class CustomerSerializer(serializers.ModelSerializer):
     owner = serializers.PrimaryKeyRelatedField(read_only=True)
@@ -32,17 +38,18 @@ class EventSerializer(serializers.ModelSerializer):
     slug = serializers.CharField(read_only=True)
     photos_count = serializers.IntegerField(read_only=True)
     selected_count = serializers.IntegerField(read_only=True)
+    storage_bytes = serializers.IntegerField(read_only=True)
     upload_limit = serializers.SerializerMethodField()
 
     class Meta:
         model = Event
         fields = (
             'id', 'customer', 'name', 'slug', 'date',
-            'photos_count', 'selected_count', 'upload_limit',
+            'photos_count', 'selected_count', 'storage_bytes', 'upload_limit',
             'created_at', 'updated_at'
         )
         read_only_fields = (
-            'id', 'slug', 'photos_count', 'selected_count',
+            'id', 'slug', 'photos_count', 'selected_count', 'storage_bytes',
             'upload_limit', 'created_at', 'updated_at'
         )
 
@@ -59,14 +66,47 @@ class EventSerializer(serializers.ModelSerializer):
         return customer
 
 
-class PhotoRegisterSerializer(serializers.Serializer):
+class PhotoSerializer(serializers.ModelSerializer):
+    image_url = serializers.SerializerMethodField()
+    thumb_url = serializers.SerializerMethodField()
+    sizes = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Photo
+        fields = (
+            'id', 'event', 'image_key', 'thumbnail_key', 'image_url', 'thumb_url', 'sizes',
+            'original_name', 'size_bytes', 'thumb_size_bytes', 'is_selected',
+            'created_at', 'updated_at'
+        )
+        read_only_fields = fields
+
+    def get_image_url(self, obj) -> str:
+        return obj.public_url()
+
+    def get_thumb_url(self, obj) -> str:
+        return obj.thumb_public_url()
+
+    def get_sizes(self, obj) -> dict:
+        # {"320": url, "1024": url, ...}; prefetch 'derivatives' in list views
+        return {str(d.size): object_url(d.key) for d in obj.derivatives.all()}
+
+
+class PhotoItemSerializer(serializers.Serializer):
+    """
+    Shape of one photo to register. Ownership is checked by the caller so a
+    batch can resolve all of its events in one query.
+    """
     event_id = serializers.UUIDField()
     image_key = serializers.CharField(max_length=512)
     thumbnail_key = serializers.CharField(max_length=512, required=False, allow_blank=True, allow_null=True)
     original_name = serializers.CharField(max_length=255, required=False, allow_blank=True)
     size_bytes = serializers.IntegerField(required=False)
     thumb_size_bytes = serializers.IntegerField(required=False)
+    # Set for objects uploaded through POST /api/events/{id}/upload-session/
+    upload_session = serializers.UUIDField(required=False)
+
 
+class PhotoRegisterSerializer(PhotoItemSerializer):
     def validate(self, attrs):
         request = self.context['request']
         user = request.user
@@ -82,15 +122,40 @@ class PhotoRegisterSerializer(serializers.Serializer):
         return attrs
 
     def create(self, validated):
-        photo = Photo.objects.create(
-            event=validated['event'],
-            image_key=validated['image_key'],
-            thumbnail_key=validated.get('thumbnail_key') or None,
-            original_name=validated.get('original_name') or '',
-            size_bytes=validated.get('size_bytes') or 0,
-            thumb_size_bytes=validated.get('thumb_size_bytes') or 0,
-        )
-        return photo
+        try:
+            return create_photo_atomic(
+                event=validated['event'],
+                image_key=validated['image_key'],
+                thumbnail_key=validated.get('thumbnail_key'),
+                original_name=validated.get('original_name'),
+                size_bytes=validated.get('size_bytes'),
+                thumb_size_bytes=validated.get('thumb_size_bytes'),
+                etag=validated.get('etag'),
+                upload_session=validated.get('upload_session'),
+            )
+        except QuotaExceeded as e:
+            raise serializers.ValidationError(e.message_dict)
+
+
+class UploadFileSerializer(serializers.Serializer):
+    name = serializers.CharField(max_length=255)
+    size_bytes = serializers.IntegerField(min_value=1, max_value=MAX_BYTES)
+
+
+class UploadSessionCreateSerializer(serializers.Serializer):
+    files = UploadFileSerializer(many=True, allow_empty=False, max_length=MAX_SESSION_FILES)
+
+
+class SelectionSerializer(serializers.Serializer):
+    select = serializers.ListField(child=serializers.UUIDField(), required=False, max_length=MAX_SELECTION_ITEMS)
+    deselect = serializers.ListField(child=serializers.UUIDField(), required=False, max_length=MAX_SELECTION_ITEMS)
+
+    def validate(self, attrs):
+        if not attrs.get('select') and not attrs.get('deselect'):
+            raise serializers.ValidationError('Provide photo ids to select and/or deselect.')
+        if set(attrs.get('select', ())) & set(attrs.get('deselect', ())):
+            raise serializers.ValidationError('A photo cannot be selected and deselected at once.')
+        return attrs
 
 
 class ShareLinkSerializer(serializers.ModelSerializer):
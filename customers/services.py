@@ -1,59 +1,511 @@
-from django.db import transaction
-from django.db.models import F
-from django.core.exceptions import ValidationError
+import os
+import re
+from collections import Counter, defaultdict
+from datetime import timedelta
 
-from .models import Photo, Event
-from subscriptions.models import Subscription
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Value, Case, When, Count, Exists, OuterRef, Q, Sum, BigIntegerField
+from django.db.models.functions import Greatest
+from django.utils import timezone
 
-def create_photo_atomic(*, event: Event, image, original_name=None) -> Photo:
+from .models import Photo, PhotoDerivative, Event, ShareLink, UploadSession
+from common.metrics import cache_lookup, count_registered
+from common.storage import get_storage
+from jobs.queue import enqueue
+from subscriptions import quota
+from subscriptions.models import StorageUsage, Subscription
+
+
+def bump_event_photos(counts: dict, sign: int = 1, sizes: dict = None) -> None:
     """
-    Safe photo create that
-    (1) locks the user's subscription,
-    (2) enforces the limit, and
-    (3) bumps the counter atomically.
+    Apply {event_id: n} to Event.photos_count and {event_id: bytes} to
+    Event.storage_bytes with F() (one UPDATE per event).
     """
-    owner_id = event.customer.owner_id
+    now = timezone.now()
+    sizes = sizes or {}
+    for event_id in counts.keys() | sizes.keys():
+        n, size = counts.get(event_id, 0), sizes.get(event_id, 0)
+        if n or size:
+            Event.objects.filter(pk=event_id).update(
+                photos_count=Greatest(F('photos_count') + sign * n, Value(0)),
+                storage_bytes=Greatest(F('storage_bytes') + sign * size, Value(0)),
+                updated_at=now,
+            )
 
-    with transaction.atomic():
-        sub = Subscription.lock_for_user(owner_id)
 
-        # Re-check with locked, current values
-        if not sub.can_upload(1):
-            raise ValidationError({'image': 'Upload limit reached for your plan.'})
+def _count_new_photos(photos) -> None:
+    counts, sizes = Counter(), Counter()
+    for p in photos:
+        counts[p.event_id] += 1
+        sizes[p.event_id] += p.size_bytes + p.thumb_size_bytes
+    bump_event_photos(counts, sizes=sizes)
 
-        # Create the photo
-        photo = Photo.objects.create(
-            event=event,
-            image=image,
-            original_name=original_name,
-        )
 
-        # Atomic bump
-        Subscription.atomic_bump(sub.pk, +1)
+def create_photos_bulk(*, owner_id, items, partial: bool = True, upload_session=None) -> list:
+    """
+    Quota-aware photo insert for one owner, used by single and batch registration:
+    (1) reserves slots with one conditional UPDATE on the subscription
+        (see subscriptions.quota; no SELECT ... FOR UPDATE) or, for uploads
+        made through an UploadSession, on the session's pre-reserved slots,
+    (2) adds their bytes to the owner's StorageUsage, again with one
+        conditional UPDATE against the plan's byte limit, in the insert
+        transaction so a failed insert can't leave them charged (the row is
+        locked before the Event rows, as in every other writer),
+    (3) inserts the photos with one bulk INSERT, and
+    (4) bumps Event.photos_count / storage_bytes once per distinct event.
+    `items` are dicts of Photo field values. With partial=True, items past the
+    remaining quota (slots or bytes) are dropped; otherwise
+    quota.QuotaExceeded is raised.
+    Returns the created photos in input order. If the insert fails the slots
+    and bytes are given back.
+    """
+    if not items:
+        return []
+    sizes = [(item.get('size_bytes') or 0, item.get('thumb_size_bytes') or 0) for item in items]
+
+    if upload_session is not None:
+        photos = [Photo(**item) for item in items]
+        with transaction.atomic():
+            quota.charge_storage(owner_id, sizes)
+            if not UploadSession.consume(upload_session.pk, len(photos)):
+                raise quota.QuotaExceeded({'upload_session': 'Upload session expired or has no slots left.'})
+            Photo.objects.bulk_create(photos)
+            _count_new_photos(photos)
+            # Registration trusted the presigned PUT; confirm the objects arrived
+            enqueue('photos.verify_uploads', {'ids': [str(p.pk) for p in photos]})
+            enqueue_derivatives(photos)
+        return photos
+
+    with quota.reservation(owner_id, len(items), partial=partial) as granted:
+        with transaction.atomic():
+            charged = quota.charge_storage(owner_id, sizes[:granted], partial=partial)
+            photos = [Photo(**item) for item in items[:charged]]
+            if photos:
+                Photo.objects.bulk_create(photos)
+                _count_new_photos(photos)
+                enqueue_derivatives(photos)
+        # Slots of photos that didn't fit the byte limit go back
+        quota.release(owner_id, granted - len(photos))
+
+    return photos
+
+
+def find_duplicates(items) -> dict:
+    """
+    {(event_id, etag): Photo} for the items whose content (storage ETag,
+    item['etag']) their event already has. One query on the
+    (event, etag) unique index, however many items.
+    """
+    wanted = {(_item_event_id(item), item['etag']) for item in items if item.get('etag')}
+    if not wanted:
+        return {}
+    photos = Photo.objects.filter(
+        event_id__in={event_id for event_id, _ in wanted}, etag__in={etag for _, etag in wanted},
+    )
+    return {(p.event_id, p.etag): p for p in photos if (p.event_id, p.etag) in wanted}
+
+
+def register_photos(*, owner_id, items, partial: bool = True, upload_session=None) -> list:
+    """
+    create_photos_bulk() without duplicate uploads: items whose content
+    (item['etag']) the event already has, or that repeat an earlier item, are
+    not inserted, take no quota, and their objects are queued for deletion.
+    Returns one (photo, duplicate) pair per item, in input order; photo is the
+    new or existing Photo, or None for items past the quota (partial=True).
+    If a concurrent registration inserts the same content first (the unique
+    index rejects ours), the lookup is redone once.
+    """
+    for attempt in range(2):
+        existing = find_duplicates(items)
+        first = {}   # (event_id, etag) -> index of the item that gets inserted
+        fresh = []   # (index, item)
+        for i, item in enumerate(items):
+            key = (_item_event_id(item), item.get('etag'))
+            if not key[1]:
+                fresh.append((i, item))
+            elif key not in existing and key not in first:
+                first[key] = i
+                fresh.append((i, item))
+        try:
+            photos = create_photos_bulk(
+                owner_id=owner_id, items=[item for _, item in fresh], partial=partial, upload_session=upload_session,
+            )
+            break
+        except IntegrityError:
+            if attempt:
+                raise
+
+    results = [(None, False)] * len(items)
+    for (i, _), photo in zip(fresh, photos):
+        results[i] = (photo, False)
+    unused = []
+    for i, item in enumerate(items):
+        key = (_item_event_id(item), item.get('etag'))
+        if key in existing:
+            original = existing[key]
+        elif key[1] and first[key] != i:
+            original = results[first[key]][0]
+        else:
+            continue
+        if original is None:
+            continue  # repeats an item that didn't fit the quota either
+        results[i] = (original, True)
+        kept = {original.image_key, original.thumbnail_key}
+        unused += [k for k in (item['image_key'], item.get('thumbnail_key')) if k not in kept]
+    delete_objects_later(unused)
+
+    transaction.on_commit(lambda: _count_registered(results))
+    return results
+
+
+def _count_registered(results) -> None:
+    duplicates = sum(duplicate for _, duplicate in results)
+    skipped = sum(photo is None for photo, _ in results)
+    count_registered('new', len(results) - duplicates - skipped)
+    count_registered('duplicate', duplicates)
+    count_registered('over_quota', skipped)
+
 
-        # Optional: refresh a lightweight field if you show it in UI frequently
-        # (not required if you rely only on photos_used_cached on Subscription)
-        # event.photos_count = F('photos_count') + 1
-        # event.save(update_fields=['photos_count'])
+def _item_event_id(item):
+    return item['event'].pk if 'event' in item else item['event_id']
 
-        # (optional) keep your per-event counters in sync quickly for UI
-        # Event.objects.filter(pk=event.pk).update(photos_count=F('photos_count') + 1)
 
+DERIVATIVE_JOB_SIZE = 100
+
+
+def enqueue_derivatives(photos) -> None:
+    """
+    Queue server-side derivatives (customers.derivatives) for new photos.
+    """
+    ids = [str(p.pk) for p in photos]
+    for i in range(0, len(ids), DERIVATIVE_JOB_SIZE):
+        enqueue('photos.derivatives', {'ids': ids[i:i + DERIVATIVE_JOB_SIZE]})
+
+
+def create_photo_atomic(*, event: Event, image_key, thumbnail_key=None, original_name=None,
+                        size_bytes=0, thumb_size_bytes=0, etag=None, upload_session=None) -> Photo:
+    """
+    Safe single photo create: enforces the owner's plan limit (or takes a slot
+    from upload_session) and keeps the subscription and event counters in sync.
+    If the event already has a photo with this etag, that photo is returned
+    instead, with photo.duplicate = True. Raises quota.QuotaExceeded.
+    """
+    (photo, duplicate), = register_photos(owner_id=event.customer.owner_id, partial=False, upload_session=upload_session, items=[{
+        'event': event,
+        'image_key': image_key,
+        'thumbnail_key': thumbnail_key or None,
+        'original_name': original_name or '',
+        'size_bytes': size_bytes or 0,
+        'thumb_size_bytes': thumb_size_bytes or 0,
+        'etag': etag or None,
+    }])
+    photo.duplicate = duplicate
     return photo
 
 
 def delete_photo_atomic(*, photo: Photo) -> None:
     """
-    Safe delete that decrements the counter. Avoid queryset.bulk_delete.
+    Safe delete that decrements the counters. Avoid queryset.bulk_delete.
+    The storage objects are deleted by a background job once this commits.
     """
     owner_id = photo.event.customer.owner_id
     event_id = photo.event_id
 
     with transaction.atomic():
-        sub = Subscription.lock_for_user(owner_id)
-
+        derivatives = dict(PhotoDerivative.objects.filter(photo_id=photo.pk).values_list('key', 'size_bytes'))
+        keys = [photo.image_key, photo.thumbnail_key, *derivatives]
         # Delete first (so we only decrement if the row exists)
         deleted, _ = Photo.objects.filter(pk=photo.pk).delete()
         if deleted:
-            Subscription.atomic_bump(sub.pk, -1)
-            # Event.objects.filter(pk=event_id).update(photos_count=F('photos_count') - 1)
+            # A thumbnail that is one of the derivatives was counted as a derivative
+            thumb_size = 0 if photo.thumbnail_key in derivatives else photo.thumb_size_bytes
+            derivative_size = sum(derivatives.values())
+            quota.release(owner_id, 1)
+            StorageUsage.adjust(owner_id, photo=-photo.size_bytes, thumbnail=-thumb_size, derivative=-derivative_size)
+            bump_event_photos({event_id: 1}, sign=-1, sizes={event_id: photo.size_bytes + thumb_size + derivative_size})
+            delete_objects_later(keys)
+
+
+def record_photo_etag(photo: Photo, etag: str) -> bool:
+    """
+    Store the ETag of a photo registered without a HEAD (upload sessions).
+    If the event already has that content the photo is a duplicate: it is
+    deleted (giving its quota back) and False is returned.
+    """
+    try:
+        with transaction.atomic():
+            Photo.objects.filter(pk=photo.pk).update(etag=etag)
+    except IntegrityError:
+        delete_photo_atomic(photo=photo)
+        return False
+    return True
+
+
+def correct_photo_size(photo: Photo, size: int) -> None:
+    """
+    Set a photo's size_bytes from storage (e.g. after an upload-session
+    registration), moving the owner's and the event's stored bytes with it.
+    """
+    with transaction.atomic():
+        if Photo.objects.filter(pk=photo.pk, size_bytes=photo.size_bytes).update(size_bytes=size):
+            delta = size - photo.size_bytes
+            StorageUsage.adjust(photo.event.customer.owner_id, photo=delta)
+            bump_event_photos({}, sizes={photo.event_id: delta})
+
+
+def delete_objects_later(keys) -> None:
+    """
+    Queue deletion of storage objects (skipped for keys a photo still uses).
+    """
+    keys = [key for key in keys if key]
+    if keys:
+        enqueue('storage.delete_objects', {'keys': keys})
+
+
+def upload_session_ttl() -> timedelta:
+    return timedelta(seconds=getattr(settings, 'UPLOAD_SESSION_TTL_SECONDS', 3600))
+
+
+def open_upload_session(*, event: Event, files) -> tuple:
+    """
+    Reserve quota for len(files) uploads and presign one PUT URL per file.
+    `files` are dicts with 'name' and 'size_bytes'. Signing is local CPU work
+    (common.storage.SigV4Presigner), no storage round-trips. A job due when
+    the session expires gives its unused slots back.
+    Returns (session, uploads); raises quota.QuotaExceeded.
+    """
+    owner_id = event.customer.owner_id
+    ttl = upload_session_ttl()
+
+    # Bytes are charged at registration; refuse sessions that can't fit already
+    if sum(f['size_bytes'] for f in files) > quota.storage_remaining(owner_id):
+        raise quota.QuotaExceeded({'files': 'Storage limit reached for your plan.'})
+
+    # Hand back this owner's stale reservations before taking new ones
+    expire_upload_sessions(owner_id=owner_id)
+
+    session = UploadSession(owner_id=owner_id, event=event, reserved=len(files), expires_at=timezone.now() + ttl)
+    keys = [
+        f"{session.key_prefix}{i:05d}{os.path.splitext(f['name'])[1].lower()[:10]}" for i, f in enumerate(files)
+    ]
+    session.sizes = {key: f['size_bytes'] for key, f in zip(keys, files)}
+    with quota.reservation(owner_id, len(files)), transaction.atomic():
+        session.save()
+        enqueue(
+            'uploads.expire_sessions', {'owner_id': str(owner_id)},
+            dedup_key=f'upload-session-expiry:{session.pk}', delay=ttl.total_seconds() + 1,
+        )
+
+    storage = get_storage()
+    expires = int(ttl.total_seconds())
+    now = timezone.now()
+    uploads = []
+    for key, f in zip(keys, files):
+        uploads.append({
+            'name': f['name'],
+            'key': key,
+            'size_bytes': f['size_bytes'],
+            'url': storage.presign_put(key, f['size_bytes'], expires, now=now),
+            'headers': {'Content-Length': str(f['size_bytes'])},
+        })
+    return session, uploads
+
+
+def expire_upload_sessions(*, owner_id=None, batch_size: int = 500) -> int:
+    """
+    Release the unused slots of expired upload sessions back to their owners'
+    quota. Safe to run concurrently (SKIP LOCKED). Returns sessions closed.
+    """
+    closed = 0
+    while True:
+        with transaction.atomic():
+            qs = UploadSession.objects.filter(released_at__isnull=True, expires_at__lte=timezone.now())
+            if owner_id is not None:
+                qs = qs.filter(owner_id=owner_id)
+            stale = list(
+                qs.select_for_update(skip_locked=True)
+                .values_list('pk', 'owner_id', 'reserved', 'used')[:batch_size]
+            )
+            if not stale:
+                return closed
+
+            unused = defaultdict(int)
+            for _, owner, reserved, used in stale:
+                unused[owner] += max(reserved - used, 0)
+            for owner, n in unused.items():
+                quota.release(owner, n)
+            UploadSession.objects.filter(pk__in=[row[0] for row in stale]).update(released_at=timezone.now())
+            closed += len(stale)
+        if len(stale) < batch_size:
+            return closed
+
+
+SHARE_TOKEN_RE = re.compile(r'[0-9a-f]{32}')  # see models.generate_token
+
+
+def get_active_share_link(token: str):
+    """
+    Resolve a public share token to an (unsaved) ShareLink snapshot, or None
+    if it doesn't exist or has expired. Lookups (including misses) are cached
+    for SHARE_LINK_CACHE_SECONDS; expiry is checked in memory on every call.
+    Strings that can't be a token are turned away before the cache, so they
+    can't fill it. Invalidated by customers.signals on save/delete (and by
+    ShareLink.refresh); revocation reaches other worker processes only
+    through a shared cache (REDIS_URL).
+    """
+    if not SHARE_TOKEN_RE.fullmatch(token):
+        return None
+    key = ShareLink.cache_key(token)
+    data = cache.get(key)
+    cache_lookup('share_link', data is not None)
+    if data is None:
+        data = ShareLink.objects.filter(token=token).values(
+            'id', 'event_id', 'token', 'can_select', 'expiry'
+        ).first() or {}
+        cache.set(key, data, getattr(settings, 'SHARE_LINK_CACHE_SECONDS', 60))
+    if not data:
+        return None
+    link = ShareLink(**data)
+    return link if link.is_active() else None
+
+
+def apply_selection(*, event_id, select=(), deselect=()) -> tuple:
+    """
+    Client photo selection in bulk: one UPDATE per list (on the
+    (event, is_selected) index; already-(de)selected photos are skipped) and
+    one F() adjustment of Event.selected_count, all in one transaction.
+    Returns (selected, deselected) - how many photos actually changed.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        selected = deselected = 0
+        if select:
+            selected = Photo.objects.filter(event_id=event_id, is_selected=False, pk__in=select).update(
+                is_selected=True, updated_at=now,
+            )
+        if deselect:
+            deselected = Photo.objects.filter(event_id=event_id, is_selected=True, pk__in=deselect).update(
+                is_selected=False, updated_at=now,
+            )
+        if selected or deselected:
+            Event.objects.filter(pk=event_id).update(
+                selected_count=Greatest(F('selected_count') + selected - deselected, Value(0)),
+                updated_at=now,
+            )
+    return selected, deselected
+
+
+def _apply_deltas(model, field, deltas: dict) -> None:
+    """
+    One UPDATE adding deltas[pk] to `field` for every pk in deltas. Deltas (not
+    absolute values) keep increments made since the snapshot was read.
+    """
+    if not deltas:
+        return
+    delta = Case(*[When(pk=pk, then=Value(d)) for pk, d in deltas.items()], output_field=BigIntegerField())
+    # updated_at feeds HTTP validators (ETag / Last-Modified), so move it too
+    model.objects.filter(pk__in=list(deltas)).update(**{
+        field: Greatest(F(field) + delta, Value(0)),
+        'updated_at': timezone.now(),
+    })
+
+
+def reconcile_owner_counters(owner_ids, *, dry_run: bool = False) -> dict:
+    """
+    Recompute Event.photos_count / selected_count / storage_bytes,
+    Subscription.photos_used_cached and the StorageUsage byte rollups for a
+    chunk of owners with GROUP BY aggregates, then write only rows that
+    drifted (e.g. after cascading Event/Customer deletes).
+    Reads run in one REPEATABLE READ snapshot (PostgreSQL) so counters and
+    aggregates agree; fixes are applied afterwards as F() deltas, so nothing is
+    locked while aggregating and concurrent uploads are not lost.
+    Returns {counter: {pk: drift}} (drift = stored - actual).
+    """
+    if not dry_run:
+        # Users created before the rollup existed get an (empty) row to fix up
+        StorageUsage.objects.bulk_create([StorageUsage(user_id=pk) for pk in owner_ids], ignore_conflicts=True)
+
+    snapshot = connection.vendor == 'postgresql' and not connection.in_atomic_block
+    with transaction.atomic():
+        if snapshot:  # (inside an outer transaction, that one's snapshot applies)
+            with connection.cursor() as cursor:
+                cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY')
+
+        events = Event.objects.filter(customer__owner_id__in=owner_ids).values_list(
+            'pk', 'customer__owner_id', 'photos_count', 'selected_count', 'storage_bytes',
+        )
+        # Thumbnails that are derivatives are counted once, as derivatives
+        thumb_is_derivative = Exists(PhotoDerivative.objects.filter(photo_id=OuterRef('pk'), key=OuterRef('thumbnail_key')))
+        actual = {
+            row['event_id']: row for row in
+            Photo.objects.filter(event__customer__owner_id__in=owner_ids)
+            .order_by().values('event_id')
+            .annotate(
+                total=Count('pk'),
+                selected=Count('pk', filter=Q(is_selected=True)),
+                photo_bytes=Sum('size_bytes'),
+                thumbnail_bytes=Sum('thumb_size_bytes', filter=~thumb_is_derivative),
+            )
+        }
+        derivative_bytes = dict(
+            PhotoDerivative.objects.filter(photo__event__customer__owner_id__in=owner_ids)
+            .order_by().values('photo__event_id')
+            .annotate(total=Sum('size_bytes'))
+            .values_list('photo__event_id', 'total')
+        )
+        # Slots still held by open upload sessions count as used
+        held = dict(
+            UploadSession.objects.filter(owner_id__in=owner_ids, released_at__isnull=True)
+            .order_by().values('owner_id')
+            .annotate(held=Sum(F('reserved') - F('used')))
+            .values_list('owner_id', 'held')
+        )
+        subs = Subscription.objects.filter(user_id__in=owner_ids).values_list('pk', 'user_id', 'photos_used_cached')
+        usages = StorageUsage.objects.filter(user_id__in=owner_ids).values_list(
+            'pk', 'user_id', 'photo_bytes', 'thumbnail_bytes', 'derivative_bytes',
+        )
+
+        drift = {
+            'photos_count': {}, 'selected_count': {}, 'storage_bytes': {}, 'photos_used_cached': {},
+            'photo_bytes': {}, 'thumbnail_bytes': {}, 'derivative_bytes': {},
+        }
+        owned = defaultdict(Counter)  # owner -> photos and bytes by kind
+        for pk, owner_id, photos_count, selected_count, storage_bytes in events:
+            row = actual.get(pk, {})
+            expected = {
+                'photos_count': row.get('total', 0),
+                'selected_count': row.get('selected', 0),
+                'photo_bytes': row.get('photo_bytes') or 0,
+                'thumbnail_bytes': row.get('thumbnail_bytes') or 0,
+                'derivative_bytes': derivative_bytes.get(pk) or 0,
+            }
+            owned[owner_id].update(expected)
+            stored_bytes = expected['photo_bytes'] + expected['thumbnail_bytes'] + expected['derivative_bytes']
+            for counter, stored, actual_value in (
+                ('photos_count', photos_count, expected['photos_count']),
+                ('selected_count', selected_count, expected['selected_count']),
+                ('storage_bytes', storage_bytes, stored_bytes),
+            ):
+                if stored != actual_value:
+                    drift[counter][pk] = stored - actual_value
+        for pk, user_id, used in subs:
+            expected = owned[user_id]['photos_count'] + max(held.get(user_id) or 0, 0)
+            if used != expected:
+                drift['photos_used_cached'][pk] = used - expected
+        for pk, user_id, *stored in usages:
+            for counter, value in zip(('photo_bytes', 'thumbnail_bytes', 'derivative_bytes'), stored):
+                if value != owned[user_id][counter]:
+                    drift[counter][pk] = value - owned[user_id][counter]
+
+    if not dry_run:
+        with transaction.atomic():
+            for model, counters in (
+                (Event, ('photos_count', 'selected_count', 'storage_bytes')),
+                (Subscription, ('photos_used_cached',)),
+                (StorageUsage, ('photo_bytes', 'thumbnail_bytes', 'derivative_bytes')),
+            ):
+                for counter in counters:
+                    _apply_deltas(model, counter, {pk: -d for pk, d in drift[counter].items()})
+    return drift
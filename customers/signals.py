@@ -0,0 +1,11 @@
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import ShareLink
+
+
+@receiver(post_save, sender=ShareLink)
+@receiver(post_delete, sender=ShareLink)
+def invalidate_share_link(sender, instance, **kwargs):
+    cache.delete(ShareLink.cache_key(instance.token))
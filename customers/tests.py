@@ -1,3 +1,878 @@
-from django.test import TestCase
+import io
+import os
+import time
+import uuid
+import zipfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase, APITransactionTestCase
+
+from accounts.models import User
+from common.bursts import burst_labels
+from common.imaging import sample_jpeg
+from common.storage import DELETE_BATCH_SIZE, NotFound, get_storage
+from common.testing import LocalStorageTestMixin
+from jobs import queue
+from jobs.models import Job, JobStatus
+from subscriptions.models import PLAN_STORAGE_LIMITS, PLAN_UPLOAD_LIMITS, Plan, StorageUsage, Subscription
+from subscriptions import quota
+from subscriptions.quota import QuotaExceeded
+from .derivatives import _record, generate_derivatives
+from .gc import collect_orphans
+from .models import Customer, Event, Photo, PhotoDerivative, ShareLink, UploadSession
+from .seed import seed, seed_email, unseed
+from .serializers import MAX_SELECTION_ITEMS
+from .views import MAX_BATCH_ITEMS
+from .services import (
+    apply_selection, bump_event_photos, create_photos_bulk, delete_objects_later, delete_photo_atomic, find_duplicates,
+    reconcile_owner_counters,
+)
+
+
+class EventListQueryCountTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('owner@example.com', 'pass12345', name='Owner')
+        customers = Customer.objects.bulk_create([
+            Customer(owner=self.user, name=f'Customer {i}') for i in range(5)
+        ])
+        Event.objects.bulk_create([
+            Event(customer=customers[i % 5], name=f'Event {i}', slug=f'event-{i}') for i in range(60)
+        ])
+        self.client.force_authenticate(self.user)
+
+    def test_page_number_list_query_count(self):
+        # validators + COUNT(*) + one page
+        with self.assertNumQueries(3):
+            res = self.client.get('/api/events/')
+        self.assertEqual(len(res.data['results']), 25)
+        self.assertEqual(res.data['results'][0]['upload_limit'], PLAN_UPLOAD_LIMITS[Plan.FREE])
+
+    def test_query_count_does_not_grow_with_page_size(self):
+        for page_size in (1, 10, 60):
+            with self.subTest(page_size=page_size), self.assertNumQueries(2):
+                res = self.client.get(f'/api/events/?pagination=cursor&page_size={page_size}')
+            self.assertEqual(len(res.data['results']), page_size)
+
+
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('owner@example.com', 'pass12345', name='Owner')
+        customer = Customer.objects.create(owner=self.user, name='Customer')
+        self.event = Event.objects.create(customer=customer, name='Wedding')
+        self.photo = Photo.objects.create(event=self.event, image_key='a.jpg')
+        self.link = ShareLink.objects.create(event=self.event)
+        self.client.force_authenticate(self.user)
+
+    def assertRevalidates(self, url):
+        res = self.client.get(url)
+        self.assertEqual(res.status_code, 200)
+        etag = res['ETag']
+        with self.assertNumQueries(1):
+            res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res['ETag'], etag)
+        return etag
+
+    def test_event_list_and_detail(self):
+        for url in ('/api/events/', f'/api/events/{self.event.pk}/'):
+            with self.subTest(url=url):
+                etag = self.assertRevalidates(url)
+                bump_event_photos({self.event.pk: 1})
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_photo_list_follows_selection(self):
+        url = f'/api/photos/?event={self.event.pk}'
+        etag = self.assertRevalidates(url)
+        apply_selection(event_id=self.event.pk, select=[self.photo.pk])
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res.data['results'][0]['is_selected'])
+
+    def test_if_modified_since(self):
+        res = self.client.get(f'/api/events/{self.event.pk}/')
+        res = self.client.get(f'/api/events/{self.event.pk}/', HTTP_IF_MODIFIED_SINCE=res['Last-Modified'])
+        self.assertEqual(res.status_code, 304)
+
+    def test_share_gallery_and_photos(self):
+        self.client.force_authenticate(None)
+        for url in (f'/api/share/{self.link.token}/', f'/api/share/{self.link.token}/photos/'):
+            with self.subTest(url=url):
+                self.client.get(url)  # warm the share-link cache
+                etag = self.assertRevalidates(url)
+                Event.objects.filter(pk=self.event.pk).update(selected_count=1, updated_at=self.event.updated_at)
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+                Event.objects.filter(pk=self.event.pk).update(selected_count=0)
+
+
+class ShareLinkTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user('owner@example.com', 'pass12345', name='Owner')
+        self.event = Event.objects.create(customer=Customer.objects.create(owner=user, name='C'), name='E')
+        Photo.objects.bulk_create([Photo(event=self.event, image_key=f'{i}.jpg') for i in range(3)])
+        self.link = ShareLink.objects.create(event=self.event)
+
+    def test_warm_query_counts(self):
+        gallery, photos = f'/api/share/{self.link.token}/', f'/api/share/{self.link.token}/photos/'
+        self.client.get(gallery)  # warm the share-link cache
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(gallery).status_code, 200)
+        # event validators, the page, its derivatives
+        with self.assertNumQueries(3):
+            res = self.client.get(photos)
+        self.assertEqual(len(res.data['results']), 3)
+
+    def test_malformed_tokens_skip_the_cache_and_database(self):
+        for token in ('x' * 40, self.link.token.upper(), self.link.token[:-1]):
+            with self.subTest(token=token), self.assertNumQueries(0):
+                self.assertEqual(self.client.get(f'/api/share/{token}/').status_code, 404)
+            self.assertIsNone(cache.get(ShareLink.cache_key(token)))
+
+    def test_revoked_links_stop_resolving(self):
+        url = f'/api/share/{self.link.token}/'
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.link.refresh()
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.get(f'/api/share/{self.link.token}/').status_code, 200)
+        self.link.delete()
+        self.assertEqual(self.client.get(f'/api/share/{self.link.token}/').status_code, 404)
+
+
+class SelectionTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user('owner@example.com', 'pass12345', name='Owner')
+        customer = Customer.objects.create(owner=user, name='C')
+        self.event = Event.objects.create(customer=customer, name='E')
+        self.other = Event.objects.create(customer=customer, name='Other')
+        self.a, self.b = Photo.objects.bulk_create([Photo(event=self.event, image_key=k) for k in ('a.jpg', 'b.jpg')])
+        self.foreign = Photo.objects.create(event=self.other, image_key='c.jpg')
+        self.link = ShareLink.objects.create(event=self.event)
+        self.url = f'/api/share/{self.link.token}/selections/'
+
+    def selected_count(self, event):
+        return Event.objects.get(pk=event.pk).selected_count
+
+    def test_apply_selection_only_counts_changes(self):
+        self.assertEqual(apply_selection(event_id=self.event.pk, select=[self.a.pk, self.b.pk]), (2, 0))
+        self.assertEqual(apply_selection(event_id=self.event.pk, select=[self.a.pk]), (0, 0))  # re-selecting
+        self.assertEqual(apply_selection(event_id=self.event.pk, deselect=[self.b.pk]), (0, 1))
+        self.assertEqual(apply_selection(event_id=self.event.pk, deselect=[self.b.pk]), (0, 0))  # not selected
+        self.assertEqual(self.selected_count(self.event), 1)
+
+    def test_photos_of_other_events_are_ignored(self):
+        self.assertEqual(apply_selection(event_id=self.event.pk, select=[self.foreign.pk]), (0, 0))
+        self.assertFalse(Photo.objects.get(pk=self.foreign.pk).is_selected)
+        self.assertEqual((self.selected_count(self.event), self.selected_count(self.other)), (0, 0))
+
+    def test_share_selections(self):
+        res = self.client.post(self.url, {'select': [str(self.a.pk), str(self.foreign.pk)]}, format='json')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data, {'selected': 1, 'deselected': 0, 'selected_count': 1})
+        res = self.client.post(self.url, {'select': [str(self.a.pk)], 'deselect': [str(self.a.pk)]}, format='json')
+        self.assertEqual(res.status_code, 400)
+        res = self.client.post(self.url, {'select': [str(uuid.uuid4())] * (MAX_SELECTION_ITEMS + 1)}, format='json')
+        self.assertEqual(res.status_code, 400)
+
+    def test_share_selections_need_can_select(self):
+        self.link.can_select = False
+        self.link.save()
+        res = self.client.post(self.url, {'select': [str(self.a.pk)]}, format='json')
+        self.assertEqual(res.status_code, 403)
+        self.assertFalse(Photo.objects.get(pk=self.a.pk).is_selected)
+
+
+class SingleRegisterQuotaTests(LocalStorageTestMixin, APITransactionTestCase):
+    # Autocommit, as in production: the reservation commits on its own, so a
+    # failed insert has to hand the slot back explicitly.
+    def setUp(self):
+        super().setUp()
+        self.event = Event.objects.create(customer=Customer.objects.create(owner=self.user, name='C'), name='E')
+        get_storage().put('a.jpg', b'a')
+        self.client.force_authenticate(self.user)
+
+    def register(self):
+        return self.client.post('/api/photos/register/', {
+            'event_id': str(self.event.pk), 'image_key': 'a.jpg',
+        }, format='json')
+
+    def used(self):
+        return Subscription.objects.get(user=self.user).photos_used_cached
+
+    def test_plan_limit_is_enforced(self):
+        Subscription.objects.filter(user=self.user).update(photos_used_cached=PLAN_UPLOAD_LIMITS[Plan.FREE])
+        res = self.register()
+        self.assertEqual(res.status_code, 400)
+        self.assertIn('Upload limit reached', str(res.data))
+        self.assertFalse(Photo.objects.exists())
+        self.assertEqual(self.used(), PLAN_UPLOAD_LIMITS[Plan.FREE])
+
+    def test_failed_insert_releases_the_slot(self):
+        with mock.patch.object(Photo.objects, 'bulk_create', side_effect=DatabaseError('boom')):
+            with self.assertRaises(DatabaseError):
+                self.register()
+        self.assertFalse(Photo.objects.exists())
+        self.assertEqual(self.used(), 0)
+        self.assertEqual(StorageUsage.objects.get(user=self.user).photo_bytes, 0)
+
+        self.assertEqual(self.register().status_code, 201)
+        self.assertEqual(self.used(), 1)
+
+    def test_bytes_are_charged_in_the_insert_transaction(self):
+        in_transaction, charge_storage = [], quota.charge_storage
+
+        def charge(*args, **kwargs):
+            in_transaction.append(connection.in_atomic_block)
+            return charge_storage(*args, **kwargs)
+
+        with mock.patch.object(quota, 'charge_storage', side_effect=charge):
+            self.assertEqual(self.register().status_code, 201)
+        self.assertEqual(in_transaction, [True])
+        self.assertEqual(StorageUsage.objects.get(user=self.user).photo_bytes, 1)
+
+    def test_failed_session_insert_gives_the_bytes_back(self):
+        session = UploadSession(
+            owner=self.user, event=self.event, reserved=1, expires_at=timezone.now() + timedelta(hours=1),
+        )
+        key = f'{session.key_prefix}00000.jpg'
+        session.sizes = {key: 5}
+        session.save()
+        with mock.patch.object(Photo.objects, 'bulk_create', side_effect=DatabaseError('boom')):
+            with self.assertRaises(DatabaseError):
+                self.client.post('/api/photos/register/', {
+                    'event_id': str(self.event.pk), 'image_key': key, 'size_bytes': 5,
+                    'upload_session': str(session.pk),
+                }, format='json')
+        self.assertEqual(StorageUsage.objects.get(user=self.user).photo_bytes, 0)
+        self.assertEqual(UploadSession.objects.get(pk=session.pk).used, 0)
+
+
+class BatchRegisterTests(LocalStorageTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.event = Event.objects.create(customer=Customer.objects.create(owner=self.user, name='C'), name='E')
+        stranger = User.objects.create_user('stranger@example.com', 'pass12345', name='Stranger')
+        self.foreign = Event.objects.create(customer=Customer.objects.create(owner=stranger, name='C'), name='E')
+        for key in ('a.jpg', 'b.jpg', 'c.jpg'):
+            get_storage().put(key, key.encode())
+        self.client.force_authenticate(self.user)
+
+    def post(self, items):
+        return self.client.post('/api/photos/register/batch/', items, format='json')
+
+    def item(self, key, event=None):
+        return {'event_id': str((event or self.event).pk), 'image_key': key}
+
+    def test_partial_failure(self):
+        res = self.post([
+            self.item('a.jpg'),
+            self.item('missing.jpg'),
+            self.item('b.jpg', self.foreign),
+            {'event_id': 'not-a-uuid', 'image_key': 'c.jpg'},
+            self.item('c.jpg'),
+        ])
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual((res.data['created'], res.data['failed']), (2, 3))
+        results = res.data['results']
+        self.assertEqual([r['index'] for r in results], [0, 1, 2, 3, 4])
+        self.assertEqual([r['ok'] for r in results], [True, False, False, False, True])
+        self.assertIn('image_key', results[1]['errors'])
+        self.assertEqual(results[2]['errors'], {'event_id': ['You do not own this event.']})
+        self.assertIn('event_id', results[3]['errors'])
+        self.assertEqual(results[0]['size_bytes'], 5)
+        self.assertEqual(Event.objects.get(pk=self.event.pk).photos_count, 2)
+        self.assertEqual(Subscription.objects.get(user=self.user).photos_used_cached, 2)
+
+    def test_only_missing_objects_is_a_400(self):
+        res = self.post([self.item('missing.jpg'), self.item('gone.jpg')])
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual((res.data['created'], res.data['failed']), (0, 2))
+        self.assertFalse(Photo.objects.exists())
+        self.assertEqual(Subscription.objects.get(user=self.user).photos_used_cached, 0)
+
+    def test_quota_fills_up_mid_batch(self):
+        Subscription.objects.filter(user=self.user).update(photos_used_cached=PLAN_UPLOAD_LIMITS[Plan.FREE] - 1)
+        res = self.post([self.item('a.jpg'), self.item('b.jpg')])
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual([r['ok'] for r in res.data['results']], [True, False])
+        self.assertEqual(
+            Subscription.objects.get(user=self.user).photos_used_cached, PLAN_UPLOAD_LIMITS[Plan.FREE],
+        )
+
+    def test_batch_limits(self):
+        self.assertEqual(self.post([]).status_code, 400)
+        self.assertEqual(self.post({'event_id': str(self.event.pk)}).status_code, 400)
+        res = self.post([self.item('a.jpg')] * (MAX_BATCH_ITEMS + 1))
+        self.assertEqual((res.status_code, res.data['detail']), (400, f'At most {MAX_BATCH_ITEMS} photos per batch.'))
+        self.assertFalse(Photo.objects.exists())
+
+
+class AsyncRegisterTests(LocalStorageTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.event = Event.objects.create(customer=Customer.objects.create(owner=self.user, name='C'), name='E')
+        for key in ('a.jpg', 'b.jpg', 'a_thumb.jpg'):
+            get_storage().put(key, (key.encode() + b'x' * 10)[:10])  # distinct content, 10 bytes
+        self.client.force_authenticate(self.user)
+
+    def test_single(self):
+        res = self.client.post('/api/photos/register/async/', {
+            'event_id': str(self.event.pk), 'image_key': 'a.jpg', 'thumbnail_key': 'a_thumb.jpg',
+        }, format='json')
+        self.assertEqual(res.status_code, 201, res.content)
+        self.assertEqual((res.json()['size_bytes'], res.json()['thumb_size_bytes']), (10, 10))
+        self.assertEqual(Subscription.objects.get(user=self.user).photos_used_cached, 1)
+
+        res = self.client.post('/api/photos/register/async/', {
+            'event_id': str(self.event.pk), 'image_key': 'missing.jpg',
+        }, format='json')
+        self.assertEqual(res.status_code, 400)
+
+    def test_batch_matches_sync_contract(self):
+        res = self.client.post('/api/photos/register/batch/async/', [
+            {'event_id': str(self.event.pk), 'image_key': 'a.jpg'},
+            {'event_id': str(self.event.pk), 'image_key': 'missing.jpg'},
+            {'event_id': str(self.event.pk), 'image_key': 'b.jpg'},
+        ], format='json')
+        self.assertEqual(res.status_code, 201)
+        body = res.json()
+        self.assertEqual((body['created'], body['failed']), (2, 1))
+        self.assertEqual([r['ok'] for r in body['results']], [True, False, True])
+        self.assertEqual(Event.objects.get(pk=self.event.pk).photos_count, 2)
+
+    def test_requires_authentication(self):
+        self.client.force_authenticate(None)
+        res = self.client.post('/api/photos/register/async/', {}, format='json')
+        self.assertIn(res.status_code, (401, 403))
+
+
+class DeleteObjectsJobTests(LocalStorageTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.event = Event.objects.create(customer=Customer.objects.create(owner=self.user, name='C'), name='E')
+        for key in ('a.jpg', 'b.jpg', 'a_thumb.jpg', 'a_320.jpg', 'a_1024.jpg', 'b_320.jpg'):
+            get_storage().put(key, b'x')
+        self.photo = Photo.objects.create(event=self.event, image_key='a.jpg', thumbnail_key='a_thumb.jpg')
+        self.other = Photo.objects.create(event=self.event, image_key='b.jpg', thumbnail_key='a_thumb.jpg')
+        PhotoDerivative.objects.bulk_create([
+            PhotoDerivative(photo=self.photo, size=320, key='a_320.jpg'),
+            PhotoDerivative(photo=self.photo, size=1024, key='a_1024.jpg'),
+            PhotoDerivative(photo=self.other, size=320, key='b_320.jpg'),
+        ])
+
+    def exists(self, key):
+        try:
+            get_storage().head(key)
+        except NotFound:
+            return False
+        return True
+
+    def run_jobs(self):
+        for job in queue.claim('test', kinds=['storage.delete_objects'], limit=10):
+            self.assertTrue(queue.run(job))
+
+    def test_deleted_photo_objects_are_removed_by_a_job(self):
+        self.client.force_authenticate(self.user)
+        res = self.client.delete(f'/api/photos/{self.photo.pk}/')
+        self.assertEqual(res.status_code, 204)
+        self.assertTrue(self.exists('a.jpg'))
+
+        self.run_jobs()
+        self.assertEqual([self.exists(k) for k in ('a.jpg', 'a_320.jpg', 'a_1024.jpg')], [False, False, False])
+        self.assertTrue(self.exists('a_thumb.jpg'))  # still used by the other photo
+        self.assertTrue(self.exists('b_320.jpg'))
+
+    def test_objects_are_deleted_in_batches(self):
+        keys = [f'gone/{i}.jpg' for i in range(DELETE_BATCH_SIZE + 1)]
+        storage = get_storage()
+        with mock.patch.object(type(storage), 'delete_many', autospec=True, return_value=[]) as delete_many:
+            delete_objects_later(keys + ['a.jpg'])
+            self.run_jobs()
+        self.assertEqual([len(call.args[1]) for call in delete_many.call_args_list], [DELETE_BATCH_SIZE, 1])
+
+    def test_failed_deletes_retry_the_job(self):
+        delete_objects_later(['gone.jpg'])
+        with mock.patch.object(type(get_storage()), 'delete_many', return_value=['gone.jpg']):
+            job, = queue.claim('test', kinds=['storage.delete_objects'], limit=1)
+            with self.assertLogs('jobs.queue', 'WARNING'):
+                self.assertFalse(queue.run(job))
+        self.assertEqual(Job.objects.get(pk=job.pk).status, JobStatus.QUEUED)
+
+    def test_keys_still_used_by_a_derivative_are_kept(self):
+        delete_objects_later(['b_320.jpg', 'a_1024.jpg'])
+        self.run_jobs()
+        self.assertTrue(self.exists('b_320.jpg'))
+        self.assertTrue(self.exists('a_1024.jpg'))
+
+    def test_derivatives_of_photos_deleted_while_rendering_are_removed(self):
+        get_storage().put('c_320.jpg', b'x')
+        gone = Photo(event=self.event, image_key='c.jpg')  # never saved, i.e. already deleted
+        _record([gone], {gone.pk: [PhotoDerivative(photo_id=gone.pk, size=320, key='c_320.jpg')]}, {gone.pk: 0})
+        self.run_jobs()
+        self.assertFalse(self.exists('c_320.jpg'))
+        self.assertFalse(PhotoDerivative.objects.filter(key='c_320.jpg').exists())
+
+
+class UploadSessionTests(LocalStorageTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.event = Event.objects.create(customer=Customer.objects.create(owner=self.user, name='C'), name='E')
+        self.client.force_authenticate(self.user)
+
+    def used(self):
+        return Subscription.objects.get(user=self.user).photos_used_cached
+
+    def open(self, sizes):
+        return self.client.post(f'/api/events/{self.event.pk}/upload-session/', {
+            'files': [{'name': f'IMG_{i}.JPG', 'size_bytes': size} for i, size in enumerate(sizes)],
+        }, format='json')
+
+    def register(self, session_id, upload, size):
+        return self.client.post('/api/photos/register/', {
+            'event_id': str(self.event.pk), 'image_key': upload['key'], 'size_bytes': size,
+            'upload_session': session_id,
+        }, format='json')
+
+    def test_open_signs_one_url_per_file_and_reserves_slots(self):
+        res = self.open([10, 20, 30])
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(res.data['reserved'], 3)
+        self.assertEqual(self.used(), 3)
+        uploads = res.data['uploads']
+        self.assertEqual([u['size_bytes'] for u in uploads], [10, 20, 30])
+        self.assertEqual(len({u['key'] for u in uploads}), 3)
+        for upload in uploads:
+            self.assertTrue(upload['key'].endswith('.jpg'))
+            self.assertIn('X-Amz-SignedHeaders=content-length%3Bhost', upload['url'])
+            self.assertEqual(upload['headers'], {'Content-Length': str(upload['size_bytes'])})
+
+    def test_signed_content_length_is_enforced(self):
+        res = self.open([10])
+        session_id, upload = res.data['id'], res.data['uploads'][0]
+        get_storage().put(upload['key'], b'x' * 10)
+        self.assertEqual(self.register(session_id, upload, 9).status_code, 400)
+        self.assertEqual(self.register(session_id, upload, 10).status_code, 201)
+        self.assertEqual(self.used(), 1)  # the session's slot, not a second one
+
+    def test_expiry_job_releases_unused_slots(self):
+        res = self.open([10, 20, 30])
+        session_id, upload = res.data['id'], res.data['uploads'][0]
+        get_storage().put(upload['key'], b'x' * 10)
+        self.register(session_id, upload, 10)
+        self.assertEqual(queue.claim('test', kinds=['uploads.expire_sessions']), [])  # not due yet
+
+        # Time passes: the session and its expiry job come due
+        past = timezone.now() - timedelta(seconds=1)
+        UploadSession.objects.filter(pk=session_id).update(expires_at=past)
+        Job.objects.filter(kind='uploads.expire_sessions').update(run_at=past)
+        job, = queue.claim('test', kinds=['uploads.expire_sessions'])
+        self.assertTrue(queue.run(job))
+        self.assertEqual(self.used(), 1)
+        self.assertIsNotNone(UploadSession.objects.get(pk=session_id).released_at)
+
+
+class DuplicateUploadTests(LocalStorageTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        customer = Customer.objects.create(owner=self.user, name='C')
+        self.event = Event.objects.create(customer=customer, name='E')
+        self.other = Event.objects.create(customer=customer, name='F')
+        for key, body in (('a.jpg', b'same'), ('a-again.jpg', b'same'), ('a-third.jpg', b'same'), ('b.jpg', b'other')):
+            get_storage().put(key, body)
+        self.client.force_authenticate(self.user)
+
+    def used(self):
+        return Subscription.objects.get(user=self.user).photos_used_cached
+
+    def register(self, key, event=None):
+        return self.client.post('/api/photos/register/', {
+            'event_id': str((event or self.event).pk), 'image_key': key,
+        }, format='json')
+
+    def test_single_duplicate_returns_existing_photo(self):
+        first = self.register('a.jpg')
+        self.assertEqual(first.status_code, 201)
+        again = self.register('a-again.jpg')
+        self.assertEqual((again.status_code, again.data['duplicate'], again.data['id']), (200, True, first.data['id']))
+        self.assertEqual(self.used(), 1)
+        # same content in another event is not a duplicate
+        self.assertEqual(self.register('a-again.jpg', self.other).status_code, 201)
+
+        job, = queue.claim('test', kinds=['storage.delete_objects'])
+        self.assertEqual(job.payload['keys'], ['a-again.jpg'])
+
+    def test_batch_skips_existing_and_repeated_content(self):
+        self.register('a.jpg')
+        with self.assertNumQueries(1):
+            found = find_duplicates([{'event': self.event, 'etag': get_storage().head(k).etag} for k in ('a.jpg', 'b.jpg')])
+        self.assertEqual(len(found), 1)
+
+        res = self.client.post('/api/photos/register/batch/', [
+            {'event_id': str(self.event.pk), 'image_key': 'b.jpg'},
+            {'event_id': str(self.event.pk), 'image_key': 'a-again.jpg'},
+            {'event_id': str(self.event.pk), 'image_key': 'a-third.jpg'},
+        ], format='json')
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual((res.data['created'], res.data['duplicates'], res.data['failed']), (1, 2, 0))
+        self.assertEqual([r.get('duplicate', False) for r in res.data['results']], [False, True, True])
+        self.assertEqual((self.used(), Event.objects.get(pk=self.event.pk).photos_count), (2, 2))
+
+    def test_upload_session_duplicates_are_removed_on_verification(self):
+        self.register('a.jpg')
+        session, key = self.open_session()
+        get_storage().put(key, b'same')
+        res = self.client.post('/api/photos/register/', {
+            'event_id': str(self.event.pk), 'image_key': key, 'size_bytes': 4, 'upload_session': str(session.pk),
+        }, format='json')
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(self.used(), 2)
+
+        job, = queue.claim('test', kinds=['photos.verify_uploads'])
+        self.assertTrue(queue.run(job))
+        self.assertFalse(Photo.objects.filter(pk=res.data['id']).exists())
+        self.assertEqual(self.used(), 1)
+
+    def test_sizes_other_than_the_signed_one_are_rejected(self):
+        session, key = self.open_session()
+        get_storage().put(key, b'same')
+        res = self.client.post('/api/photos/register/', {
+            'event_id': str(self.event.pk), 'image_key': key, 'size_bytes': 1, 'upload_session': str(session.pk),
+        }, format='json')
+        self.assertEqual(res.status_code, 400)
+        self.assertIn('size_bytes', res.data)
+
+        res = self.client.post('/api/photos/register/batch/', [
+            {'event_id': str(self.event.pk), 'image_key': key, 'size_bytes': 1, 'upload_session': str(session.pk)},
+        ], format='json')
+        self.assertEqual(res.status_code, 400)
+        self.assertIn('size_bytes', res.data['results'][0]['errors'])
+        self.assertFalse(Photo.objects.filter(image_key=key).exists())
+
+    def open_session(self):
+        session = UploadSession(
+            owner=self.user, event=self.event, reserved=1, expires_at=timezone.now() + timedelta(hours=1),
+        )
+        key = f'{session.key_prefix}00000.jpg'
+        session.sizes = {key: 4}
+        session.save()
+        quota.reserve(self.user.pk, 1)
+        return session, key
+
+
+@override_settings(PHOTO_DERIVATIVE_PROCESSES=1)
+class DerivativeTests(LocalStorageTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.event = Event.objects.create(customer=Customer.objects.create(owner=self.user, name='C'), name='E')
+        get_storage().put('big.jpg', sample_jpeg(3000, 2000))
+
+    def test_registration_queues_derivatives(self):
+        self.client.force_authenticate(self.user)
+        res = self.client.post('/api/photos/register/', {
+            'event_id': str(self.event.pk), 'image_key': 'big.jpg',
+        }, format='json')
+        self.assertEqual(res.status_code, 201)
+        job, = queue.claim('test', kinds=['photos.derivatives'])
+        self.assertTrue(queue.run(job))
+
+        photo = Photo.objects.get(pk=res.data['id'])
+        sizes = {d.size: d for d in photo.derivatives.all()}
+        self.assertEqual(sorted(sizes), [320, 1024, 2048])
+        self.assertEqual((sizes[2048].width, sizes[2048].height), (2048, 1365))
+        self.assertEqual(sizes[320].size_bytes, get_storage().head(sizes[320].key).size)
+        # no client thumbnail, so the smallest derivative becomes the thumbnail
+        self.assertEqual((photo.thumbnail_key, photo.thumb_size_bytes), (sizes[320].key, sizes[320].size_bytes))
+        self.assertIsNotNone(photo.phash)
+        # ... and is counted once, as a derivative
+        usage = StorageUsage.objects.get(user=self.user)
+        derivative_bytes = sum(d.size_bytes for d in sizes.values())
+        self.assertEqual((usage.thumbnail_bytes, usage.derivative_bytes), (0, derivative_bytes))
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.storage_bytes, photo.size_bytes + derivative_bytes)
+        self.assertEqual(reconcile_owner_counters([self.user.pk])['derivative_bytes'], {})
+
+        res = self.client.get(f'/api/photos/?event={self.event.pk}')
+        self.assertEqual(sorted(res.data['results'][0]['sizes']), ['1024', '2048', '320'])
+
+    def test_undecodable_originals_are_skipped(self):
+        keys = ['1.jpg', 'bad.jpg', '2.jpg', '3.jpg']
+        for i, key in enumerate(keys):
+            get_storage().put(key, b'not an image' if key == 'bad.jpg' else sample_jpeg(400, 300, seed=i))
+        photos = Photo.objects.bulk_create([Photo(event=self.event, image_key=key) for key in keys])
+        with self.assertLogs('customers.derivatives', 'WARNING') as logs:
+            done = generate_derivatives([p.pk for p in photos], chunk_size=2)
+        self.assertEqual(done, 3)
+        self.assertIn(str(photos[1].pk), logs.output[0])
+        for photo in Photo.objects.filter(pk__in=[p.pk for p in photos]):
+            with self.subTest(key=photo.image_key):
+                good = photo.image_key != 'bad.jpg'
+                self.assertEqual(photo.derivatives.exists(), good)
+                self.assertEqual(photo.phash is not None, good)
+
+    def test_phashes_are_saved_in_batches(self):
+        photos = Photo.objects.bulk_create([Photo(event=self.event, image_key=f'{i}.jpg') for i in range(3)])
+        hashes = {p.pk: h for p, h in zip(photos, (-(1 << 63), 0, (1 << 63) - 1))}
+        with mock.patch('customers.derivatives.PHASH_BATCH_SIZE', 2):
+            _record(photos, {p.pk: [] for p in photos}, hashes)
+        self.assertEqual(dict(Photo.objects.values_list('pk', 'phash')), hashes)
+
+
+class SelectionExportTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('owner@example.com', 'pass12345', name='Owner')
+        self.event = Event.objects.create(customer=Customer.objects.create(owner=self.user, name='C'), name='Wedding')
+        Photo.objects.bulk_create([
+            Photo(event=self.event, image_key='e/1.jpg', original_name='a, b.jpg', is_selected=True),
+            Photo(event=self.event, image_key='e/2.jpg', original_name='', is_selected=True),
+            Photo(event=self.event, image_key='e/3.jpg', original_name='c.jpg', is_selected=False),
+        ])
+        self.client.force_authenticate(self.user)
+        self.url = f'/api/events/{self.event.pk}/selection-export/'
+
+    def export(self, output=None):
+        res = self.client.get(self.url, {'output': output} if output else {})
+        self.assertEqual(res.status_code, 200)
+        return res, b''.join(res.streaming_content).decode().splitlines()
+
+    def test_csv(self):
+        res, lines = self.export()
+        self.assertEqual(res['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertEqual(res['Content-Disposition'], f'attachment; filename="{self.event.slug}-selection.csv"')
+        self.assertEqual(lines[0], 'original_name,image_key')
+        self.assertEqual(sorted(lines[1:]), ['"a, b.jpg",e/1.jpg', ',e/2.jpg'])
+
+    def test_txt_falls_back_to_the_key_name(self):
+        res, lines = self.export('txt')
+        self.assertEqual(res['Content-Type'], 'text/plain; charset=utf-8')
+        self.assertEqual(sorted(lines), ['2.jpg', 'a, b.jpg'])
+
+    def test_bad_output(self):
+        res = self.client.get(self.url, {'output': 'xml'})
+        self.assertEqual(res.status_code, 400)
+
+
+class DownloadTests(LocalStorageTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.event = Event.objects.create(customer=Customer.objects.create(owner=self.user, name='C'), name='Wedding')
+        for key, name, selected in (
+            ('e/1.jpg', 'a.jpg', True), ('e/2.jpg', 'a.jpg', True), ('e/3.jpg', '', True), ('e/4.jpg', 'b.jpg', False),
+        ):
+            get_storage().put(key, key.encode())
+            Photo.objects.create(event=self.event, image_key=key, original_name=name, is_selected=selected)
+        Photo.objects.create(event=self.event, image_key='e/missing.jpg', is_selected=True)
+        self.link = ShareLink.objects.create(event=self.event)
+
+    def archive(self, res):
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res['Content-Type'], 'application/zip')
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(res.streaming_content)))
+        return {name: archive.read(name) for name in archive.namelist()}
+
+    def test_event_download(self):
+        self.client.force_authenticate(self.user)
+        with self.assertLogs('common.zipstream', 'WARNING'):  # e/missing.jpg is skipped
+            files = self.archive(self.client.get(f'/api/events/{self.event.pk}/download/'))
+        # Rows stream in no particular order, so either a.jpg may get the suffix
+        self.assertEqual(sorted(files), ['3.jpg', 'a (2).jpg', 'a.jpg'])
+        self.assertEqual(sorted(files.values()), [b'e/1.jpg', b'e/2.jpg', b'e/3.jpg'])
+        with self.assertLogs('common.zipstream', 'WARNING'):
+            files = self.archive(self.client.get(f'/api/events/{self.event.pk}/download/?all=true'))
+        self.assertEqual(files['b.jpg'], b'e/4.jpg')
+
+    def test_event_download_is_owner_only(self):
+        stranger = User.objects.create_user('stranger@example.com', 'pass12345', name='Stranger')
+        self.client.force_authenticate(stranger)
+        self.assertEqual(self.client.get(f'/api/events/{self.event.pk}/download/').status_code, 404)
+
+    def test_share_download(self):
+        with self.assertLogs('common.zipstream', 'WARNING'):
+            files = self.archive(self.client.get(f'/api/share/{self.link.token}/download/'))
+        self.assertEqual(sorted(files), ['3.jpg', 'a (2).jpg', 'a.jpg'])
+        self.link.delete()
+        self.assertEqual(self.client.get(f'/api/share/{self.link.token}/download/').status_code, 404)
+
+
+class StorageUsageTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('owner@example.com', 'pass12345', name='Owner')
+        customer = Customer.objects.create(owner=self.user, name='C')
+        self.a = Event.objects.create(customer=customer, name='A')
+        self.b = Event.objects.create(customer=customer, name='B')
+
+    def add(self, event, size, thumb_size=0, **kwargs):
+        return create_photos_bulk(owner_id=self.user.pk, items=[{
+            'event': event, 'image_key': f'{event.pk}/{size}.jpg', 'size_bytes': size, 'thumb_size_bytes': thumb_size,
+        }], **kwargs)
+
+    def test_rollup_follows_inserts_and_deletes(self):
+        photo, = self.add(self.a, 1000, 100)
+        self.add(self.b, 500)
+        delete_photo_atomic(photo=photo)
+        self.add(self.a, 300)
+
+        self.client.force_authenticate(self.user)
+        res = self.client.get('/api/storage/')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual((res.data['photo_bytes'], res.data['thumbnail_bytes'], res.data['total_bytes']), (800, 0, 800))
+        self.assertEqual(res.data['limit_bytes'], PLAN_STORAGE_LIMITS[Plan.FREE])
+        self.assertEqual([(e['name'], e['storage_bytes']) for e in res.data['events']], [('B', 500), ('A', 300)])
+
+    def test_byte_quota_is_enforced(self):
+        StorageUsage.adjust(self.user.pk, photo=PLAN_STORAGE_LIMITS[Plan.FREE] - 100)
+        self.assertEqual(self.add(self.a, 101), [])  # partial: dropped, slot given back
+        self.assertEqual(Subscription.objects.get(user=self.user).photos_used_cached, 0)
+        with self.assertRaises(QuotaExceeded):
+            self.add(self.a, 101, partial=False)
+        self.assertEqual(len(self.add(self.a, 100)), 1)
+
+        self.client.force_authenticate(self.user)
+        res = self.client.post(f'/api/events/{self.a.pk}/upload-session/', {
+            'files': [{'name': 'x.jpg', 'size_bytes': 1}],
+        }, format='json')
+        self.assertEqual((res.status_code, res.data['detail']), (400, 'Storage limit reached for your plan.'))
+
+    def test_reconcile_fixes_drift(self):
+        self.add(self.a, 1000, 100)
+        StorageUsage.adjust(self.user.pk, photo=7, derivative=3)
+        Event.objects.filter(pk=self.a.pk).update(storage_bytes=0)
+
+        drift = reconcile_owner_counters([self.user.pk])
+        usage = StorageUsage.objects.get(user=self.user)
+        self.assertEqual(drift['photo_bytes'], {usage.pk: 7})
+        self.assertEqual(drift['storage_bytes'], {self.a.pk: -1100})
+        self.assertEqual((usage.photo_bytes, usage.thumbnail_bytes, usage.derivative_bytes), (1000, 100, 0))
+        self.assertEqual(Event.objects.get(pk=self.a.pk).storage_bytes, 1100)
+
+
+class ReconcileCommandTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('owner@example.com', 'pass12345', name='Owner')
+        customer = Customer.objects.create(owner=self.user, name='C')
+        self.drifted, self.clean = (Event.objects.create(customer=customer, name=name) for name in ('A', 'B'))
+        for event in (self.drifted, self.clean):
+            photos = create_photos_bulk(owner_id=self.user.pk, items=[
+                {'event': event, 'image_key': f'{event.pk}/{i}.jpg', 'size_bytes': 100, 'thumb_size_bytes': 10}
+                for i in range(3)
+            ])
+            apply_selection(event_id=event.pk, select=[photos[0].pk])
+
+        Event.objects.filter(pk=self.drifted.pk).update(photos_count=9, selected_count=0, storage_bytes=1)
+        Subscription.objects.filter(user=self.user).update(photos_used_cached=2)
+        StorageUsage.objects.filter(user=self.user).update(photo_bytes=1, thumbnail_bytes=2, derivative_bytes=3)
+
+    def counters(self):
+        return (
+            list(Event.objects.order_by('name').values_list('photos_count', 'selected_count', 'storage_bytes', 'updated_at')),
+            Subscription.objects.filter(user=self.user).values_list('photos_used_cached', flat=True).get(),
+            StorageUsage.objects.filter(user=self.user).values_list('photo_bytes', 'thumbnail_bytes', 'derivative_bytes').get(),
+        )
+
+    def reconcile(self, *args):
+        out = io.StringIO()
+        call_command('reconcile_counters', *args, stdout=out)
+        return out.getvalue()
+
+    def test_dry_run_reports_without_writing(self):
+        before = self.counters()
+        out = self.reconcile('--dry-run', '--show')
+        self.assertEqual(self.counters(), before)
+        self.assertIn('photos_count: 1 row(s) drifted by 6 in total (would fix)', out)
+        self.assertIn(f'photos_used_cached {Subscription.objects.get(user=self.user).pk}: -4', out)
+        self.assertIn('derivative_bytes: 1 row(s) drifted by 3 in total (would fix)', out)
+
+    def test_fixes_only_drifted_rows(self):
+        (_, clean_before), _, _ = self.counters()
+        out = self.reconcile()
+        for counter in ('photos_count', 'selected_count', 'storage_bytes', 'photos_used_cached',
+                        'photo_bytes', 'thumbnail_bytes', 'derivative_bytes'):
+            self.assertIn(f'{counter}: 1 row(s)', out)
+        (drifted, clean), used, usage = self.counters()
+        self.assertEqual(drifted[:3], (3, 1, 330))
+        self.assertEqual(clean, clean_before)  # not rewritten
+        self.assertEqual((used, usage), (6, (600, 60, 0)))
+        self.assertIn('photos_used_cached: 0 row(s) drifted by 0', self.reconcile())
+
+
+class BurstTests(APITestCase):
+    def test_labels(self):
+        a, b = 0x0F0F0F0F0F0F0F0F, -0x0F0F0F0F0F0F0F10  # 64 bits apart
+        near_a = a ^ 0b111
+        self.assertEqual(burst_labels([a, near_a, a, b, b, None, b, a]), [0, 0, 0, 1, 1, 1, 1, 2])
+        self.assertEqual(burst_labels([a, near_a], threshold=2), [0, 1])
+        self.assertEqual(burst_labels([a, None, None, None, a]), [0, 1, 2, 3, 4])  # beyond the window
+        self.assertEqual(burst_labels([]), [])
+
+    def test_label_edge_cases(self):
+        self.assertEqual(burst_labels([None, None, None]), [0, 1, 2])  # nothing hashed yet
+        self.assertEqual(burst_labels([5]), [0])
+        self.assertEqual(burst_labels([5, 5, None, 5], window=10), [0, 0, 0, 0])  # window longer than the list
+        self.assertEqual(burst_labels([5, 5, None, 5], window=1), [0, 0, 1, 2])
+
+    def test_endpoint(self):
+        user = User.objects.create_user('owner@example.com', 'pass12345', name='Owner')
+        event = Event.objects.create(customer=Customer.objects.create(owner=user, name='C'), name='E')
+        hashes = [1, 3, 7, -1, -2, None]
+        photos = Photo.objects.bulk_create([
+            Photo(event=event, image_key=f'{i}.jpg', original_name=f'IMG_{i:04d}.jpg', phash=h, is_selected=(i == 1))
+            for i, h in enumerate(hashes)
+        ])
+
+        self.client.force_authenticate(user)
+        res = self.client.get(f'/api/events/{event.pk}/bursts/')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data['photos'], 6)
+        self.assertEqual(
+            [(b['representative'], b['photos']) for b in res.data['bursts']],
+            [(photos[1].pk, [p.pk for p in photos[:3]]), (photos[3].pk, [photos[3].pk, photos[4].pk]), (photos[5].pk, [photos[5].pk])],
+        )
+        self.assertEqual(self.client.get(f'/api/events/{event.pk}/bursts/?threshold=64').status_code, 400)
+
+
+class GarbageCollectionTests(LocalStorageTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.event = Event.objects.create(customer=Customer.objects.create(owner=self.user, name='C'), name='E')
+        Photo.objects.create(event=self.event, image_key='e/a.jpg', thumbnail_key='e/a_t.jpg', size_bytes=1)
+
+        storage = get_storage()
+        old = time.time() - 30 * 24 * 3600
+        for key in ('e/a.jpg', 'e/a_t.jpg', 'e/orphan.jpg', 'e/new.jpg', 'f/orphan.jpg'):
+            storage.put(key, b'x' * 10)
+            if key != 'e/new.jpg':
+                os.utime(storage._path(key), (old, old))
+
+    def keys(self):
+        return [obj.key for obj in get_storage().list()]
+
+    def test_dry_run_deletes_nothing(self):
+        report = collect_orphans(dry_run=True, sample=10)
+        self.assertEqual((report['scanned'], report['orphans'], report['young']), (5, 2, 1))
+        self.assertEqual(report['sample'], ['e/orphan.jpg', 'f/orphan.jpg'])
+        self.assertEqual(len(self.keys()), 5)
+
+    def test_deletes_old_orphans_only(self):
+        report = collect_orphans(prefix='e/')
+        self.assertEqual((report['scanned'], report['deleted'], report['failed']), (4, 1, 0))
+        self.assertEqual(self.keys(), ['e/a.jpg', 'e/a_t.jpg', 'e/new.jpg', 'f/orphan.jpg'])
+
+
+class SeedTests(APITestCase):
+    def test_counters_are_consistent(self):
+        counts = seed(users=2, customers=2, events=2, photos=30, prefix='t', seed=1)
+        self.assertEqual(counts, {'users': 2, 'customers': 4, 'events': 8, 'share_links': 8, 'photos': 240})
+        owners = User.objects.filter(email__in=[seed_email('t', 0), seed_email('t', 1)]).values_list('pk', flat=True)
+        drift = reconcile_owner_counters(list(owners))
+        self.assertEqual({name: rows for name, rows in drift.items() if rows}, {})
+        self.assertEqual(Subscription.objects.get(user_id=owners[0]).photos_used_cached, 120)
+
+        with self.assertRaises(ValueError):
+            seed(users=1, customers=1, events=1, photos=1, prefix='t')
+        self.assertEqual(unseed('t'), 2)
+        self.assertFalse(Photo.objects.exists())
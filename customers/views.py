@@ -1,29 +1,43 @@
-import boto3
+import csv
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from django.conf import settings
-from django.db.models import Count
-from rest_framework import viewsets, status
+from django.db.models import Count, Max, Sum
+from django.http import Http404, StreamingHttpResponse
+from django.utils import timezone
+from rest_framework import viewsets, status, generics
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 
-from .serializers import PhotoRegisterSerializer, CustomerSerializer, EventSerializer, ShareLinkSerializer
-from .models import Customer, Event, ShareLink
+from .serializers import (
+    PhotoSerializer, PhotoRegisterSerializer, PhotoItemSerializer, CustomerSerializer,
+    EventSerializer, ShareLinkSerializer, UploadSessionCreateSerializer, SelectionSerializer, MAX_BYTES,
+)
+from .models import Customer, Event, Photo, PhotoDerivative, ShareLink, UploadSession, object_url
+from .services import (
+    register_photos, delete_photo_atomic, delete_objects_later, open_upload_session, get_active_share_link,
+    apply_selection,
+)
 from accounts.permissions import IsOwnerOrStaff
+from common.bursts import BURST_THRESHOLD, burst_labels
+from common.conditional import conditional_get
+from common.instrumentation import in_request
+from common.pagination import CreatedAtCursorPagination
+from common.storage import get_storage
+from common.zipstream import UniqueNames, read_ahead, stream_zip
+from subscriptions.models import PLAN_STORAGE_LIMITS, Plan, StorageUsage
+from subscriptions.quota import QuotaExceeded
 
 
-MAX_BYTES = 20 * 1024 * 1024
-
-def wasabi_client():
-    return boto3.client(
-        's3',
-        region_name=getattr(settings, 'WASABI_REGION', 'us-east-1'),
-        endpoint_url=getattr(settings, 'WASABI_ENDPOINT', 'https://s3.us-east-1.wasabisys.com'),
-        aws_access_key_id=settings.WASABI_ACCESS_KEY,
-        aws_secret_access_key=settings.WASABI_SECRET_KEY,
-    )
+MAX_BATCH_ITEMS = 1000
+EXPORT_CHUNK_SIZE = 2000
+HEAD_WORKERS = getattr(settings, 'PHOTO_REGISTER_HEAD_WORKERS', 16)  # keep <= STORAGE_MAX_POOL_CONNECTIONS
+OVERSIZED = "Original image exceeds 20 MB after compression."
 
 
 class OwnerScopedMixin:
@@ -64,7 +78,8 @@ class EventViewSet(OwnerScopedMixin, viewsets.ModelViewSet):
     /api/events/
     /api/events/{id}/
     """
-    queryset = Event.objects.select_related('customer', 'customer__owner')
+    # subscription is joined so EventSerializer.upload_limit costs no query per row
+    queryset = Event.objects.select_related('customer', 'customer__owner', 'customer__owner__subscription')
     serializer_class = EventSerializer
     permission_classes = [IsOwnerOrStaff]
     owner_path = 'customer__owner'
@@ -74,47 +89,552 @@ class EventViewSet(OwnerScopedMixin, viewsets.ModelViewSet):
     ordering_fields = ['created_at', 'date', 'name']
     filterset_fields = ['customer']
 
+    def list(self, request, *args, **kwargs):
+        """
+        Conditional: validators are one aggregate over the (filtered) events -
+        any change to an event, its counters or the owner's plan moves them.
+        """
+        v = self.filter_queryset(self.get_queryset()).order_by().aggregate(
+            n=Count('pk'),
+            updated=Max('updated_at'),
+            photos=Sum('photos_count'),
+            selected=Sum('selected_count'),
+            plan=Max('customer__owner__subscription__updated_at'),
+        )
+        return conditional_get(
+            request,
+            parts=(v['n'], v['updated'], v['photos'], v['selected'], v['plan']),
+            last_modified=max(filter(None, (v['updated'], v['plan'])), default=None),
+            build=lambda: super(EventViewSet, self).list(request, *args, **kwargs),
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = self.kwargs['pk']
+        v = _event_validators(self.get_queryset(), pk, plan=True) if _is_uuid(pk) else None
+        if v is None:
+            return super().retrieve(request, *args, **kwargs)  # 404 as usual
+        return conditional_get(
+            request,
+            parts=v,
+            last_modified=max(filter(None, (v[0], v[3])), default=None),
+            build=lambda: super(EventViewSet, self).retrieve(request, *args, **kwargs),
+        )
+
+    @action(detail=True, methods=['post'], url_path='upload-session')
+    def upload_session(self, request, pk=None):
+        """
+        POST /api/events/{id}/upload-session/
+        Body: {"files": [{"name": "IMG_0001.jpg", "size_bytes": 1234567}, ...]}
+        Reserves quota for every file and returns one presigned PUT URL each.
+        PUT each file with exactly the returned headers, then register the keys
+        with "upload_session": <id> (no storage HEAD needed).
+        """
+        event = self.get_object()
+        ser = UploadSessionCreateSerializer(data=request.data)
+        ser.is_valid(raise_exception=True)
+
+        try:
+            session, uploads = open_upload_session(event=event, files=ser.validated_data['files'])
+        except QuotaExceeded as e:
+            return Response({"detail": e.messages[0]}, status=400)
+
+        return Response({
+            "id": str(session.id),
+            "event": str(event.id),
+            "reserved": session.reserved,
+            "expires_at": session.expires_at,
+            "uploads": uploads,
+        }, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['get'], url_path='selection-export')
+    def selection_export(self, request, pk=None):
+        """
+        GET /api/events/{id}/selection-export/?output=csv|txt
+        Streams the client's selected photos: CSV (original_name,image_key) or a
+        plain filename list (one per line) for Lightroom & co. Rows are read
+        with a server-side cursor over the (event, is_selected) index, so memory
+        stays flat however large the event is.
+        """
+        event = self.get_object()
+        output = request.query_params.get('output', 'csv')
+        if output not in ('csv', 'txt'):
+            return Response({"detail": "output must be 'csv' or 'txt'."}, status=400)
+
+        rows = (
+            Photo.objects.filter(event_id=event.pk, is_selected=True)
+            .order_by()
+            .values_list('original_name', 'image_key')
+            .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        )
+        if output == 'csv':
+            content, content_type = _csv_lines(rows), 'text/csv; charset=utf-8'
+        else:
+            content = (f'{name or key.rsplit("/", 1)[-1]}\n' for name, key in rows)
+            content_type = 'text/plain; charset=utf-8'
+
+        response = StreamingHttpResponse(content, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{event.slug}-selection.{output}"'
+        return response
+
+    @action(detail=True, methods=['get'])
+    def bursts(self, request, pk=None):
+        """
+        GET /api/events/{id}/bursts/?threshold=10
+        The event's photos grouped into bursts of near-identical frames:
+        perceptual hashes (Photo.phash) compared in file-name order, see
+        common.bursts; threshold is in differing bits of 64. Each burst names
+        a representative (its selected frame if any, else the first) so
+        clients can show one photo per burst. Conditional on the event.
+        """
+        event = self.get_object()
+        try:
+            threshold = int(request.query_params.get('threshold', BURST_THRESHOLD))
+        except ValueError:
+            threshold = -1
+        if not 0 <= threshold <= 32:
+            return Response({"detail": "threshold must be an integer from 0 to 32."}, status=400)
+        return conditional_get(
+            request,
+            parts=(event.updated_at, event.photos_count, event.selected_count),
+            last_modified=event.updated_at,
+            build=lambda: Response(_bursts(event, threshold)),
+        )
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        """
+        GET /api/events/{id}/download/?all=true
+        ZIP of the selected originals (every photo with all=true), streamed.
+        """
+        event = self.get_object()
+        qs = Photo.objects.filter(event_id=event.pk)
+        if request.query_params.get('all') != 'true':
+            qs = qs.filter(is_selected=True)
+        return _zip_response(qs, f'{event.slug}.zip')
+
+
+class PhotoViewSet(OwnerScopedMixin, viewsets.ModelViewSet):
+    """
+    /api/photos/?event=<id>
+    /api/photos/{id}/
+    Listing is meant to be filtered by event; with ?pagination=cursor it walks
+    the (event, created_at) index instead of OFFSET pages.
+    """
+    queryset = Photo.objects.select_related('event__customer').prefetch_related('derivatives')
+    serializer_class = PhotoSerializer
+    permission_classes = [IsOwnerOrStaff]
+    owner_path = 'event__customer__owner'
+    http_method_names = ['get', 'delete', 'head', 'options']
+    lookup_value_regex = '[0-9a-f-]{32,36}'  # keep /api/photos/register/ reachable
+
+    ordering_fields = ['created_at', 'original_name']
+    filterset_fields = ['event', 'is_selected']
+
+    def list(self, request, *args, **kwargs):
+        """
+        With ?event=<id> the listing is conditional on the event's validators:
+        every photo insert, delete or (de)selection bumps Event.updated_at.
+        """
+        event_id = request.query_params.get('event')
+        events = Event.objects.all()
+        if not request.user.is_staff:
+            events = events.filter(customer__owner=request.user)
+        v = _event_validators(events, event_id) if _is_uuid(event_id) else None
+        if v is None:
+            return super().list(request, *args, **kwargs)
+        return conditional_get(
+            request,
+            parts=v,
+            last_modified=v[0],
+            build=lambda: super(PhotoViewSet, self).list(request, *args, **kwargs),
+        )
+
+    def perform_destroy(self, instance):
+        delete_photo_atomic(photo=instance)
+
 
 class PhotoRegisterView(APIView):
     permission_classes = [IsOwnerOrStaff]
 
     def post(self, request):
-        ser = PhotoRegisterSerializer(data=request.data, context={'request': request})
-        ser.is_valid(raise_exception=True)
-
+        ser, session = _register_prepare(request)
         data = ser.validated_data
-        s3 = wasabi_client()
+        if session is not None:
+            # Size was pinned by the presigned PUT; no need to ask storage
+            photo = _register_save(ser, data['size_bytes'], data.get('thumb_size_bytes') or 0, session)
+            return Response(*_register_result(photo))
 
-        # Optional server-side validation of sizes
-        try:
-            head = s3.head_object(Bucket=settings.WASABI_BUCKET_NAME, Key=data['image_key'])
-            size = head['ContentLength']
-            if size > MAX_BYTES:
-                # Clean up object if you want
-                s3.delete_object(Bucket=settings.WASABI_BUCKET_NAME, Key=data['image_key'])
-                return Response({"detail": "Original image exceeds 20 MB after compression."}, status=400)
-        except Exception as e:
-            return Response({"detail": f"Image object not found or not accessible: {e}"}, status=400)
-
-        thumb_size = 0
-        if data.get('thumbnail_key'):
+        size, thumb_size, etag, error = _head_photo(get_storage(), data)
+        if error:
+            if error == OVERSIZED:
+                delete_objects_later([data['image_key']])
+            return Response({"detail": error}, status=400)
+
+        # Save (the photo takes a fresh quota slot, unless the event already has it)
+        photo = _register_save(ser, size, thumb_size, None, etag)
+        return Response(*_register_result(photo))
+
+
+def _register_prepare(request):
+    """
+    Validate a single registration; returns (serializer, session), where
+    session is set only if it covers the upload (so no HEAD is needed).
+    """
+    ser = PhotoRegisterSerializer(data=request.data, context={'request': request})
+    ser.is_valid(raise_exception=True)
+    data = ser.validated_data
+    session = None
+    if data.get('upload_session'):
+        session = UploadSession.objects.filter(pk=data['upload_session']).first()
+    errors = _signed_size_errors(session, data)
+    if errors:
+        raise ValidationError(errors)
+    return ser, session if _session_covers(session, data['event'], data) else None
+
+
+def _register_save(ser, size, thumb_size, session, etag=None):
+    return ser.save(size_bytes=size, thumb_size_bytes=thumb_size, upload_session=session, etag=etag)
+
+
+def _register_result(photo):
+    """
+    (body, status) for a single registration: 201, or 200 with
+    "duplicate": true when the event already had this content.
+    """
+    if photo.duplicate:
+        return {**_photo_result(photo), "duplicate": True}, status.HTTP_200_OK
+    return _photo_result(photo), status.HTTP_201_CREATED
+
+
+class PhotoBatchRegisterView(APIView):
+    """
+    POST /api/photos/register/batch/
+    Body: a list of PhotoRegisterView payloads (max MAX_BATCH_ITEMS).
+    Returns one result per input item, in order:
+      {"index": 0, "ok": true, "id": ..., "size_bytes": ...}
+      {"index": 1, "ok": false, "errors": {...}}
+      {"index": 2, "ok": true, "duplicate": true, "id": <existing photo>, ...}
+    Duplicates (content the event already has, by storage ETag) are not
+    inserted and take no quota.
+    """
+    permission_classes = [IsOwnerOrStaff]
+
+    def post(self, request):
+        batch = BatchRegistration(request.data, request.user)
+        if batch.error:
+            return Response({"detail": batch.error}, status=400)
+        batch.prepare()
+
+        # HEAD checks run concurrently on the shared, pooled storage client
+        heads = []
+        if batch.unchecked:
+            storage = get_storage()
+            with ThreadPoolExecutor(max_workers=HEAD_WORKERS) as pool:
+                heads = list(pool.map(in_request(lambda row: _head_photo(storage, row[1])), batch.unchecked))
+
+        return Response(*batch.finish(heads))
+
+
+class BatchRegistration:
+    """
+    Batch registration in three phases, shared by the sync and async views:
+    prepare() (validation, ownership, sessions - DB), the caller's HEAD checks
+    of `unchecked` (storage), and finish(heads) (quota + inserts - DB).
+    """
+
+    def __init__(self, items, user):
+        self.items = items
+        self.user = user
+        self.error = None
+        if not isinstance(items, list) or not items:
+            self.error = "Expected a non-empty list of photos."
+        elif len(items) > MAX_BATCH_ITEMS:
+            self.error = f"At most {MAX_BATCH_ITEMS} photos per batch."
+        self.results = [None] * len(items) if not self.error else []
+        self.trusted = []    # (index, data, event, session)
+        self.unchecked = []  # (index, data, event) - need a storage HEAD
+
+    def prepare(self):
+        results = self.results
+        valid = []  # (index, validated_data)
+        for i, item in enumerate(self.items):
+            ser = PhotoItemSerializer(data=item)
+            if ser.is_valid():
+                valid.append((i, ser.validated_data))
+            else:
+                results[i] = {"index": i, "ok": False, "errors": ser.errors}
+
+        # Ownership: one query for all distinct events in the batch
+        event_ids = {data['event_id'] for _, data in valid}
+        events = Event.objects.select_related('customer').in_bulk(event_ids)
+        user = self.user
+        owned = []
+        for i, data in valid:
+            event = events.get(data['event_id'])
+            if event is None:
+                results[i] = {"index": i, "ok": False, "errors": {"event_id": ["Event not found."]}}
+            elif event.customer.owner_id != user.id and not user.is_staff:
+                results[i] = {"index": i, "ok": False, "errors": {"event_id": ["You do not own this event."]}}
+            else:
+                owned.append((i, data, event))
+
+        # Objects uploaded through an open upload session skip the HEAD checks
+        session_ids = {data['upload_session'] for _, data, _ in owned if data.get('upload_session')}
+        sessions = UploadSession.objects.in_bulk(session_ids) if session_ids else {}
+        for i, data, event in owned:
+            session = sessions.get(data.get('upload_session'))
+            errors = _signed_size_errors(session, data)
+            if errors:
+                results[i] = {"index": i, "ok": False, "errors": errors}
+            elif _session_covers(session, event, data):
+                self.trusted.append((i, data, event, session))
+            else:
+                self.unchecked.append((i, data, event))
+
+    def finish(self, heads):
+        """
+        `heads` are _head_photo() results for `unchecked`, in order.
+        Returns (body, status).
+        """
+        results = self.results
+
+        # Quota is enforced per subscription owner (or upload session), so group by it
+        groups = {}
+        for i, data, event, session in self.trusted:
+            groups.setdefault((event.customer.owner_id, session), []).append(
+                (i, _photo_fields(data, event, data['size_bytes'], data.get('thumb_size_bytes') or 0))
+            )
+        oversized = []
+        for (i, data, event), (size, thumb_size, etag, error) in zip(self.unchecked, heads):
+            if error:
+                results[i] = {"index": i, "ok": False, "errors": {"image_key": [error]}}
+                if error == OVERSIZED:
+                    oversized.append(data['image_key'])
+                continue
+            groups.setdefault((event.customer.owner_id, None), []).append(
+                (i, _photo_fields(data, event, size, thumb_size, etag))
+            )
+
+        for (owner_id, session), rows in groups.items():
             try:
-                h2 = s3.head_object(Bucket=settings.WASABI_BUCKET_NAME, Key=data['thumbnail_key'])
-                thumb_size = h2['ContentLength']
-            except Exception:
-                # If thumb missing, you can proceed or treat as error; here we proceed.
-                thumb_size = 0
+                registered = register_photos(
+                    owner_id=owner_id, items=[row for _, row in rows], upload_session=session,
+                )
+            except QuotaExceeded as e:
+                for i, _ in rows:
+                    results[i] = {"index": i, "ok": False, "errors": e.message_dict}
+                continue
+            for (i, _), (photo, duplicate) in zip(rows, registered):
+                if photo is None:
+                    results[i] = {"index": i, "ok": False, "errors": {"image_key": ["Upload or storage limit reached for your plan."]}}
+                elif duplicate:
+                    results[i] = {"index": i, "ok": True, "duplicate": True, **_photo_result(photo)}
+                else:
+                    results[i] = {"index": i, "ok": True, **_photo_result(photo)}
+        delete_objects_later(oversized)
+
+        ok = sum(1 for r in results if r['ok'])
+        duplicates = sum(1 for r in results if r.get('duplicate'))
+        return {
+            "created": ok - duplicates,
+            "duplicates": duplicates,
+            "failed": len(results) - ok,
+            "results": results,
+        }, status.HTTP_201_CREATED if ok else status.HTTP_400_BAD_REQUEST
+
+
+def _bursts(event, threshold) -> dict:
+    rows = list(
+        Photo.objects.filter(event_id=event.pk)
+        .order_by('original_name', 'created_at')
+        .values_list('id', 'phash', 'is_selected', 'thumbnail_key')
+    )
+    bursts = []
+    for (pk, _, selected, thumbnail_key), label in zip(rows, burst_labels([r[1] for r in rows], threshold=threshold)):
+        if label == len(bursts):
+            bursts.append({"representative": pk, "selected": selected, "thumbnail_key": thumbnail_key, "photos": []})
+        burst = bursts[label]
+        burst["photos"].append(pk)
+        if selected and not burst["selected"]:
+            burst.update(representative=pk, selected=True, thumbnail_key=thumbnail_key)
+    return {
+        "event": event.pk,
+        "photos": len(rows),
+        "bursts": [
+            {
+                "representative": b["representative"],
+                "thumb_url": object_url(b["thumbnail_key"]),
+                "size": len(b["photos"]),
+                "photos": b["photos"],
+            }
+            for b in bursts
+        ],
+    }
+
+
+def _event_validators(events, pk, *, plan=False):
+    """
+    (updated_at, photos_count, selected_count[, plan updated_at]) of one event
+    in `events` (a primary-key lookup), or None if it isn't there.
+    """
+    fields = ['updated_at', 'photos_count', 'selected_count']
+    if plan:
+        fields.append('customer__owner__subscription__updated_at')
+    return events.filter(pk=pk).values_list(*fields).first()
+
+
+def _is_uuid(value) -> bool:
+    try:
+        uuid.UUID(str(value))
+    except ValueError:
+        return False
+    return True
 
-        # Save
-        photo = ser.save(size_bytes=size, thumb_size_bytes=thumb_size)
 
+def _zip_response(photos, filename):
+    """
+    Stream `photos` as a ZIP built on the fly from storage (see common.zipstream).
+    """
+    rows = photos.order_by().values_list('original_name', 'image_key', 'created_at').iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    unique = UniqueNames()
+    files = (
+        (unique(_archive_name(name, key)), key, timezone.localtime(created_at))
+        for name, key, created_at in rows
+    )
+
+    response = StreamingHttpResponse(stream_zip(read_ahead(get_storage(), files)), content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def _archive_name(original_name, key) -> str:
+    name = (original_name or key.rsplit('/', 1)[-1]).replace('\\', '/').rsplit('/', 1)[-1]
+    return name or 'photo'
+
+
+class _Echo:
+    """csv.writer target that hands each formatted row straight back."""
+
+    def write(self, value):
+        return value
+
+
+def _csv_lines(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(('original_name', 'image_key'))
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def _session_covers(session, event, data) -> bool:
+    """
+    True if `data` is an object uploaded through `session` for `event` (so its
+    size was pinned by the presigned PUT and the session holds its quota slot).
+    A thumbnail, if any, must have been uploaded through the session too.
+    """
+    thumbnail_key = data.get('thumbnail_key')
+    return (
+        session is not None
+        and session.event_id == event.id
+        and session.owner_id == event.customer.owner_id
+        and session.is_open()
+        and data['image_key'].startswith(session.key_prefix)
+        and 0 < (data.get('size_bytes') or 0) <= MAX_BYTES
+        and session.sizes.get(data['image_key']) == data['size_bytes']
+        and (not thumbnail_key or session.sizes.get(thumbnail_key) == (data.get('thumb_size_bytes') or 0))
+    )
+
+
+def _signed_size_errors(session, data):
+    """
+    Errors (serializer style) if `data` reports a size other than the one
+    signed for one of the session's keys, else None. Sizes are what the
+    storage quota is charged by, so they can't be under-reported.
+    """
+    if session is None:
+        return None
+    for key_field, size_field in (('image_key', 'size_bytes'), ('thumbnail_key', 'thumb_size_bytes')):
+        key = data.get(key_field)
+        if key in session.sizes and (data.get(size_field) or 0) != session.sizes[key]:
+            return {size_field: [f"Does not match the size signed for {key}."]}
+    return None
+
+
+def _photo_fields(data, event, size, thumb_size, etag=None) -> dict:
+    return {
+        'event': event,
+        'image_key': data['image_key'],
+        'thumbnail_key': data.get('thumbnail_key') or None,
+        'original_name': data.get('original_name') or '',
+        'size_bytes': size,
+        'thumb_size_bytes': thumb_size,
+        'etag': etag or None,
+    }
+
+
+def _photo_result(photo) -> dict:
+    return {
+        "id": str(photo.id),
+        "image_key": photo.image_key,
+        "thumbnail_key": photo.thumbnail_key,
+        "size_bytes": photo.size_bytes,
+        "thumb_size_bytes": photo.thumb_size_bytes,
+    }
+
+
+def _head_photo(storage, data):
+    """
+    Storage checks for one registration: the image must exist and fit
+    MAX_BYTES (the caller deletes OVERSIZED objects); a missing thumbnail
+    counts as 0. No DB access, so it can run on any thread.
+    Returns (size, thumb_size, etag, error).
+    """
+    try:
+        image = storage.head(data['image_key'])
+    except Exception as e:
+        return 0, 0, None, f"Image object not found or not accessible: {e}"
+    if image.size > MAX_BYTES:
+        return 0, 0, None, OVERSIZED
+
+    thumb_size = 0
+    if data.get('thumbnail_key'):
+        try:
+            thumb_size = storage.head(data['thumbnail_key']).size
+        except Exception:
+            thumb_size = 0
+    return image.size, thumb_size, image.etag, None
+
+
+class StorageUsageView(APIView):
+    """
+    GET /api/storage/
+    The current user's stored bytes (originals, client thumbnails, derivatives)
+    against their plan's limit, with a per-event breakdown. Reads the
+    maintained rollups (subscriptions.StorageUsage, Event.storage_bytes), never
+    the photo rows.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        usage = StorageUsage.objects.select_related('user__subscription').filter(user=request.user).first()
+        if usage is None:
+            usage = StorageUsage(user=request.user)
+        sub = getattr(usage.user, 'subscription', None)
+        limit = sub.storage_limit if sub else PLAN_STORAGE_LIMITS[Plan.FREE]
+        events = (
+            Event.objects.filter(customer__owner=request.user)
+            .order_by('-storage_bytes', '-created_at')
+            .values('id', 'name', 'photos_count', 'storage_bytes')
+        )
         return Response({
-            "id": str(photo.id),
-            "image_key": photo.image_key,
-            "thumbnail_key": photo.thumbnail_key,
-            "size_bytes": photo.size_bytes,
-            "thumb_size_bytes": photo.thumb_size_bytes,
-        }, status=status.HTTP_201_CREATED)
+            "photo_bytes": usage.photo_bytes,
+            "thumbnail_bytes": usage.thumbnail_bytes,
+            "derivative_bytes": usage.derivative_bytes,
+            "total_bytes": usage.total_bytes,
+            "limit_bytes": limit,
+            "remaining_bytes": max(limit - usage.total_bytes, 0),
+            "events": list(events),
+        })
 
 
 class ShareLinkViewSet(OwnerScopedMixin, viewsets.ModelViewSet):
@@ -138,4 +658,144 @@ class ShareLinkViewSet(OwnerScopedMixin, viewsets.ModelViewSet):
         sl = self.get_object()
         hours = int(request.data.get('hours', 24))
         sl.refresh(hours=hours)
-        return Response(self.get_serializer(sl).data, status=status.HTTP_200_OK)
\ No newline at end of file
+        return Response(self.get_serializer(sl).data, status=status.HTTP_200_OK)
+
+
+class ShareLinkMixin:
+    """
+    Public (unauthenticated) access through ShareLink.token.
+    The token is resolved from cache, so it costs no query on warm paths.
+    """
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def get_share_link(self) -> ShareLink:
+        if not hasattr(self, '_share_link'):
+            self._share_link = get_active_share_link(self.kwargs['token'])
+        if self._share_link is None:
+            raise Http404('Share link not found or expired.')
+        return self._share_link
+
+
+class ShareGalleryView(ShareLinkMixin, APIView):
+    """
+    GET /api/share/{token}/   -> event summary for the public gallery
+    """
+
+    def get(self, request, token):
+        link = self.get_share_link()
+        event = Event.objects.filter(pk=link.event_id).values(
+            'id', 'name', 'date', 'photos_count', 'selected_count', 'updated_at',
+            'customer__name', 'customer__owner__studio_name',
+        ).first()
+        if event is None:
+            raise Http404('Share link not found or expired.')
+        return conditional_get(
+            request,
+            parts=(*event.values(), link.can_select, link.expiry),
+            last_modified=event['updated_at'],
+            build=lambda: self._gallery(link, event),
+        )
+
+    def _gallery(self, link, event):
+        return Response({
+            "event": {
+                "id": str(event['id']),
+                "name": event['name'],
+                "date": event['date'],
+                "customer": event['customer__name'],
+                "studio": event['customer__owner__studio_name'],
+                "photos_count": event['photos_count'],
+                "selected_count": event['selected_count'],
+            },
+            "can_select": link.can_select,
+            "expiry": link.expiry,
+        })
+
+
+class SharePhotosView(ShareLinkMixin, generics.ListAPIView):
+    """
+    GET /api/share/{token}/photos/?selected=true|false&page_size=N&cursor=...
+    One values() query per page on the (event, created_at) index plus one for
+    the page's derivative sizes, with signed URLs; query count does not grow
+    with page size.
+    """
+    pagination_class = CreatedAtCursorPagination
+    filter_backends = []
+
+    def get_queryset(self):
+        link = self.get_share_link()
+        qs = Photo.objects.filter(event_id=link.event_id)
+        selected = self.request.query_params.get('selected')
+        if selected in ('true', 'false'):
+            qs = qs.filter(is_selected=selected == 'true')
+        return qs.values('id', 'image_key', 'thumbnail_key', 'original_name', 'is_selected', 'created_at')
+
+    def list(self, request, *args, **kwargs):
+        # Conditional on the event's validators (one primary-key lookup)
+        link = self.get_share_link()
+        v = _event_validators(Event.objects.all(), link.event_id)
+        if v is None:
+            raise Http404('Share link not found or expired.')
+        return conditional_get(
+            request,
+            parts=(*v, link.can_select),
+            last_modified=v[0],
+            build=self._page,
+        )
+
+    def _page(self):
+        page = self.paginate_queryset(self.get_queryset())
+        sizes = {}
+        for photo_id, size, key in PhotoDerivative.objects.filter(
+            photo_id__in=[row['id'] for row in page]
+        ).values_list('photo_id', 'size', 'key'):
+            sizes.setdefault(photo_id, {})[str(size)] = object_url(key)
+        return self.get_paginated_response([
+            {
+                "id": str(row['id']),
+                "original_name": row['original_name'],
+                "thumb_url": object_url(row['thumbnail_key'] or row['image_key']),
+                "image_url": object_url(row['image_key']),
+                "sizes": sizes.get(row['id'], {}),
+                "is_selected": row['is_selected'],
+                "created_at": row['created_at'],
+            }
+            for row in page
+        ])
+
+
+class ShareSelectionsView(ShareLinkMixin, APIView):
+    """
+    POST /api/share/{token}/selections/
+    Body: {"select": [photo ids], "deselect": [photo ids]}
+    """
+
+    def post(self, request, token):
+        link = self.get_share_link()
+        if not link.can_select:
+            return Response({"detail": "Selection is disabled for this link."}, status=status.HTTP_403_FORBIDDEN)
+
+        ser = SelectionSerializer(data=request.data)
+        ser.is_valid(raise_exception=True)
+        selected, deselected = apply_selection(
+            event_id=link.event_id,
+            select=ser.validated_data.get('select', []),
+            deselect=ser.validated_data.get('deselect', []),
+        )
+        return Response({
+            "selected": selected,
+            "deselected": deselected,
+            "selected_count": Event.objects.filter(pk=link.event_id).values_list('selected_count', flat=True).first(),
+        })
+
+
+class ShareDownloadView(ShareLinkMixin, APIView):
+    """
+    GET /api/share/{token}/download/   -> ZIP of the client's selected originals
+    """
+
+    def get(self, request, token):
+        link = self.get_share_link()
+        slug = Event.objects.filter(pk=link.event_id).values_list('slug', flat=True).first() or 'photos'
+        return _zip_response(Photo.objects.filter(event_id=link.event_id, is_selected=True), f'{slug}.zip')
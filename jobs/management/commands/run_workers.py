@@ -0,0 +1,61 @@
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from jobs import queue
+from jobs.worker import WorkerPool
+
+
+class Command(BaseCommand):
+    help = (
+        "Run background job workers against the jobs table (SELECT ... FOR UPDATE SKIP LOCKED, "
+        "safe to run on several hosts at once). Stops cleanly on SIGINT/SIGTERM."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=getattr(settings, 'JOBS_WORKER_CONCURRENCY', 4))
+        parser.add_argument('--kinds', default='', help='Comma-separated job kinds to run (default: all).')
+        parser.add_argument('--poll-interval', type=float, default=getattr(settings, 'JOBS_POLL_INTERVAL', 1.0))
+        parser.add_argument('--burst', action='store_true', help='Exit once no job is due.')
+        parser.add_argument('--stats-interval', type=float, default=60,
+                            help='Print per-kind throughput every N seconds (0 = never).')
+        parser.add_argument('--stats', action='store_true', help='Print queue stats from the database and exit.')
+
+    def handle(self, *args, **opts):
+        if opts['stats']:
+            self.print_queue_stats()
+            return
+
+        pool = WorkerPool(
+            concurrency=opts['concurrency'],
+            kinds=[k.strip() for k in opts['kinds'].split(',') if k.strip()],
+            poll_interval=opts['poll_interval'],
+            burst=opts['burst'],
+        )
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, lambda *_: pool.stop.set())
+
+        self.stdout.write(f'{pool.name}: {pool.concurrency} worker(s), kinds: {", ".join(pool.kinds or ["all"])}')
+        pool.run(on_tick=self.print_metrics, tick_interval=opts['stats_interval'])
+        self.print_metrics(pool.metrics.snapshot())
+
+    def print_metrics(self, snapshot):
+        for kind, row in sorted(snapshot.items()):
+            avg = f"{row['avg_ms']:.1f} ms" if row['avg_ms'] is not None else '-'
+            self.stdout.write(
+                f"{kind:>32}: {row['per_second']:8.2f} jobs/s  done {row['done']}  "
+                f"retried {row['retried']}  failed {row['failed']}  avg {avg}"
+            )
+
+    def print_queue_stats(self):
+        stats = queue.queue_stats()
+        if not stats:
+            self.stdout.write('No jobs.')
+        for kind, row in sorted(stats.items()):
+            avg = f"{row['avg_ms']:.1f} ms" if row['avg_ms'] is not None else '-'
+            self.stdout.write(
+                f"{kind:>32}: queued {row['queued']} (+{row['delayed']} delayed)  running {row['running']}  "
+                f"last 15 min: done {row['done']} failed {row['failed']} "
+                f"({row['per_minute']:.1f}/min, avg {avg})"
+            )
@@ -0,0 +1,59 @@
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+from common.models import TimeStampedUUIDModel
+
+
+class JobStatus(models.TextChoices):
+    QUEUED = 'queued', 'Queued'
+    RUNNING = 'running', 'Running'
+    DONE = 'done', 'Done'
+    FAILED = 'failed', 'Failed'
+
+
+PENDING = (JobStatus.QUEUED, JobStatus.RUNNING)
+
+
+class Job(TimeStampedUUIDModel):
+    """
+    One unit of background work, stored in the main database (see jobs.queue).
+    Workers claim due jobs with SELECT ... FOR UPDATE SKIP LOCKED, so any
+    number of them can poll the table without blocking each other.
+    Enqueued inside a transaction, a job only becomes visible when that
+    transaction commits (and disappears if it rolls back).
+    """
+    kind = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=JobStatus.choices, default=JobStatus.QUEUED)
+
+    # At most one queued/running job per key (finished ones don't count)
+    dedup_key = models.CharField(max_length=255, blank=True, null=True)
+
+    run_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    locked_at = models.DateTimeField(blank=True, null=True)
+    locked_by = models.CharField(max_length=100, blank=True, default='')
+    finished_at = models.DateTimeField(blank=True, null=True)
+    duration_ms = models.PositiveIntegerField(blank=True, null=True)  # of the last attempt
+    last_error = models.TextField(blank=True, default='')
+
+    class Meta:
+        indexes = [
+            # dequeue: due jobs in run_at order
+            models.Index(fields=['run_at'], name='job_queued_idx', condition=Q(status=JobStatus.QUEUED)),
+            # stale-lock sweeps
+            models.Index(fields=['locked_at'], name='job_running_idx', condition=Q(status=JobStatus.RUNNING)),
+            # metrics and purges
+            models.Index(fields=['kind', 'finished_at']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['dedup_key'], name='job_pending_dedup_key',
+                condition=Q(status__in=PENDING, dedup_key__isnull=False),
+            ),
+        ]
+
+    def __str__(self):
+        return f'Job {self.kind} {self.pk} ({self.status})'
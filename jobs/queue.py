@@ -0,0 +1,263 @@
+"""
+Background jobs stored in the main database; no broker needed.
+
+    # <app>/jobs.py (autodiscovered)
+    @register('photos.verify_uploads', max_attempts=5, backoff=30)
+    def verify_uploads(payload): ...
+
+    enqueue('photos.verify_uploads', {'ids': [...]}, dedup_key=f'verify:{event_id}')
+
+- Workers (manage.py run_workers) claim due jobs with
+  SELECT ... FOR UPDATE SKIP LOCKED and mark them running in the same
+  transaction, so concurrent workers never get the same job and never wait
+  on each other's row locks.
+- A failing job is retried with exponential backoff (with jitter) until
+  max_attempts, then kept as failed with its last traceback.
+- dedup_key: at most one queued/running job per key; enqueue() returns False
+  for a duplicate. Handlers must be idempotent (a job whose worker died is
+  re-run once its lock times out).
+- enqueue() inside a transaction is atomic with it: the job is only seen by
+  workers after commit and vanishes on rollback.
+"""
+import logging
+import random
+import threading
+import time
+import traceback
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Avg, Count, F, Q
+from django.utils import timezone
+
+from .models import Job, JobStatus
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Handler:
+    func: callable
+    max_attempts: int
+    backoff: float      # seconds before the first retry; doubles per attempt
+    max_backoff: float
+
+    def retry_delay(self, attempts: int) -> float:
+        delay = min(self.backoff * 2 ** (attempts - 1), self.max_backoff)
+        return delay * random.uniform(0.5, 1.0)
+
+
+_handlers = {}
+
+
+def register(kind: str, *, max_attempts: int = 5, backoff: float = 10, max_backoff: float = 3600):
+    """
+    Decorator registering func(payload) as the handler for `kind`.
+    """
+    def decorator(func):
+        _handlers[kind] = Handler(func, max_attempts, backoff, max_backoff)
+        return func
+    return decorator
+
+
+def get_handler(kind: str) -> Handler:
+    try:
+        return _handlers[kind]
+    except KeyError:
+        raise LookupError(f'No job handler registered for {kind!r}') from None
+
+
+def enqueue(kind: str, payload=None, *, dedup_key: str = None, delay: float = 0) -> bool:
+    """
+    Queue a job, due in `delay` seconds. Returns False if a job with the same
+    dedup_key is already queued or running.
+    """
+    handler = get_handler(kind)
+    job = Job(
+        kind=kind,
+        payload=payload or {},
+        dedup_key=dedup_key,
+        max_attempts=handler.max_attempts,
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )
+    if dedup_key is None:
+        job.save()
+        return True
+    try:
+        with transaction.atomic():
+            job.save()
+    except IntegrityError:
+        return False
+    return True
+
+
+def claim(worker: str, *, kinds=None, limit: int = 1) -> list:
+    """
+    Take up to `limit` due jobs for `worker`; they are returned as running.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        qs = Job.objects.filter(status=JobStatus.QUEUED, run_at__lte=now)
+        if kinds:
+            qs = qs.filter(kind__in=kinds)
+        jobs = list(qs.order_by('run_at').select_for_update(skip_locked=True)[:limit])
+        if not jobs:
+            return []
+        Job.objects.filter(pk__in=[job.pk for job in jobs]).update(
+            status=JobStatus.RUNNING, locked_at=now, locked_by=worker,
+            attempts=F('attempts') + 1, updated_at=now,
+        )
+    for job in jobs:
+        job.status, job.locked_at, job.locked_by = JobStatus.RUNNING, now, worker
+        job.attempts += 1
+    return jobs
+
+
+def run(job: Job, metrics=None) -> bool:
+    """
+    Run a claimed job and record the outcome. Returns True on success.
+    Outcomes are only written while the job is still locked by its worker,
+    so a job re-queued by requeue_stale() isn't overwritten.
+    """
+    start = time.perf_counter()
+    handler = _handlers.get(job.kind)
+    try:
+        get_handler(job.kind).func(job.payload)
+    except Exception:
+        elapsed = time.perf_counter() - start
+        error = traceback.format_exc()
+        retry = handler is not None and job.attempts < job.max_attempts
+        now = timezone.now()
+        fields = {'duration_ms': int(elapsed * 1000), 'last_error': error[-4000:], 'locked_at': None, 'updated_at': now}
+        if retry:
+            fields.update(status=JobStatus.QUEUED, run_at=now + timedelta(seconds=handler.retry_delay(job.attempts)))
+        else:
+            fields.update(status=JobStatus.FAILED, finished_at=now)
+        _finish(job, fields)
+        logger.warning('job %s %s failed (attempt %s/%s%s)', job.kind, job.pk, job.attempts, job.max_attempts,
+                       ', will retry' if retry else '', exc_info=True)
+        if metrics is not None:
+            metrics.record(job.kind, 'retried' if retry else 'failed', elapsed)
+        return False
+
+    elapsed = time.perf_counter() - start
+    now = timezone.now()
+    _finish(job, {
+        'status': JobStatus.DONE, 'finished_at': now, 'duration_ms': int(elapsed * 1000),
+        'locked_at': None, 'updated_at': now,
+    })
+    if metrics is not None:
+        metrics.record(job.kind, 'done', elapsed)
+    return True
+
+
+def _finish(job, fields):
+    Job.objects.filter(pk=job.pk, status=JobStatus.RUNNING, locked_by=job.locked_by).update(**fields)
+
+
+def lock_timeout() -> timedelta:
+    return timedelta(seconds=getattr(settings, 'JOBS_LOCK_TIMEOUT_SECONDS', 600))
+
+
+def requeue_stale(timeout: timedelta = None) -> int:
+    """
+    Jobs left running by a dead worker: re-queue them, or fail them if they
+    used up their attempts. Returns how many were touched.
+    """
+    now = timezone.now()
+    stale = Job.objects.filter(status=JobStatus.RUNNING, locked_at__lt=now - (timeout or lock_timeout()))
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status=JobStatus.FAILED, finished_at=now, locked_at=None, last_error='Worker lock timed out.', updated_at=now,
+    )
+    requeued = stale.update(status=JobStatus.QUEUED, run_at=now, locked_at=None, updated_at=now)
+    return failed + requeued
+
+
+def purge_finished(older_than: timedelta = None, batch_size: int = 5000) -> int:
+    """
+    Delete done/failed jobs finished before `older_than` ago (default
+    JOBS_KEEP_FINISHED_SECONDS). Returns rows deleted.
+    """
+    keep = older_than or timedelta(seconds=getattr(settings, 'JOBS_KEEP_FINISHED_SECONDS', 7 * 24 * 3600))
+    cutoff = timezone.now() - keep
+    deleted = 0
+    while True:
+        pks = list(
+            Job.objects.filter(status__in=(JobStatus.DONE, JobStatus.FAILED), finished_at__lt=cutoff)
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        if not pks:
+            return deleted
+        deleted += Job.objects.filter(pk__in=pks).delete()[0]
+
+
+def queue_stats(window: timedelta = timedelta(minutes=15)) -> dict:
+    """
+    Per kind: queued (due / delayed), running, and for jobs finished within
+    `window`: done, failed, throughput (jobs/min) and mean duration.
+    """
+    now = timezone.now()
+    stats = defaultdict(lambda: {
+        'queued': 0, 'delayed': 0, 'running': 0, 'done': 0, 'failed': 0, 'per_minute': 0.0, 'avg_ms': None,
+    })
+    pending = (
+        Job.objects.filter(status__in=(JobStatus.QUEUED, JobStatus.RUNNING)).order_by()
+        .values('kind')
+        .annotate(
+            queued=Count('pk', filter=Q(status=JobStatus.QUEUED, run_at__lte=now)),
+            delayed=Count('pk', filter=Q(status=JobStatus.QUEUED, run_at__gt=now)),
+            running=Count('pk', filter=Q(status=JobStatus.RUNNING)),
+        )
+    )
+    for row in pending:
+        stats[row.pop('kind')].update(row)
+    finished = (
+        Job.objects.filter(status__in=(JobStatus.DONE, JobStatus.FAILED), finished_at__gte=now - window).order_by()
+        .values('kind')
+        .annotate(
+            done=Count('pk', filter=Q(status=JobStatus.DONE)),
+            failed=Count('pk', filter=Q(status=JobStatus.FAILED)),
+            avg_ms=Avg('duration_ms'),
+        )
+    )
+    for row in finished:
+        kind = row.pop('kind')
+        stats[kind].update(row, per_minute=(row['done'] + row['failed']) / (window.total_seconds() / 60))
+    return dict(stats)
+
+
+class Metrics:
+    """
+    In-process counters of a worker pool, per job kind (thread-safe).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.monotonic()
+        self._kinds = defaultdict(lambda: {'done': 0, 'retried': 0, 'failed': 0, 'seconds': 0.0})
+
+    def record(self, kind: str, outcome: str, seconds: float):
+        with self._lock:
+            row = self._kinds[kind]
+            row[outcome] += 1
+            row['seconds'] += seconds
+
+    def snapshot(self) -> dict:
+        """
+        {kind: {done, retried, failed, seconds, per_second, avg_ms}} since start.
+        """
+        with self._lock:
+            elapsed = max(time.monotonic() - self.started, 1e-9)
+            out = {}
+            for kind, row in self._kinds.items():
+                runs = row['done'] + row['retried'] + row['failed']
+                out[kind] = {
+                    **row,
+                    'per_second': row['done'] / elapsed,
+                    'avg_ms': row['seconds'] * 1000 / runs if runs else None,
+                }
+            return out
@@ -0,0 +1,102 @@
+import threading
+from datetime import timedelta
+
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from unittest import skipUnless
+
+from . import queue
+from .models import Job, JobStatus
+from .worker import WorkerPool
+
+
+calls = []
+calls_lock = threading.Lock()
+
+
+@queue.register('tests.record')
+def record(payload):
+    with calls_lock:
+        calls.append(payload['n'])
+
+
+@queue.register('tests.flaky', max_attempts=2, backoff=60)
+def flaky(payload):
+    raise RuntimeError('boom')
+
+
+class QueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_dedup_key_allows_one_pending_job(self):
+        self.assertTrue(queue.enqueue('tests.record', {'n': 1}, dedup_key='k'))
+        self.assertFalse(queue.enqueue('tests.record', {'n': 2}, dedup_key='k'))
+        job, = queue.claim('w')
+        self.assertFalse(queue.enqueue('tests.record', {'n': 3}, dedup_key='k'))  # running counts too
+        queue.run(job)
+        self.assertTrue(queue.enqueue('tests.record', {'n': 4}, dedup_key='k'))
+        self.assertEqual(calls, [1])
+
+    def test_unknown_kind(self):
+        with self.assertRaises(LookupError):
+            queue.enqueue('tests.nope')
+
+    def test_delayed_jobs_are_not_claimed(self):
+        queue.enqueue('tests.record', {'n': 1}, delay=60)
+        self.assertEqual(queue.claim('w'), [])
+
+    def test_retry_with_backoff_then_fail(self):
+        queue.enqueue('tests.flaky')
+        job, = queue.claim('w')
+        metrics = queue.Metrics()
+        with self.assertLogs('jobs.queue', 'WARNING'):
+            self.assertFalse(queue.run(job, metrics))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (JobStatus.QUEUED, 1))
+        self.assertGreaterEqual(job.run_at, timezone.now() + timedelta(seconds=29))
+        self.assertIn('boom', job.last_error)
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        job, = queue.claim('w')
+        with self.assertLogs('jobs.queue', 'WARNING'):
+            queue.run(job, metrics)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (JobStatus.FAILED, 2))
+        snapshot = metrics.snapshot()['tests.flaky']
+        self.assertEqual((snapshot['retried'], snapshot['failed']), (1, 1))
+
+    def test_requeue_stale(self):
+        queue.enqueue('tests.record', {'n': 1})
+        job, = queue.claim('dead-worker')
+        Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(queue.requeue_stale(timedelta(minutes=10)), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, JobStatus.QUEUED)
+
+        # the dead worker finishing late doesn't clobber the re-queued job
+        queue.run(Job(pk=job.pk, kind='tests.record', payload={'n': 1}, locked_by='dead-worker', attempts=1))
+        job.refresh_from_db()
+        self.assertEqual(job.status, JobStatus.QUEUED)
+
+    def test_queue_stats(self):
+        queue.enqueue('tests.record', {'n': 1})
+        queue.enqueue('tests.record', {'n': 2}, delay=60)
+        queue.run(queue.claim('w')[0])
+        stats = queue.queue_stats()['tests.record']
+        self.assertEqual((stats['queued'], stats['delayed'], stats['done']), (0, 1, 1))
+
+
+@skipUnless(connection.vendor == 'postgresql', 'SKIP LOCKED needs PostgreSQL')
+class WorkerPoolTests(TransactionTestCase):
+    def test_each_job_runs_once(self):
+        calls.clear()
+        Job.objects.bulk_create([
+            Job(kind='tests.record', payload={'n': n}) for n in range(200)
+        ])
+        pool = WorkerPool(concurrency=8, burst=True, poll_interval=0.01)
+        pool.run()
+        self.assertEqual(sorted(calls), list(range(200)))
+        self.assertEqual(Job.objects.filter(status=JobStatus.DONE).count(), 200)
+        self.assertEqual(pool.metrics.snapshot()['tests.record']['done'], 200)
@@ -0,0 +1,83 @@
+import logging
+import os
+import socket
+import threading
+import time
+
+from django.db import close_old_connections, connections
+
+from . import queue
+
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerPool:
+    """
+    `concurrency` threads claiming and running jobs (each on its own DB
+    connection). Idle threads sleep `poll_interval` between polls. The main
+    thread re-queues jobs of dead workers and purges old finished jobs.
+    With burst=True the pool exits once no job is due.
+    """
+
+    def __init__(self, *, concurrency: int = 4, kinds=None, poll_interval: float = 1.0, burst: bool = False):
+        self.concurrency = concurrency
+        self.kinds = kinds or None
+        self.poll_interval = poll_interval
+        self.burst = burst
+        self.name = f'{socket.gethostname()}:{os.getpid()}'
+        self.metrics = queue.Metrics()
+        self.stop = threading.Event()
+
+    def _loop(self, n: int):
+        worker = f'{self.name}:{n}'
+        try:
+            while not self.stop.is_set():
+                close_old_connections()
+                jobs = queue.claim(worker, kinds=self.kinds)
+                if not jobs:
+                    if self.burst:
+                        return
+                    self.stop.wait(self.poll_interval)
+                    continue
+                for job in jobs:
+                    queue.run(job, self.metrics)
+        except Exception:
+            logger.exception('job worker %s crashed', worker)
+        finally:
+            connections.close_all()
+
+    def run(self, *, housekeeping_interval: float = 60, on_tick=None, tick_interval: float = None):
+        threads = [
+            threading.Thread(target=self._loop, args=(n,), name=f'job-worker-{n}', daemon=True)
+            for n in range(self.concurrency)
+        ]
+        for t in threads:
+            t.start()
+
+        next_housekeeping = next_tick = time.monotonic()
+        try:
+            while any(t.is_alive() for t in threads):
+                now = time.monotonic()
+                if now >= next_housekeeping:
+                    self.housekeeping()
+                    next_housekeeping = now + housekeeping_interval
+                if on_tick and tick_interval and now >= next_tick + tick_interval:
+                    on_tick(self.metrics.snapshot())
+                    next_tick = now
+                if self.stop.wait(0.5):
+                    break
+        finally:
+            self.stop.set()
+            for t in threads:
+                t.join()
+            connections.close_all()
+
+    def housekeeping(self):
+        try:
+            stale = queue.requeue_stale()
+            if stale:
+                logger.warning('re-queued %s job(s) with expired worker locks', stale)
+            queue.purge_finished()
+        except Exception:
+            logger.exception('job housekeeping failed')
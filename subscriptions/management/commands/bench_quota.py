@@ -0,0 +1,95 @@
+import statistics
+import threading
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+
+from subscriptions.models import Subscription, Plan
+from subscriptions import quota
+
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare upload-quota throughput of SELECT ... FOR UPDATE (lock_for_user + atomic_bump) "
+        "against the conditional-UPDATE engine (subscriptions.quota) with N parallel writers "
+        "hammering one subscription. Creates and removes a throwaway user."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=32)
+        parser.add_argument('--ops', type=int, default=90, help='Reservations per writer.')
+
+    def handle(self, *args, **opts):
+        writers, ops = opts['writers'], opts['ops']
+        user = User.objects.create_user(f'bench-quota-{uuid.uuid4().hex[:8]}@example.invalid', name='Bench')
+        Subscription.objects.filter(user=user).update(
+            plan=Plan.PRO,
+            stripe_customer_id=f'bench_{user.pk.hex}',
+            stripe_subscription_id=f'bench_{user.pk.hex}',
+        )
+        sub = Subscription.objects.get(user=user)
+
+        def lock_and_bump():
+            with transaction.atomic():
+                locked = Subscription.lock_for_user(user.pk)
+                if not locked.can_upload(1):
+                    return False
+                Subscription.atomic_bump(locked.pk, 1)
+                return True
+
+        def conditional_update():
+            return quota.reserve(user.pk, 1)
+
+        try:
+            self.stdout.write(f'{writers} writers x {ops} reservations, limit {sub.upload_limit}')
+            for name, op in (('select_for_update', lock_and_bump), ('conditional_update', conditional_update)):
+                Subscription.objects.filter(pk=sub.pk).update(photos_used_cached=0)
+                self.report(name, *self.run(op, writers, ops), sub)
+        finally:
+            user.delete()
+
+    def run(self, op, writers, ops):
+        latencies, granted = [], []
+        lock = threading.Lock()
+        barrier = threading.Barrier(writers + 1)
+
+        def writer():
+            mine, ok = [], 0
+            try:
+                barrier.wait()
+                for _ in range(ops):
+                    t0 = time.perf_counter()
+                    ok += bool(op())
+                    mine.append(time.perf_counter() - t0)
+            finally:
+                connections.close_all()
+                with lock:
+                    latencies.extend(mine)
+                    granted.append(ok)
+
+        threads = [threading.Thread(target=writer) for _ in range(writers)]
+        for t in threads:
+            t.start()
+        barrier.wait()
+        start = time.perf_counter()
+        for t in threads:
+            t.join()
+        return time.perf_counter() - start, latencies, sum(granted)
+
+    def report(self, name, elapsed, latencies, granted, sub):
+        latencies.sort()
+        used = Subscription.objects.get(pk=sub.pk).photos_used_cached
+        p50 = statistics.median(latencies) * 1000
+        p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+        self.stdout.write(
+            f'{name:>20}: {len(latencies) / elapsed:8.0f} ops/s  '
+            f'p50 {p50:6.2f} ms  p99 {p99:6.2f} ms  granted {granted}  counter {used}'
+        )
+        if granted != used:
+            self.stderr.write(self.style.ERROR(f'{name}: counter drifted ({granted} granted, {used} stored)'))
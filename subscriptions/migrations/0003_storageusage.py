@@ -0,0 +1,43 @@
+# Generated by Django 5.2.6 on 2026-10-17 01:30
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+def create_rows(apps, schema_editor):
+    # Empty rollups for existing users; `manage.py reconcile_counters` fills them in
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    StorageUsage = apps.get_model('subscriptions', 'StorageUsage')
+    StorageUsage.objects.bulk_create(
+        [StorageUsage(user_id=pk) for pk in User.objects.values_list('pk', flat=True)],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscriptions', '0002_subscription_photos_used_cached'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StorageUsage',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('photo_bytes', models.PositiveBigIntegerField(default=0)),
+                ('thumbnail_bytes', models.PositiveBigIntegerField(default=0)),
+                ('derivative_bytes', models.PositiveBigIntegerField(default=0)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='storage_usage', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.RunPython(create_rows, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,13 @@
+import time
+
 from django.db import models
-from django.db.models import Q, F
+from django.db.models import Q, F, Case, When, Value, IntegerField, BigIntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
 from django.utils import timezone
 from django.core.exceptions import ValidationError
 from django.conf import settings
 
+from common.metrics import QUOTA_LOCK_WAIT
 from common.models import TimeStampedUUIDModel
 
 
@@ -21,6 +25,15 @@ PLAN_UPLOAD_LIMITS = {
     Plan.PRO: 3000,
 }
 
+GB = 1000 ** 3
+
+# Bytes stored (originals, client thumbnails and server-side derivatives)
+PLAN_STORAGE_LIMITS = {
+    Plan.FREE: 2 * GB,
+    Plan.BASIC: 25 * GB,
+    Plan.PRO: 100 * GB,
+}
+
 class SubscriptionStatus(models.TextChoices):
     ACTIVE = 'active', 'Active'
     PAST_DUE = 'past_due', 'Past due'
@@ -80,6 +93,10 @@ class Subscription(TimeStampedUUIDModel):
     def upload_limit(self) -> int:
         return PLAN_UPLOAD_LIMITS[self.plan]
 
+    @property
+    def storage_limit(self) -> int:
+        return PLAN_STORAGE_LIMITS[self.plan]
+
     @property
     def is_current(self) -> bool:
         """
@@ -107,8 +124,12 @@ class Subscription(TimeStampedUUIDModel):
     def lock_for_user(cls, user_id):
         """
         Row-lock the subscription for this user (within an outer transaction).
+        The wait for the lock is reported as photopick_quota_lock_wait_seconds.
         """
-        return cls.objects.select_for_update().get(user_id=user_id)
+        start = time.perf_counter()
+        sub = cls.objects.select_for_update().get(user_id=user_id)
+        QUOTA_LOCK_WAIT.labels('subscription_lock').observe(time.perf_counter() - start)
+        return sub
 
     @classmethod
     def atomic_bump(cls, pk, delta: int):
@@ -117,6 +138,36 @@ class Subscription(TimeStampedUUIDModel):
         """
         cls.objects.filter(pk=pk).update(photos_used_cached=F('photos_used_cached') + delta)
 
+    @classmethod
+    def try_reserve(cls, user_id, n: int = 1) -> bool:
+        """
+        Lock-free quota check + bump in one conditional UPDATE:
+            SET photos_used_cached = photos_used_cached + n
+            WHERE user_id = ... AND photos_used_cached + n <= <plan limit>
+        Returns False (and changes nothing) if the plan has no room for n more.
+        """
+        limit = Case(
+            *[When(plan=plan, then=Value(value)) for plan, value in PLAN_UPLOAD_LIMITS.items()],
+            output_field=IntegerField(),
+        )
+        start = time.perf_counter()
+        updated = (
+            cls.objects
+            .filter(user_id=user_id, photos_used_cached__lte=limit - n)
+            .update(photos_used_cached=F('photos_used_cached') + n)
+        )
+        QUOTA_LOCK_WAIT.labels('subscription').observe(time.perf_counter() - start)
+        return bool(updated)
+
+    @classmethod
+    def release(cls, user_id, n: int = 1):
+        """
+        Give back n slots taken by try_reserve(); never drops below zero.
+        """
+        cls.objects.filter(user_id=user_id).update(
+            photos_used_cached=Greatest(F('photos_used_cached') - n, Value(0))
+        )
+
 
     def clean(self):
         # App-level validation mirroring DB constraints, gives nicer messages
@@ -131,6 +182,76 @@ class Subscription(TimeStampedUUIDModel):
         return f'{self.user} · {self.plan} · {self.status}'
 
 
+class StorageUsage(TimeStampedUUIDModel):
+    """
+    Per-user rollup of stored bytes, charged in the photo insert transaction
+    (customers.services.create_photos_bulk) and kept in step with
+    deletes and derivative writes (customers.services, customers.derivatives);
+    the per-event breakdown is Event.storage_bytes.
+    Client thumbnails that are really a derivative are counted once, as a
+    derivative. Drift is fixed by `manage.py reconcile_counters`.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='storage_usage')
+    photo_bytes = models.PositiveBigIntegerField(default=0)
+    thumbnail_bytes = models.PositiveBigIntegerField(default=0)
+    derivative_bytes = models.PositiveBigIntegerField(default=0)
+
+    @property
+    def total_bytes(self) -> int:
+        return self.photo_bytes + self.thumbnail_bytes + self.derivative_bytes
+
+    @classmethod
+    def try_add(cls, user_id, *, photo: int = 0, thumbnail: int = 0) -> bool:
+        """
+        Quota check + bump in one conditional UPDATE (like
+        Subscription.try_reserve), against the owner's plan byte limit:
+            SET photo_bytes = photo_bytes + ..., ...
+            WHERE user_id = ... AND <total> + n <= <limit of the user's plan>
+        Returns False (and changes nothing) if it doesn't fit.
+        """
+        n = photo + thumbnail
+        limit = Coalesce(
+            Subquery(
+                Subscription.objects.filter(user_id=OuterRef('user_id')).annotate(limit=Case(
+                    *[When(plan=plan, then=Value(value)) for plan, value in PLAN_STORAGE_LIMITS.items()],
+                    output_field=BigIntegerField(),
+                )).values('limit')[:1]
+            ),
+            Value(PLAN_STORAGE_LIMITS[Plan.FREE]),
+            output_field=BigIntegerField(),
+        )
+        start = time.perf_counter()
+        updated = (
+            cls.objects
+            .alias(total=F('photo_bytes') + F('thumbnail_bytes') + F('derivative_bytes'), limit=limit)
+            .filter(user_id=user_id, total__lte=F('limit') - n)
+            .update(
+                photo_bytes=F('photo_bytes') + photo,
+                thumbnail_bytes=F('thumbnail_bytes') + thumbnail,
+                updated_at=timezone.now(),
+            )
+        )
+        QUOTA_LOCK_WAIT.labels('storage_usage').observe(time.perf_counter() - start)
+        return bool(updated)
+
+    @classmethod
+    def adjust(cls, user_id, *, photo: int = 0, thumbnail: int = 0, derivative: int = 0):
+        """
+        Unconditional F() adjustment (deletes, derivatives, size corrections);
+        no field drops below zero.
+        """
+        changes = {
+            field: Greatest(F(field) + delta, Value(0))
+            for field, delta in (('photo_bytes', photo), ('thumbnail_bytes', thumbnail), ('derivative_bytes', derivative))
+            if delta
+        }
+        if changes:
+            cls.objects.filter(user_id=user_id).update(**changes, updated_at=timezone.now())
+
+    def __str__(self):
+        return f'{self.user} · {self.total_bytes} bytes'
+
+
 class ReferralCredit(TimeStampedUUIDModel):
     referrer_org = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name='referral_credits_earned'
@@ -0,0 +1,120 @@
+"""
+Upload quota engine.
+
+Slots are reserved with Subscription.try_reserve(), a single conditional
+UPDATE, instead of SELECT ... FOR UPDATE + check + bump. Outside a
+transaction the reservation commits immediately, so parallel upload workers
+for one user never wait on each other for longer than that one statement.
+"""
+from contextlib import contextmanager
+
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+
+from .models import PLAN_STORAGE_LIMITS, Plan, StorageUsage, Subscription
+
+
+class QuotaExceeded(ValidationError):
+    pass
+
+
+def reserve(user_id, n: int = 1) -> bool:
+    """
+    Reserve n upload slots for the user. Returns whether it succeeded.
+    """
+    if n <= 0:
+        return True
+    return Subscription.try_reserve(user_id, n)
+
+
+def reserve_up_to(user_id, n: int) -> int:
+    """
+    Reserve as many of n slots as still fit; returns how many were reserved.
+    Costs one statement when all n fit (the common case).
+    """
+    granted = n
+    for _ in range(3):
+        if granted <= 0 or reserve(user_id, granted):
+            return max(granted, 0)
+        # Partial fit: look at what's left and retry (another writer may race us)
+        remaining = Subscription.objects.get(user_id=user_id).photos_remaining
+        granted = min(granted, remaining)
+    return 0
+
+
+def release(user_id, n: int = 1) -> None:
+    if n > 0:
+        Subscription.release(user_id, n)
+
+
+@contextmanager
+def reservation(user_id, n: int = 1, partial: bool = False):
+    """
+    Reserve n slots for the duration of the block and yield how many were
+    reserved. Raises QuotaExceeded if they don't fit, unless partial=True, in
+    which case as many as fit are reserved (possibly 0).
+
+    If the block raises, the slots are given back:
+    - inside an outer transaction, by rolling back a savepoint around the
+      reservation and the block;
+    - in autocommit mode, with a compensating release() (the reservation
+      itself was already committed so other writers weren't blocked).
+    """
+    def take():
+        granted = reserve_up_to(user_id, n) if partial else (n if reserve(user_id, n) else 0)
+        if not partial and n > 0 and not granted:
+            raise QuotaExceeded({'image_key': 'Upload limit reached for your plan.'})
+        return granted
+
+    if connection.in_atomic_block:
+        with transaction.atomic():
+            yield take()
+        return
+
+    granted = take()
+    try:
+        yield granted
+    except BaseException:
+        release(user_id, granted)
+        raise
+
+
+def storage_remaining(user_id) -> int:
+    """
+    Bytes the user may still store under their plan.
+    """
+    usage = StorageUsage.objects.filter(user_id=user_id).first()
+    sub = Subscription.objects.filter(user_id=user_id).only('plan').first()
+    limit = sub.storage_limit if sub else PLAN_STORAGE_LIMITS[Plan.FREE]
+    return max(limit - (usage.total_bytes if usage else 0), 0)
+
+
+def charge_storage(user_id, sizes, *, partial: bool = False) -> int:
+    """
+    Add new photos to the user's stored bytes, if they fit the plan.
+    `sizes` are (photo_bytes, thumbnail_bytes) per photo. Returns how many
+    photos (a prefix of `sizes`) were charged: all of them, or with
+    partial=True as many as fit (possibly 0); otherwise raises QuotaExceeded.
+    Costs one statement when everything fits (the common case). Call it in
+    the transaction that inserts the photos, so the charge commits (or rolls
+    back) with them.
+    """
+    n = len(sizes)
+    for _ in range(3):
+        if n <= 0:
+            return 0
+        if StorageUsage.try_add(
+            user_id, photo=sum(s[0] for s in sizes[:n]), thumbnail=sum(s[1] for s in sizes[:n]),
+        ):
+            return n
+        if not partial:
+            raise QuotaExceeded({'image_key': 'Storage limit reached for your plan.'})
+        # Partial fit: take the prefix that fits what's left (another writer may race us)
+        room, fits = storage_remaining(user_id), 0
+        for photo, thumbnail in sizes[:n]:
+            room -= photo + thumbnail
+            if room < 0:
+                break
+            fits += 1
+        n = fits
+    return 0
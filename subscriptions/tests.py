@@ -1,3 +1,125 @@
-from django.test import TestCase
+import threading
 
-# Create your tests here.
+from django.db import connection, connections, transaction
+from django.test import TestCase, TransactionTestCase
+from unittest import skipUnless
+
+from accounts.models import User
+from .models import Subscription, StorageUsage, PLAN_STORAGE_LIMITS, PLAN_UPLOAD_LIMITS, Plan
+from . import quota
+
+
+class QuotaEngineTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('owner@example.com', 'pass12345', name='Owner')
+
+    def used(self):
+        return Subscription.objects.get(user=self.user).photos_used_cached
+
+    def test_reserve_up_to_limit(self):
+        limit = PLAN_UPLOAD_LIMITS[Plan.FREE]
+        self.assertTrue(quota.reserve(self.user.id, limit - 1))
+        self.assertFalse(quota.reserve(self.user.id, 2))
+        self.assertTrue(quota.reserve(self.user.id, 1))
+        self.assertFalse(quota.reserve(self.user.id, 1))
+        self.assertEqual(self.used(), limit)
+
+    def test_release_never_goes_negative(self):
+        quota.reserve(self.user.id, 3)
+        quota.release(self.user.id, 5)
+        self.assertEqual(self.used(), 0)
+
+    def test_reservation_rolls_back_on_error(self):
+        with self.assertRaises(RuntimeError):
+            with quota.reservation(self.user.id, 10):
+                raise RuntimeError
+        self.assertEqual(self.used(), 0)
+
+        with quota.reservation(self.user.id, 10):
+            pass
+        self.assertEqual(self.used(), 10)
+
+    def test_reservation_over_limit_raises(self):
+        with self.assertRaises(quota.QuotaExceeded):
+            with quota.reservation(self.user.id, PLAN_UPLOAD_LIMITS[Plan.FREE] + 1):
+                pass
+        self.assertEqual(self.used(), 0)
+
+
+class StorageQuotaTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('owner@example.com', 'pass12345', name='Owner')
+        self.limit = PLAN_STORAGE_LIMITS[Plan.FREE]
+
+    def stored(self):
+        return StorageUsage.objects.get(user=self.user).total_bytes
+
+    def test_charge_up_to_limit(self):
+        self.assertEqual(quota.charge_storage(self.user.id, [(self.limit - 10, 5)]), 1)
+        with self.assertRaises(quota.QuotaExceeded):
+            quota.charge_storage(self.user.id, [(4, 2)])
+        self.assertEqual(quota.charge_storage(self.user.id, [(4, 1)]), 1)
+        self.assertEqual(self.stored(), self.limit)
+
+    def test_partial_charges_the_prefix_that_fits(self):
+        StorageUsage.adjust(self.user.id, derivative=self.limit - 25)
+        self.assertEqual(quota.charge_storage(self.user.id, [(10, 0), (10, 0), (10, 0)], partial=True), 2)
+        self.assertEqual(quota.storage_remaining(self.user.id), 5)
+
+    def test_plan_limit_applies(self):
+        Subscription.objects.filter(user=self.user).update(
+            plan=Plan.PRO, stripe_customer_id='cus_1', stripe_subscription_id='sub_1',
+        )
+        self.assertEqual(quota.charge_storage(self.user.id, [(self.limit + 1, 0)]), 1)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'needs real row-level concurrency')
+class QuotaConcurrencyTests(TransactionTestCase):
+    WRITERS = 32
+
+    def test_parallel_writers_never_exceed_limit(self):
+        user = User.objects.create_user('busy@example.com', 'pass12345', name='Busy')
+        limit = PLAN_UPLOAD_LIMITS[Plan.FREE]
+        granted = []
+        barrier = threading.Barrier(self.WRITERS)
+
+        def writer():
+            try:
+                barrier.wait()
+                for _ in range(limit // self.WRITERS + 2):
+                    granted.append(quota.reserve(user.id, 1))
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=writer) for _ in range(self.WRITERS)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(sum(granted), limit)
+        self.assertEqual(Subscription.objects.get(user=user).photos_used_cached, limit)
+
+    def test_parallel_rollbacks_release_slots(self):
+        user = User.objects.create_user('flaky@example.com', 'pass12345', name='Flaky')
+        barrier = threading.Barrier(self.WRITERS)
+
+        def writer(i):
+            try:
+                barrier.wait()
+                with transaction.atomic():
+                    with quota.reservation(user.id, 1):
+                        if i % 2:
+                            raise RuntimeError
+            except RuntimeError:
+                pass
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=writer, args=(i,)) for i in range(self.WRITERS)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(Subscription.objects.get(user=user).photos_used_cached, self.WRITERS // 2)
@@ -32,9 +32,12 @@ INSTALLED_APPS = [
     'common.apps.CommonConfig',
     'subscriptions.apps.SubscriptionsConfig',
     'customers.apps.CustomersConfig',
+    'jobs.apps.JobsConfig',
 ]
 
 MIDDLEWARE = [
+    'common.metrics.MetricsMiddleware',
+    'common.instrumentation.RequestInstrumentationMiddleware',  # no-op unless INSTRUMENTATION_ENABLED
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -136,7 +139,7 @@ REST_FRAMEWORK = {
 
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.CachedJWTAuthentication',
     ),
 
     'DEFAULT_PERMISSION_CLASSES': (
@@ -149,7 +152,8 @@ REST_FRAMEWORK = {
         'rest_framework.filters.OrderingFilter',
     ),
 
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    # Page numbers by default; ?pagination=cursor for keyset paging (common/pagination.py)
+    'DEFAULT_PAGINATION_CLASS': 'common.pagination.HybridPagination',
     'PAGE_SIZE': 25,
 }
 
@@ -169,12 +173,29 @@ SIMPLE_JWT = {
     'BLACKLIST_AFTER_ROTATION': True,
 }
 
+# Django cache, used for the cached JWT users and share links. Their
+# invalidation (accounts.signals, share link revocation) only reaches the
+# other worker processes through a shared cache, so set REDIS_URL whenever
+# more than one process serves the API. Unset, each process has its own
+# in-memory cache and may serve a stale entry until its TTL runs out.
+REDIS_URL = config('REDIS_URL', default='')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        },
+    }
+
+# accounts.authentication.CachedJWTAuthentication: user + subscription snapshot TTL
+AUTH_USER_CACHE_SECONDS = 30
+
 
 DEFAULT_FILE_STORAGE = 'storages.backends.s3boto3.S3Boto3Storage'
 
-WASABI_ACCESS_KEY = config('WASABI_ACCESS_KEY')
-WASABI_SECRET_KEY = config('WASABI_SECRET_KEY')
-WASABI_BUCKET_NAME = config('WASABI_BUCKET_NAME')
+WASABI_ACCESS_KEY = config('WASABI_ACCESS_KEY', default='')
+WASABI_SECRET_KEY = config('WASABI_SECRET_KEY', default='')
+WASABI_BUCKET_NAME = config('WASABI_BUCKET_NAME', default='')
 
 # Wasabi endpoint (region-specific)
 WASABI_ENDPOINT = 'https://s3.us-east-1.wasabisys.com'
@@ -183,5 +204,50 @@ WASABI_REGION = 'us-east-1'  # change if you use a different region
 # If your bucket is public and you want to compute public URLs:
 WASABI_PUBLIC_BASE = f"{WASABI_ENDPOINT.rstrip('/')}/{WASABI_BUCKET_NAME}"
 
-AWS_QUERYSTRING_AUTH = False   # make URLs public, set True if you want signed URLs
+AWS_QUERYSTRING_AUTH = config('AWS_QUERYSTRING_AUTH', default=False, cast=bool)   # False: public URLs, True: signed URLs
+
+# Signed GET URLs (common/signed_urls.py): stable per window, valid for two windows
+SIGNED_URL_WINDOW_SECONDS = 6 * 3600
+SIGNED_URL_CACHE_SIZE = 50000
+SIGNED_URL_USE_DJANGO_CACHE = config('SIGNED_URL_USE_DJANGO_CACHE', default=False, cast=bool)
+
+SHARE_LINK_CACHE_SECONDS = 60  # cached token -> share link lookups
 AWS_DEFAULT_ACL = None         # required to avoid ACL warnings
+
+# Storage gateway (common/storage.py): one shared client per process.
+# Use STORAGE_BACKEND=local to run against the filesystem stand-in offline.
+STORAGE_BACKEND = config('STORAGE_BACKEND', default='s3')
+STORAGE_LOCAL_ROOT = config('STORAGE_LOCAL_ROOT', default=str(BASE_DIR / 'local_storage'))
+STORAGE_LOCAL_LATENCY_MS = config('STORAGE_LOCAL_LATENCY_MS', default=0, cast=int)
+STORAGE_MAX_POOL_CONNECTIONS = config('STORAGE_MAX_POOL_CONNECTIONS', default=32, cast=int)
+STORAGE_MAX_ATTEMPTS = config('STORAGE_MAX_ATTEMPTS', default=3, cast=int)
+STORAGE_CONNECT_TIMEOUT = config('STORAGE_CONNECT_TIMEOUT', default=5, cast=int)
+STORAGE_READ_TIMEOUT = config('STORAGE_READ_TIMEOUT', default=30, cast=int)
+PHOTO_REGISTER_HEAD_WORKERS = 16
+# Storage calls in flight per process from the async views (common/aio.py)
+STORAGE_ASYNC_CONCURRENCY = config('STORAGE_ASYNC_CONCURRENCY', default=32, cast=int)
+
+# Server-side derivatives (customers/derivatives.py), rendered by the
+# 'photos.derivatives' job: long-edge sizes in px, JPEG quality, render processes
+PHOTO_DERIVATIVE_SIZES = (320, 1024, 2048)
+PHOTO_DERIVATIVE_QUALITY = 82
+PHOTO_DERIVATIVE_PROCESSES = config('PHOTO_DERIVATIVE_PROCESSES', default=0, cast=int)  # 0 = one per core
+
+# Background jobs (jobs/queue.py; run with `manage.py run_workers`)
+JOBS_WORKER_CONCURRENCY = config('JOBS_WORKER_CONCURRENCY', default=4, cast=int)
+JOBS_POLL_INTERVAL = config('JOBS_POLL_INTERVAL', default=1.0, cast=float)
+JOBS_LOCK_TIMEOUT_SECONDS = 600             # running longer than this = worker died, re-queue
+JOBS_KEEP_FINISHED_SECONDS = 7 * 24 * 3600  # done/failed jobs are purged after this
+
+# Upload sessions: reserved quota slots and presigned PUT URLs live this long
+UPLOAD_SESSION_TTL_SECONDS = config('UPLOAD_SESSION_TTL_SECONDS', default=3600, cast=int)
+
+# Per-request SQL/storage timings as Server-Timing + a log line (common/instrumentation.py)
+INSTRUMENTATION_ENABLED = config('INSTRUMENTATION_ENABLED', default=False, cast=bool)
+INSTRUMENTATION_SLOW_QUERY_MS = config('INSTRUMENTATION_SLOW_QUERY_MS', default=200, cast=float)  # 0 = off
+
+# Prometheus metrics at /metrics (common/metrics.py). With several worker
+# processes, set the PROMETHEUS_MULTIPROC_DIR environment variable as well.
+# Scrapers send METRICS_TOKEN as a bearer token; unset, /metrics is DEBUG-only.
+METRICS_ENABLED = config('METRICS_ENABLED', default=True, cast=bool)
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
@@ -9,7 +9,12 @@ from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
 from accounts.views import UserViewSet, RegistrationView
 from subscriptions.views import SubscriptionViewSet
-from customers.views import PhotoRegisterView, CustomerViewSet, EventViewSet, ShareLinkViewSet
+from customers.views import (
+    PhotoRegisterView, PhotoBatchRegisterView, PhotoViewSet, CustomerViewSet, EventViewSet, ShareLinkViewSet,
+    StorageUsageView, ShareGalleryView, SharePhotosView, ShareSelectionsView, ShareDownloadView,
+)
+from customers.async_views import photo_register, photo_register_batch
+from common.views import metrics
 
 
 # Show users
@@ -18,6 +23,7 @@ router.register(r'accounts', UserViewSet, basename='accounts')
 router.register(r'subscriptions', SubscriptionViewSet, basename='subscriptions')
 router.register(r'customers', CustomerViewSet, basename='customers')
 router.register(r'events', EventViewSet, basename='events')
+router.register(r'photos', PhotoViewSet, basename='photos')
 router.register(r'share-links', ShareLinkViewSet, basename='share-links')
 
 def health(_request):
@@ -26,6 +32,7 @@ def health(_request):
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('health/', health),
+    path('metrics', metrics, name='metrics'),
 
     path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
     path('api/docs/', SpectacularSwaggerView.as_view(url_name='schema'), name='docs'),
@@ -37,6 +44,19 @@ urlpatterns = [
 
     # Save Photos
     path('api/photos/register/', PhotoRegisterView.as_view(), name='photo-register'),
+    path('api/photos/register/batch/', PhotoBatchRegisterView.as_view(), name='photo-register-batch'),
+    # ASGI-native variants of the two above (customers/async_views.py)
+    path('api/photos/register/async/', photo_register, name='photo-register-async'),
+    path('api/photos/register/batch/async/', photo_register_batch, name='photo-register-batch-async'),
+
+    # Stored bytes against the plan limit, per event
+    path('api/storage/', StorageUsageView.as_view(), name='storage-usage'),
+
+    # Public share-link gallery
+    path('api/share/<str:token>/', ShareGalleryView.as_view(), name='share-gallery'),
+    path('api/share/<str:token>/photos/', SharePhotosView.as_view(), name='share-photos'),
+    path('api/share/<str:token>/selections/', ShareSelectionsView.as_view(), name='share-selections'),
+    path('api/share/<str:token>/download/', ShareDownloadView.as_view(), name='share-download'),
 
     # JWT
     path('api/auth/jwt/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),